@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import (
+    DEFAULT_FUZZY_BACKEND,
+    compile_flat_gazetteer,
+    compile_gazetteer,
+    default_artifact_path,
+    default_flat_path,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compile places files into gazetteer artifacts.")
+    parser.add_argument("--places", type=Path, nargs="+", default=[ROOT / "data" / "places.txt"])
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Artifact path (single places file only, default: <places>.compiled or .flat).",
+    )
+    parser.add_argument(
+        "--fuzzy-backend",
+        choices=["qgram", "symspell", "scan"],
+        default=None,
+        help=(
+            f"Fuzzy index stored in the artifact, scan storing none (default: "
+            f"{DEFAULT_FUZZY_BACKEND}, or symspell with --flat; other backends build theirs "
+            "on demand)."
+        ),
+    )
+    parser.add_argument(
+        "--flat",
+        action="store_true",
+        help="Write a flat gazetteer that worker processes memory-map and share.",
+    )
+    args = parser.parse_args()
+
+    if any(not path.exists() for path in args.places):
+        return 1
+    if args.output is not None and len(args.places) > 1:
+        print("--output requires a single places file.", file=sys.stderr)
+        return 1
+
+    # Flat gazetteers cannot build an index on demand and only store a
+    # deletion index: without it, every backend scans.
+    fuzzy_backend = args.fuzzy_backend or ("symspell" if args.flat else DEFAULT_FUZZY_BACKEND)
+    if args.flat and fuzzy_backend == "qgram":
+        print("--flat stores a symspell index or none (scan).", file=sys.stderr)
+        return 1
+    for path in args.places:
+        if args.flat:
+            output = args.output or default_flat_path(path)
+            compile_artifact = compile_flat_gazetteer
+        else:
+            output = args.output or default_artifact_path(path)
+            compile_artifact = compile_gazetteer
+        start = time.perf_counter()
+        header = compile_artifact(path, output, fuzzy_backend)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{output}: variants={header['variants']} "
+            f"bytes={output.stat().st_size} seconds={elapsed:.2f}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -12,12 +12,8 @@ sys.path.append(str(ROOT))
 sys.path.append(str(SCRIPTS))
 
 import pathfind
-from src.travel_order_resolver import (
-    build_place_index,
-    build_place_pattern,
-    load_places,
-    resolve_order,
-)
+from result_cache import ResultCache, combined_hash, model_hash
+from src.travel_order_resolver import ResolverEngine, file_sha256, normalize
 
 
 def parse_input_line(line: str) -> tuple[str, str] | None:
@@ -82,16 +78,20 @@ def main() -> int:
         type=Path,
         default=Path("reports/e2e_manual_120_summary.json"),
     )
+    parser.add_argument(
+        "--cache-db",
+        type=Path,
+        default=None,
+        help="sqlite file caching NLP and route results across runs.",
+    )
     args = parser.parse_args()
 
     required = (args.input, args.places, args.graph, args.stops_index)
     if any(not path.exists() for path in required):
         return 1
 
-    mapping = load_places(args.places)
-    place_pattern = build_place_pattern(list(mapping.keys()))
-    place_index, max_place_tokens = build_place_index(mapping)
-    nlp_predictor: Callable[[str], tuple[str | None, str | None]] | None = None
+    engine = ResolverEngine.from_places(args.places)
+    nlp_predictor: Callable[[str], tuple[str | None, str | None]] = engine.resolve
 
     if args.nlp_backend == "camembert-ft":
         if not args.origin_model_dir.exists() or not args.destination_model_dir.exists():
@@ -110,8 +110,31 @@ def main() -> int:
         )
         nlp_predictor = predictor.predict_sentence
 
-    graph = pathfind.load_graph(args.graph)
-    index = pathfind.load_stops_index(args.stops_index)
+    # With a cache, the graph is only parsed once a route misses.
+    cache = None
+    if args.cache_db is not None:
+        cache = ResultCache(args.cache_db)
+        if args.nlp_backend == "camembert-ft":
+            nlp_hash = model_hash([args.origin_model_dir, args.destination_model_dir])
+        else:
+            nlp_hash = file_sha256(args.places)
+        nlp_predictor = cache.cached_predictor(
+            nlp_predictor,
+            args.nlp_backend,
+            nlp_hash,
+            sentence_key=normalize if args.nlp_backend == "rule-based" else str.strip,
+        )
+        route_finder = cache.cached_route_finder(
+            pathfind.lazy_route_finder(args.graph, args.stops_index),
+            combined_hash([args.graph, args.stops_index]),
+        )
+    else:
+        graph = pathfind.load_graph(args.graph)
+        index = pathfind.load_stops_index(args.stops_index)
+
+        def route_finder(origin: str, destination: str) -> list[str] | None:
+            return pathfind.pathfind(origin, destination, graph, index)
+
     stop_names = pathfind.load_stop_names(args.stops_areas)
 
     args.output_csv.parent.mkdir(parents=True, exist_ok=True)
@@ -145,12 +168,7 @@ def main() -> int:
             sentence_id, sentence = parsed
             total += 1
 
-            if nlp_predictor is not None:
-                origin, destination = nlp_predictor(sentence)
-            else:
-                origin, destination = resolve_order(
-                    sentence, mapping, place_pattern, place_index, max_place_tokens
-                )
+            origin, destination = nlp_predictor(sentence)
             if origin is None or destination is None:
                 writer.writerow(
                     [sentence_id, sentence, "", "", "invalid", "skipped", 0, ""]
@@ -158,7 +176,7 @@ def main() -> int:
                 continue
 
             nlp_valid += 1
-            found_path = pathfind.pathfind(origin, destination, graph, index)
+            found_path = route_finder(origin, destination)
             if not found_path:
                 writer.writerow(
                     [
@@ -189,6 +207,9 @@ def main() -> int:
                 ]
             )
 
+    if cache is not None:
+        cache.close()
+
     summary = build_summary(total, nlp_valid, path_valid)
     with args.summary.open("w", encoding="utf-8") as handle:
         json.dump(summary, handle, ensure_ascii=True, indent=2)
@@ -5,13 +5,43 @@ import json
 import sys
 from collections import deque
 from pathlib import Path
+from typing import Callable
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
-from src.travel_order_resolver import levenshtein, max_distance, normalize
+from src.travel_order_resolver import QGramIndex, bounded_levenshtein, max_distance, normalize
 
 GENERIC_TOKENS = {"gare", "station", "halte", "arret", "stop"}
+STOP_FUZZY_BACKENDS = ("qgram", "scan")
+
+
+class StopPrefixIndex:
+    # Distinct `token_count`-token prefixes of the stop keys, with the keys
+    # sharing each prefix, under a q-gram index for the fuzzy fallback.
+    def __init__(self, index: dict, token_count: int):
+        keys_by_prefix: dict[str, list[str]] = {}
+        for key in index:
+            tokens = key.split()
+            if len(tokens) >= token_count:
+                keys_by_prefix.setdefault(" ".join(tokens[:token_count]), []).append(key)
+        self.prefixes = list(keys_by_prefix)
+        self.keys = list(keys_by_prefix.values())
+        self.qgrams = QGramIndex(self.prefixes)
+
+
+# Prefix indexes of the last stops index seen, built on first fuzzy lookup.
+STOP_PREFIX_INDEXES: dict = {"index": None, "by_token_count": {}}
+
+
+def stop_prefix_index(index: dict, token_count: int) -> StopPrefixIndex:
+    if STOP_PREFIX_INDEXES["index"] is not index:
+        STOP_PREFIX_INDEXES["index"] = index
+        STOP_PREFIX_INDEXES["by_token_count"] = {}
+    by_token_count = STOP_PREFIX_INDEXES["by_token_count"]
+    if token_count not in by_token_count:
+        by_token_count[token_count] = StopPrefixIndex(index, token_count)
+    return by_token_count[token_count]
 
 
 def load_graph(path: Path) -> dict:
@@ -58,7 +88,7 @@ def bfs(graph: dict, sources: list[str], targets: set[str]) -> list[str] | None:
     return None
 
 
-def resolve_stop_ids(index: dict, name: str) -> list[str]:
+def resolve_stop_ids(index: dict, name: str, fuzzy_backend: str = "qgram") -> list[str]:
     key = normalize(name)
     if not key:
         return []
@@ -98,21 +128,31 @@ def resolve_stop_ids(index: dict, name: str) -> list[str]:
         if not informative_tokens:
             continue
         token_count = len(variant_tokens)
+        threshold = max_distance(variant)
         best_distance = None
         best_ids = set()
-        for candidate_key, candidate_entry in index.items():
-            candidate_tokens = candidate_key.split()
-            if len(candidate_tokens) < token_count:
-                continue
-            candidate_prefix = " ".join(candidate_tokens[:token_count])
-            distance = levenshtein(variant, candidate_prefix)
-            if distance > max_distance(variant):
+        if fuzzy_backend == "qgram":
+            prefix_index = stop_prefix_index(index, token_count)
+            candidates = [
+                (prefix_index.prefixes[prefix_id], prefix_index.keys[prefix_id])
+                for prefix_id in prefix_index.qgrams.candidates(variant, threshold)
+            ]
+        else:
+            candidates = [
+                (" ".join(key.split()[:token_count]), [key])
+                for key in index
+                if len(key.split()) >= token_count
+            ]
+        for candidate_prefix, candidate_keys in candidates:
+            distance = bounded_levenshtein(variant, candidate_prefix, threshold)
+            if distance > threshold:
                 continue
             if best_distance is None or distance < best_distance:
                 best_distance = distance
-                best_ids = set(candidate_entry.get("stop_ids", []))
-            elif distance == best_distance:
-                best_ids.update(candidate_entry.get("stop_ids", []))
+                best_ids = set()
+            if distance == best_distance:
+                for candidate_key in candidate_keys:
+                    best_ids.update(index[candidate_key].get("stop_ids", []))
         matched_ids.update(best_ids)
 
     if matched_ids:
@@ -138,6 +178,21 @@ def pathfind(origin: str, destination: str, graph: dict, index: dict) -> list[st
     return bfs(graph, sources, targets)
 
 
+def lazy_route_finder(
+    graph_path: Path, stops_index_path: Path
+) -> Callable[[str, str], list[str] | None]:
+    # Parses the graph and stops index on the first route request only.
+    loaded = {}
+
+    def find(origin: str, destination: str) -> list[str] | None:
+        if not loaded:
+            loaded["graph"] = load_graph(graph_path)
+            loaded["index"] = load_stops_index(stops_index_path)
+        return pathfind(origin, destination, loaded["graph"], loaded["index"])
+
+    return find
+
+
 def pathfind_ids(origin: str, destination: str, graph: dict) -> list[str] | None:
     return bfs(graph, [origin], {destination})
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# (metric path in a case, "higher" or "lower" is better, tolerance group,
+# scaled by the calibration loop time)
+GATED_METRICS = [
+    ("sentences_per_second", "higher", "throughput", True),
+    ("latency_ms.p50", "lower", "latency", True),
+    ("latency_ms.p95", "lower", "latency", True),
+    ("latency_ms.p99", "lower", "latency", True),
+    ("startup_seconds", "lower", "startup", True),
+    ("peak_rss_bytes", "lower", "memory", False),
+]
+DEFAULT_TOLERANCES = {"throughput": 0.25, "latency": 0.30, "startup": 0.50, "memory": 0.10}
+
+
+def metric_value(case: dict, path: str) -> float | None:
+    value = case
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return float(value)
+
+
+def normalized(value: float, direction: str, calibration: float | None, scaled: bool) -> float:
+    # Times are divided by the calibration time and rates multiplied by it, so
+    # a machine twice as fast on the calibration loop is expected to be twice
+    # as fast on the resolver.
+    if not scaled or not calibration:
+        return value
+    return value * calibration if direction == "higher" else value / calibration
+
+
+def compare(report: dict, baseline: dict, tolerances: dict[str, float]) -> list[dict]:
+    rows = []
+    report_calibration = report.get("calibration_seconds")
+    baseline_calibration = baseline.get("calibration_seconds")
+    calibrated = bool(report_calibration and baseline_calibration)
+    for name, baseline_case in sorted(baseline.get("cases", {}).items()):
+        case = report.get("cases", {}).get(name)
+        if case is None:
+            rows.append({"case": name, "metric": "-", "status": "missing"})
+            continue
+        if case.get("sentences") != baseline_case.get("sentences"):
+            rows.append({"case": name, "metric": "sentences", "status": "mismatch"})
+            continue
+        for path, direction, group, scaled in GATED_METRICS:
+            expected = metric_value(baseline_case, path)
+            current = metric_value(case, path)
+            if expected is None or current is None or expected == 0:
+                continue
+            if calibrated:
+                current_score = normalized(current, direction, report_calibration, scaled)
+                expected_score = normalized(expected, direction, baseline_calibration, scaled)
+                change = current_score / expected_score - 1
+            else:
+                change = current / expected - 1
+            tolerance = tolerances[group]
+            regressed = change < -tolerance if direction == "higher" else change > tolerance
+            rows.append(
+                {
+                    "case": name,
+                    "metric": path,
+                    "baseline": expected,
+                    "current": current,
+                    "change": change,
+                    "tolerance": tolerance,
+                    "direction": direction,
+                    "status": "REGRESSED" if regressed else "ok",
+                }
+            )
+    return rows
+
+
+def format_rows(rows: list[dict], calibrated: bool) -> str:
+    unit = " (change after calibration)" if calibrated else ""
+    lines = [
+        f"{'case':<16} {'metric':<22} {'baseline':>14} {'current':>14} {'change':>9} "
+        f"{'limit':>7}  status{unit}"
+    ]
+    for row in rows:
+        if "change" not in row:
+            lines.append(f"{row['case']:<16} {row['metric']:<22} {'':>48}  {row['status']}")
+            continue
+        sign = "-" if row["direction"] == "higher" else "+"
+        lines.append(
+            f"{row['case']:<16} {row['metric']:<22} {row['baseline']:>14.6g} "
+            f"{row['current']:>14.6g} {row['change']:>+8.1%} {sign}{row['tolerance']:>5.0%}  "
+            f"{row['status']}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail when resolver performance regresses.")
+    parser.add_argument("--report", type=Path, default=ROOT / "reports" / "perf_resolver.json")
+    parser.add_argument("--baseline", type=Path, default=ROOT / "reports" / "perf_baseline.json")
+    for group, tolerance in DEFAULT_TOLERANCES.items():
+        parser.add_argument(
+            f"--{group}-tolerance",
+            type=float,
+            default=tolerance,
+            help=f"Allowed relative {group} regression (default {tolerance:.0%}).",
+        )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the report as the new baseline instead of comparing.",
+    )
+    args = parser.parse_args()
+
+    if not args.report.exists():
+        print(f"Report not found: {args.report}", file=sys.stderr)
+        return 1
+    with args.report.open("r", encoding="utf-8") as handle:
+        report = json.load(handle)
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with args.baseline.open("w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=True)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"Baseline not found: {args.baseline}", file=sys.stderr)
+        return 1
+    with args.baseline.open("r", encoding="utf-8") as handle:
+        baseline = json.load(handle)
+
+    tolerances = {group: getattr(args, f"{group}_tolerance") for group in DEFAULT_TOLERANCES}
+    rows = compare(report, baseline, tolerances)
+    calibrated = bool(report.get("calibration_seconds") and baseline.get("calibration_seconds"))
+    print(format_rows(rows, calibrated))
+    failures = [row for row in rows if row["status"] != "ok"]
+    if failures:
+        print(f"perf gate: {len(failures)} regression(s) against {args.baseline}", file=sys.stderr)
+        return 1
+    print("perf gate: ok")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import file_sha256, normalize
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nlp_results (
+    sentence TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    gazetteer_hash TEXT NOT NULL,
+    origin TEXT,
+    destination TEXT,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (sentence, backend, gazetteer_hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS route_results (
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    graph_hash TEXT NOT NULL,
+    route TEXT,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (origin, destination, graph_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS nlp_results_used ON nlp_results (used);
+CREATE INDEX IF NOT EXISTS route_results_used ON route_results (used);
+"""
+
+
+def combined_hash(paths: list[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(file_sha256(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def model_hash(model_dirs: list[Path]) -> str:
+    # Weights, config and tokenizer files at the top of each model directory,
+    # by name; training checkpoints in subdirectories are not loaded.
+    digest = hashlib.sha256()
+    for model_dir in model_dirs:
+        for path in sorted(path for path in model_dir.iterdir() if path.is_file()):
+            digest.update(f"{path.name}\t{file_sha256(path)}\n".encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    # sqlite cache of NLP results (normalized sentence, backend, gazetteer hash,
+    # or model_hash() for model backends)
+    # and route results (origin, destination, graph hash). Writes and recency
+    # updates are buffered and flushed in one transaction every `batch_size`
+    # operations; tables are trimmed to `max_entries` rows, least recently
+    # used first. WAL mode lets other processes read while a run writes.
+    def __init__(self, path: Path, max_entries: int = 500_000, batch_size: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(CACHE_SCHEMA)
+        self.clock = 0
+        for table in ("nlp_results", "route_results"):
+            row = self.connection.execute(f"SELECT MAX(used) FROM {table}").fetchone()
+            self.clock = max(self.clock, row[0] or 0)
+        # Pending writes carry their own recency stamp.
+        self.pending_nlp: dict[tuple[str, str, str], tuple[tuple, int]] = {}
+        self.pending_routes: dict[tuple[str, str, str], tuple[list[str] | None, int]] = {}
+        self.touched_nlp: dict[tuple[str, str, str], int] = {}
+        self.touched_routes: dict[tuple[str, str, str], int] = {}
+        self.stats = {"nlp_hits": 0, "nlp_misses": 0, "route_hits": 0, "route_misses": 0}
+
+    def _tick(self) -> int:
+        self.clock += 1
+        pending = (
+            len(self.pending_nlp)
+            + len(self.pending_routes)
+            + len(self.touched_nlp)
+            + len(self.touched_routes)
+        )
+        if pending >= self.batch_size:
+            self.flush()
+        return self.clock
+
+    def get_nlp(self, sentence_norm: str, backend: str, gazetteer_hash: str) -> tuple | None:
+        key = (sentence_norm, backend, gazetteer_hash)
+        if key in self.pending_nlp:
+            result = self.pending_nlp[key][0]
+        else:
+            row = self.connection.execute(
+                "SELECT origin, destination FROM nlp_results "
+                "WHERE sentence = ? AND backend = ? AND gazetteer_hash = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                self.stats["nlp_misses"] += 1
+                return None
+            result = (row[0], row[1])
+            self.touched_nlp[key] = self._tick()
+        self.stats["nlp_hits"] += 1
+        return result
+
+    def put_nlp(
+        self, sentence_norm: str, backend: str, gazetteer_hash: str, result: tuple
+    ) -> None:
+        stamp = self._tick()
+        self.pending_nlp[(sentence_norm, backend, gazetteer_hash)] = (tuple(result), stamp)
+
+    def get_route(
+        self, origin: str, destination: str, graph_hash: str
+    ) -> tuple[bool, list[str] | None]:
+        key = (origin, destination, graph_hash)
+        if key in self.pending_routes:
+            self.stats["route_hits"] += 1
+            return True, self.pending_routes[key][0]
+        row = self.connection.execute(
+            "SELECT route FROM route_results "
+            "WHERE origin = ? AND destination = ? AND graph_hash = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            self.stats["route_misses"] += 1
+            return False, None
+        self.touched_routes[key] = self._tick()
+        self.stats["route_hits"] += 1
+        return True, (json.loads(row[0]) if row[0] is not None else None)
+
+    def put_route(
+        self, origin: str, destination: str, graph_hash: str, route: list[str] | None
+    ) -> None:
+        stamp = self._tick()
+        self.pending_routes[(origin, destination, graph_hash)] = (route, stamp)
+
+    def flush(self) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO nlp_results VALUES (?, ?, ?, ?, ?, ?)",
+                [key + result + (stamp,) for key, (result, stamp) in self.pending_nlp.items()],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO route_results VALUES (?, ?, ?, ?, ?)",
+                [
+                    key + ((json.dumps(route) if route is not None else None), stamp)
+                    for key, (route, stamp) in self.pending_routes.items()
+                ],
+            )
+            self.connection.executemany(
+                "UPDATE nlp_results SET used = ? "
+                "WHERE sentence = ? AND backend = ? AND gazetteer_hash = ?",
+                [(stamp,) + key for key, stamp in self.touched_nlp.items()],
+            )
+            self.connection.executemany(
+                "UPDATE route_results SET used = ? "
+                "WHERE origin = ? AND destination = ? AND graph_hash = ?",
+                [(stamp,) + key for key, stamp in self.touched_routes.items()],
+            )
+            for table in ("nlp_results", "route_results"):
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE used <= ("
+                    f"SELECT used FROM {table} ORDER BY used DESC LIMIT 1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        self.pending_nlp.clear()
+        self.pending_routes.clear()
+        self.touched_nlp.clear()
+        self.touched_routes.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def cached_predictor(
+        self,
+        predictor: Callable[[str], tuple[str | None, str | None]],
+        backend: str,
+        gazetteer_hash: str,
+        sentence_key: Callable[[str], str] = normalize,
+    ) -> Callable[[str], tuple[str | None, str | None]]:
+        # The rule-based resolver only sees the normalized sentence; model
+        # backends should key on the raw text instead.
+        def predict(sentence: str) -> tuple[str | None, str | None]:
+            sentence_norm = sentence_key(sentence)
+            result = self.get_nlp(sentence_norm, backend, gazetteer_hash)
+            if result is None:
+                result = tuple(predictor(sentence))
+                self.put_nlp(sentence_norm, backend, gazetteer_hash, result)
+            return result
+
+        return predict
+
+    def cached_route_finder(
+        self,
+        find_route: Callable[[str, str], list[str] | None],
+        graph_hash: str,
+    ) -> Callable[[str, str], list[str] | None]:
+        def find(origin: str, destination: str) -> list[str] | None:
+            found, route = self.get_route(origin, destination, graph_hash)
+            if not found:
+                route = find_route(origin, destination)
+                self.put_route(origin, destination, graph_hash, route)
+            return route
+
+        return find
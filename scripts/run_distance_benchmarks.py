@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import (
+    bounded_levenshtein,
+    build_place_index,
+    levenshtein,
+    load_places,
+    max_distance,
+)
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def add_typo(value: str, rng: random.Random) -> str:
+    chars = list(value)
+    position = rng.randrange(len(chars))
+    operation = rng.choice(["substitute", "insert", "delete", "transpose"])
+    if operation == "substitute":
+        chars[position] = rng.choice(ALPHABET)
+    elif operation == "insert":
+        chars.insert(position, rng.choice(ALPHABET))
+    elif operation == "delete" and len(chars) > 1:
+        del chars[position]
+    elif operation == "transpose" and position + 1 < len(chars):
+        chars[position], chars[position + 1] = chars[position + 1], chars[position]
+    return "".join(chars)
+
+
+def build_pairs(mapping: dict, count: int, rng: random.Random) -> dict[str, list[tuple[str, str]]]:
+    place_index, _ = build_place_index(mapping)
+    variants = sorted(mapping.keys())
+    near = []
+    far = []
+    for _ in range(count):
+        variant = rng.choice(variants)
+        near.append((add_typo(variant, rng), variant))
+        bucket = place_index[len(variant.split())]["_all"]
+        far.append((variant, rng.choice(bucket)[0]))
+    return {"near": near, "far": far}
+
+
+def time_pairs(pairs: list[tuple[str, str]], bounded: bool) -> tuple[float, int]:
+    accepted = 0
+    start = time.perf_counter()
+    for candidate, variant in pairs:
+        threshold = max_distance(variant)
+        if bounded:
+            distance = bounded_levenshtein(candidate, variant, threshold)
+        else:
+            distance = levenshtein(candidate, variant)
+        if distance <= threshold:
+            accepted += 1
+    return time.perf_counter() - start, accepted
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark full vs bounded edit distance.")
+    parser.add_argument(
+        "--places",
+        type=Path,
+        nargs="+",
+        default=[ROOT / "data" / "places_stops.txt", ROOT / "data" / "places_imported.txt"],
+    )
+    parser.add_argument("--pairs", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--output", type=Path, default=ROOT / "reports" / "distance_benchmarks.json"
+    )
+    args = parser.parse_args()
+
+    if any(not path.exists() for path in args.places):
+        return 1
+
+    mapping = {}
+    for path in args.places:
+        mapping.update(load_places(path))
+    pairs_by_kind = build_pairs(mapping, args.pairs, random.Random(args.seed))
+
+    results = {}
+    for kind, pairs in pairs_by_kind.items():
+        full_seconds, full_accepted = time_pairs(pairs, bounded=False)
+        bounded_seconds, bounded_accepted = time_pairs(pairs, bounded=True)
+        if full_accepted != bounded_accepted:
+            print(f"accepted pair mismatch on {kind} pairs", file=sys.stderr)
+            return 1
+        results[kind] = {
+            "pairs": len(pairs),
+            "accepted": full_accepted,
+            "levenshtein_us_per_pair": full_seconds / len(pairs) * 1e6,
+            "bounded_us_per_pair": bounded_seconds / len(pairs) * 1e6,
+            "speedup": (full_seconds / bounded_seconds) if bounded_seconds else 0.0,
+        }
+        print(
+            f"{kind}: levenshtein={results[kind]['levenshtein_us_per_pair']:.1f}us "
+            f"bounded={results[kind]['bounded_us_per_pair']:.1f}us "
+            f"speedup={results[kind]['speedup']:.1f}x"
+        )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
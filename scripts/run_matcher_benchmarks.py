@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import (
+    PlaceTrie,
+    build_place_pattern,
+    extract_place_spans,
+    load_places,
+    normalize,
+)
+
+
+def load_sentences(path: Path, limit: int) -> list[str]:
+    sentences = []
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if "," not in line:
+                continue
+            sentences.append(normalize(line.split(",", 1)[1]))
+            if len(sentences) >= limit:
+                break
+    return sentences
+
+
+def measure_matcher(name: str, mapping: dict, sentences: list[str]) -> dict:
+    start = time.perf_counter()
+    if name == "regex":
+        place_pattern = build_place_pattern(list(mapping.keys()))
+        re.compile(rf"(?P<place>{place_pattern})")
+        place_trie = None
+    else:
+        place_pattern = ""
+        place_trie = PlaceTrie(mapping)
+    compile_seconds = time.perf_counter() - start
+
+    # The first regex scan goes through the re cache, keep it out of the timing.
+    spans = 0
+    extract_place_spans(sentences[0], place_pattern, place_trie)
+    start = time.perf_counter()
+    for sentence in sentences:
+        spans += len(extract_place_spans(sentence, place_pattern, place_trie))
+    match_seconds = time.perf_counter() - start
+    return {
+        "compile_seconds": compile_seconds,
+        "match_seconds": match_seconds,
+        "sentences_per_second": (len(sentences) / match_seconds) if match_seconds else 0.0,
+        "spans": spans,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark regex vs trie exact place matching.")
+    parser.add_argument(
+        "--places",
+        type=Path,
+        nargs="+",
+        default=[ROOT / "data" / "places_stops.txt", ROOT / "data" / "places_imported.txt"],
+    )
+    parser.add_argument("--input", type=Path, default=ROOT / "datasets" / "all_input.txt")
+    parser.add_argument("--sentences", type=int, default=1000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 1000, 4000, 16000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--output", type=Path, default=ROOT / "reports" / "matcher_benchmarks.json"
+    )
+    args = parser.parse_args()
+
+    if any(not path.exists() for path in args.places) or not args.input.exists():
+        return 1
+
+    mapping = {}
+    for path in args.places:
+        mapping.update(load_places(path))
+    items = sorted(mapping.items())
+    random.Random(args.seed).shuffle(items)
+    sentences = load_sentences(args.input, args.sentences)
+
+    results = []
+    for size in args.sizes:
+        subset = dict(items[:size])
+        row = {"variants": len(subset)}
+        for name in ("regex", "trie"):
+            row[name] = measure_matcher(name, subset, sentences)
+        if row["regex"]["spans"] != row["trie"]["spans"]:
+            print(f"span count mismatch for {len(subset)} variants", file=sys.stderr)
+            return 1
+        results.append(row)
+        print(
+            f"variants={row['variants']} "
+            f"regex_compile={row['regex']['compile_seconds']:.3f}s "
+            f"trie_compile={row['trie']['compile_seconds']:.3f}s "
+            f"regex_sps={row['regex']['sentences_per_second']:.0f} "
+            f"trie_sps={row['trie']['sentences_per_second']:.0f}"
+        )
+        if len(subset) < size:
+            break
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(
+            {"sentences": len(sentences), "results": results},
+            handle,
+            indent=2,
+            ensure_ascii=True,
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from run_perf_benchmarks import display_path, load_sentences
+from src.travel_order_resolver import (
+    FUZZY_BACKENDS,
+    PlaceTrie,
+    ResolverEngine,
+    build_place_index,
+    compile_flat_gazetteer,
+    load_numpy,
+    load_places,
+)
+
+
+def traced_bytes() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure(places: Path, fuzzy_backend: str) -> dict:
+    # Bytes still allocated after each step, so temporaries do not count.
+    tracemalloc.reset_peak()
+    start = traced_bytes()
+    mapping = load_places(places)
+    after_mapping = traced_bytes()
+    place_trie = PlaceTrie(mapping)
+    after_trie = traced_bytes()
+    build_start = time.perf_counter()
+    place_index, _ = build_place_index(mapping, fuzzy_backend)
+    build_seconds = time.perf_counter() - build_start
+    after_index = traced_bytes()
+    peak = tracemalloc.get_traced_memory()[1]
+    result = {
+        "variants": len(mapping),
+        "mapping_bytes": after_mapping - start,
+        "trie_bytes": after_trie - after_mapping,
+        "place_index_bytes": after_index - after_trie,
+        "total_bytes": after_index - start,
+        "peak_bytes": peak - start,
+        "index_build_seconds": build_seconds,
+    }
+    del mapping, place_trie, place_index
+    return result
+
+
+def process_memory(pid: int) -> dict:
+    # Linux only. Rss counts every resident page of the process, Pss splits
+    # shared pages between the processes mapping them.
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as handle:
+        for line in handle:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                memory[f"{name.lower()}_bytes"] = int(value.split()[0]) * 1024
+    return memory
+
+
+def memory_worker(
+    places: Path,
+    artifact: Path | None,
+    fuzzy_backend: str,
+    sentences: list[str],
+    ready,
+    stop,
+) -> None:
+    engine = ResolverEngine.from_places(places, fuzzy_backend=fuzzy_backend, artifact_path=artifact)
+    for sentence in sentences:
+        engine.resolve(sentence)
+    # The fuzzy index is loaded in every worker, whatever the sentences needed.
+    ready.put((os.getpid(), len(engine.place_index)))
+    stop.wait()
+
+
+def worker_memory(
+    places: Path,
+    artifact: Path | None,
+    fuzzy_backend: str,
+    workers: int,
+    sentences: list[str],
+) -> dict:
+    # Spawned workers start from a fresh interpreter, so they share nothing
+    # through fork: only the mapped gazetteer can be shared.
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    stop = context.Event()
+    processes = [
+        context.Process(
+            target=memory_worker,
+            args=(places, artifact, fuzzy_backend, sentences, ready, stop),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        pids = [ready.get(timeout=600)[0] for _ in processes]
+        rows = [process_memory(pid) for pid in pids]
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+    return {
+        "workers": workers,
+        "rss_bytes": sum(row["rss_bytes"] for row in rows),
+        "pss_bytes": sum(row["pss_bytes"] for row in rows),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure gazetteer memory with tracemalloc.")
+    parser.add_argument("--places", type=Path, default=ROOT / "data" / "places_stops.txt")
+    parser.add_argument("--backends", nargs="+", choices=FUZZY_BACKENDS, default=None)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes (0 skips).")
+    parser.add_argument(
+        "--worker-backends",
+        nargs="+",
+        choices=["scan", "symspell"],
+        default=["scan", "symspell"],
+        help="Backends compared between private and flat (memory-mapped) gazetteers.",
+    )
+    parser.add_argument("--input", type=Path, default=ROOT / "datasets" / "all_input.txt")
+    parser.add_argument("--limit", type=int, default=200, help="Sentences resolved per worker.")
+    parser.add_argument("--output", type=Path, default=ROOT / "reports" / "gazetteer_memory.json")
+    args = parser.parse_args()
+
+    if not args.places.exists():
+        return 1
+    backends = args.backends or [
+        backend for backend in FUZZY_BACKENDS if backend != "numpy" or load_numpy()
+    ]
+
+    tracemalloc.start()
+    results = {}
+    for backend in backends:
+        results[backend] = measure(args.places, backend)
+        row = results[backend]
+        print(
+            f"{backend}: mapping={row['mapping_bytes'] / 2**20:.2f}MiB "
+            f"trie={row['trie_bytes'] / 2**20:.2f}MiB "
+            f"index={row['place_index_bytes'] / 2**20:.2f}MiB "
+            f"total={row['total_bytes'] / 2**20:.2f}MiB"
+        )
+    tracemalloc.stop()
+
+    workers = {}
+    if args.workers > 0 and Path("/proc/self/smaps_rollup").exists():
+        sentences = load_sentences(args.input, args.limit) if args.input.exists() else []
+        with tempfile.TemporaryDirectory() as tmp:
+            for backend in args.worker_backends:
+                flat = Path(tmp) / f"{backend}.flat"
+                compile_flat_gazetteer(args.places, flat, backend)
+                workers[backend] = {
+                    "flat_bytes": flat.stat().st_size,
+                    "private": worker_memory(args.places, None, backend, args.workers, sentences),
+                    "flat": worker_memory(args.places, flat, backend, args.workers, sentences),
+                }
+                row = workers[backend]
+                print(
+                    f"{backend} x{args.workers}: "
+                    f"private pss={row['private']['pss_bytes'] / 2**20:.1f}MiB "
+                    f"rss={row['private']['rss_bytes'] / 2**20:.1f}MiB, "
+                    f"flat pss={row['flat']['pss_bytes'] / 2**20:.1f}MiB "
+                    f"rss={row['flat']['rss_bytes'] / 2**20:.1f}MiB"
+                )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(
+            {
+                "places": display_path(args.places.resolve()),
+                "backends": results,
+                "workers": workers,
+            },
+            handle,
+            indent=2,
+            ensure_ascii=True,
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import normalize, normalize_slow
+
+
+def load_texts(paths: list[Path]) -> list[str]:
+    texts = []
+    for path in paths:
+        with path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.rstrip("\n")
+                if not line:
+                    continue
+                texts.append(line)
+                if path.suffix == ".txt" and "," in line:
+                    texts.extend(line.split(",")[1:])
+    return texts
+
+
+def time_normalize(function, texts: list[str], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark translate-table vs legacy normalize.")
+    parser.add_argument("--input", type=Path, default=ROOT / "datasets" / "all_input.txt")
+    parser.add_argument(
+        "--check",
+        type=Path,
+        nargs="*",
+        default=sorted((ROOT / "datasets").glob("*.txt"))
+        + sorted((ROOT / "data").glob("places*.txt"))
+        + sorted((ROOT / "students_project").glob("*.txt")),
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--output", type=Path, default=ROOT / "reports" / "normalize_benchmarks.json"
+    )
+    args = parser.parse_args()
+
+    if not args.input.exists() or any(not path.exists() for path in args.check):
+        return 1
+
+    checked = 0
+    for path in [args.input, *args.check]:
+        for text in load_texts([path]):
+            if normalize(text) != normalize_slow(text):
+                print(f"normalize mismatch in {path}: {text!r}", file=sys.stderr)
+                return 1
+            checked += 1
+
+    sentences = []
+    with args.input.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if "," in line:
+                sentences.append(line.split(",", 1)[1])
+
+    slow_seconds = time_normalize(normalize_slow, sentences, args.repeat)
+    fast_seconds = time_normalize(normalize, sentences, args.repeat)
+    results = {
+        "sentences": len(sentences),
+        "checked_texts": checked,
+        "ascii_fraction": sum(text.isascii() for text in sentences) / len(sentences),
+        "legacy_us_per_sentence": slow_seconds / len(sentences) * 1e6,
+        "translate_us_per_sentence": fast_seconds / len(sentences) * 1e6,
+        "speedup": (slow_seconds / fast_seconds) if fast_seconds else 0.0,
+    }
+    print(
+        f"legacy={results['legacy_us_per_sentence']:.2f}us "
+        f"translate={results['translate_us_per_sentence']:.2f}us "
+        f"speedup={results['speedup']:.1f}x checked={checked}"
+    )
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
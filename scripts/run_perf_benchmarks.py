@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.travel_order_resolver import (
+    DEFAULT_FUZZY_BACKEND,
+    FUZZY_BACKENDS,
+    GazetteerArtifact,
+    ResolverEngine,
+    default_artifact_path,
+    load_places,
+)
+
+GAZETTEERS = {
+    "places": ["data/places.txt"],
+    "imported": ["data/places_imported.txt"],
+    "stops_imported": ["data/places_stops.txt", "data/places_imported.txt"],
+}
+
+
+def load_sentences(path: Path, limit: int | None) -> list[str]:
+    sentences = []
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if "," not in line:
+                continue
+            sentences.append(line.split(",", 1)[1])
+            if limit is not None and len(sentences) >= limit:
+                break
+    return sentences
+
+
+def display_path(path: Path) -> str:
+    return str(path.relative_to(ROOT)) if path.is_relative_to(ROOT) else str(path)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))]
+
+
+def calibration_seconds(repeat: int = 9) -> float:
+    # Fixed pure-Python workload (edit-distance DP, string slicing, dict
+    # updates) that does not touch resolver code. perf_gate.py scales timings
+    # by it so reports from different machines stay comparable.
+    words = [f"{chr(97 + number % 26)}gare{number}ville" for number in range(1000)]
+    pairs = list(zip(words, words[1:] + words[:1]))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        totals = {}
+        for a, b in pairs:
+            previous = list(range(len(b) + 1))
+            for i, char_a in enumerate(a, start=1):
+                current = [i]
+                for j, char_b in enumerate(b, start=1):
+                    current.append(
+                        min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+                    )
+                previous = current
+            totals[a[:3]] = totals.get(a[:3], 0) + previous[-1]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def build_engine(paths: list[Path], fuzzy_backend: str) -> tuple[ResolverEngine, bool]:
+    if len(paths) == 1:
+        artifact = GazetteerArtifact.open(default_artifact_path(paths[0]), paths[0])
+        engine = ResolverEngine.from_places(paths[0], fuzzy_backend=fuzzy_backend)
+        return engine, artifact is not None
+    mapping = {}
+    for path in paths:
+        mapping.update(load_places(path))
+    return ResolverEngine(mapping, fuzzy_backend=fuzzy_backend), False
+
+
+def run_case(
+    paths: list[Path], input_path: Path, fuzzy_backend: str, limit: int | None, spawned_at: float
+) -> dict:
+    # Runs in its own process so startup and peak RSS belong to this gazetteer.
+    start = time.perf_counter()
+    engine, artifact = build_engine(paths, fuzzy_backend)
+    engine_seconds = time.perf_counter() - start
+    startup_seconds = time.time() - spawned_at
+
+    start = time.perf_counter()
+    engine.place_index
+    index_load_seconds = time.perf_counter() - start
+
+    sentences = load_sentences(input_path, limit)
+    latencies = []
+    clock = time.perf_counter
+    run_start = clock()
+    for sentence in sentences:
+        sentence_start = clock()
+        engine.resolve(sentence)
+        latencies.append(clock() - sentence_start)
+    run_seconds = clock() - run_start
+
+    # Second, profiled pass: which sentences went through a fuzzy stage.
+    profile = engine.enable_profile()
+    fuzzy_stages = [profile.stages["fuzzy_cues"], profile.stages["fuzzy_fallback"]]
+    fuzzy_sentences = 0
+    for sentence in sentences:
+        calls = sum(stage[0] for stage in fuzzy_stages)
+        engine.resolve(sentence)
+        if sum(stage[0] for stage in fuzzy_stages) != calls:
+            fuzzy_sentences += 1
+    report = profile.report()
+
+    latencies.sort()
+    return {
+        "gazetteer": [display_path(path) for path in paths],
+        "variants": len(engine.mapping),
+        "artifact": artifact,
+        "fuzzy_backend": fuzzy_backend,
+        "sentences": len(sentences),
+        "startup_seconds": startup_seconds,
+        "engine_seconds": engine_seconds,
+        "index_load_seconds": index_load_seconds,
+        "run_seconds": run_seconds,
+        "sentences_per_second": (len(sentences) / run_seconds) if run_seconds else 0.0,
+        "latency_ms": {
+            "mean": (run_seconds / len(sentences) * 1000) if sentences else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] * 1000) if latencies else 0.0,
+        },
+        "fuzzy_fraction": (fuzzy_sentences / len(sentences)) if sentences else 0.0,
+        "paths": report["paths"],
+        "levenshtein_comparisons": report["levenshtein_comparisons"],
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark resolver throughput and latency.")
+    parser.add_argument("--input", type=Path, default=ROOT / "datasets" / "all_input.txt")
+    parser.add_argument(
+        "--gazetteers", nargs="+", choices=sorted(GAZETTEERS), default=list(GAZETTEERS)
+    )
+    parser.add_argument("--fuzzy-backend", choices=FUZZY_BACKENDS, default=DEFAULT_FUZZY_BACKEND)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N sentences.")
+    parser.add_argument("--output", type=Path, default=ROOT / "reports" / "perf_resolver.json")
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--spawned-at", type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        paths = [ROOT / path for path in GAZETTEERS[args.run_case]]
+        result = run_case(paths, args.input, args.fuzzy_backend, args.limit, args.spawned_at)
+        print(json.dumps(result))
+        return 0
+
+    if not args.input.exists():
+        return 1
+
+    calibration = calibration_seconds()
+    cases = {}
+    for name in args.gazetteers:
+        if any(not (ROOT / path).exists() for path in GAZETTEERS[name]):
+            print(f"skipping {name}: missing places file", file=sys.stderr)
+            continue
+        command = [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "--run-case",
+            name,
+            "--input",
+            str(args.input),
+            "--fuzzy-backend",
+            args.fuzzy_backend,
+        ]
+        if args.limit is not None:
+            command += ["--limit", str(args.limit)]
+        command += ["--spawned-at", repr(time.time())]
+        cases[name] = json.loads(subprocess.check_output(command, text=True))
+        latency = cases[name]["latency_ms"]
+        print(
+            f"{name}: {cases[name]['sentences_per_second']:.0f} sentences/s "
+            f"p50={latency['p50']:.3f}ms p95={latency['p95']:.3f}ms p99={latency['p99']:.3f}ms "
+            f"fuzzy={cases[name]['fuzzy_fraction']:.1%} "
+            f"rss={cases[name]['peak_rss_bytes'] / 2**20:.0f}MiB "
+            f"startup={cases[name]['startup_seconds']:.2f}s"
+        )
+
+    results = {
+        "input": display_path(args.input.resolve()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        # Best of the runs before and after the cases, to dampen noise.
+        "calibration_seconds": min(calibration, calibration_seconds()),
+        "cases": cases,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -11,40 +11,56 @@ sys.path.append(str(ROOT))
 sys.path.append(str(SCRIPTS))
 
 import pathfind
+from result_cache import ResultCache, combined_hash, model_hash
 from src.travel_order_resolver import (
-    build_place_index,
-    build_place_pattern,
+    TOP_K_CANDIDATES,
+    ResolverEngine,
+    file_sha256,
     iter_input_lines,
-    load_places,
-    resolve_order,
+    normalize,
+    positive_int,
+    rank_candidates,
 )
 
 
 def process_order(
     sentence_id: str,
     sentence: str,
-    mapping: dict,
-    place_pattern: str,
-    place_index: dict[int, dict[str, list[tuple[str, str]]]],
-    max_place_tokens: int,
+    nlp_predictor: Callable[[str], tuple[str | None, str | None]],
     graph: dict,
     stops_index: dict,
     stop_names: dict,
     output_ids: bool = False,
-    nlp_predictor: Callable[[str], tuple[str | None, str | None]] | None = None,
+    route_finder: Callable[[str, str], list[str] | None] | None = None,
+    candidate_finder: Callable[[str], list[dict]] | None = None,
+    top_k: int = TOP_K_CANDIDATES,
 ) -> tuple[list[str], list[str], str]:
-    if nlp_predictor is not None:
-        origin, destination = nlp_predictor(sentence)
-    else:
-        origin, destination = resolve_order(
-            sentence, mapping, place_pattern, place_index, max_place_tokens
-        )
+    # `candidate_finder` gives the ranked pairs tried when the predicted one
+    # has no route.
+    origin, destination = nlp_predictor(sentence)
 
     if origin is None or destination is None:
         return [sentence_id, "INVALID", ""], [sentence_id, "INVALID", ""], "nlp_invalid"
 
+    def find_route(start: str, end: str) -> list[str] | None:
+        if route_finder is not None:
+            return route_finder(start, end)
+        return pathfind.pathfind(start, end, graph, stops_index)
+
     nlp_row = [sentence_id, origin, destination]
-    route = pathfind.pathfind(origin, destination, graph, stops_index)
+    status = "ok"
+    route = find_route(origin, destination)
+    if not route:
+        # Before giving up, try the next-best pairs of the same sentence.
+        pairs = candidate_finder(sentence) if candidate_finder is not None else []
+        for pair in pairs[:top_k]:
+            if (pair["origin"], pair["destination"]) == (origin, destination):
+                continue
+            route = find_route(pair["origin"], pair["destination"])
+            if route:
+                nlp_row = [sentence_id, pair["origin"], pair["destination"]]
+                status = "ok_alternative"
+                break
     if not route:
         return nlp_row, [sentence_id, "INVALID", ""], "path_invalid"
 
@@ -52,7 +68,37 @@ def process_order(
         path_row = [sentence_id] + route
     else:
         path_row = [sentence_id] + [stop_names.get(stop_id, stop_id) for stop_id in route]
-    return nlp_row, path_row, "ok"
+    return nlp_row, path_row, status
+
+
+def rule_based_predictors(
+    engine: ResolverEngine, top_k: int = TOP_K_CANDIDATES
+) -> tuple[Callable[[str], tuple[str | None, str | None]], Callable[[str], list[dict]]]:
+    # Each sentence is resolved once: the candidates of that pass are kept
+    # and only ranked when its answer has no route. Answers go through the
+    # engine's cache when it has one; a sentence answered from a cache (that
+    # one or the sqlite one) is resolved again only if its route fails.
+    last_ranking: dict[str, tuple] = {}
+
+    def predict(sentence: str) -> tuple[str | None, str | None]:
+        last_ranking.clear()
+        sentence_norm = normalize(sentence)
+        if engine.cache is not None:
+            answer = engine.cache.get(sentence_norm)
+            if answer is not None:
+                return answer
+        answer, ranking, evidence = engine.resolve_ranking(sentence)
+        last_ranking[sentence] = (answer, ranking, evidence)
+        if engine.cache is not None:
+            engine.cache.put(sentence_norm, answer)
+        return answer
+
+    def find_pairs(sentence: str) -> list[dict]:
+        kept = last_ranking.pop(sentence, None) or engine.resolve_ranking(sentence)
+        answer, ranking, evidence = kept
+        return rank_candidates(ranking, answer, top_k, evidence)["pairs"]
+
+    return predict, find_pairs
 
 
 def parse_sentence_line(line: str) -> tuple[str, str] | None:
@@ -98,16 +144,28 @@ def main() -> int:
         "--output-path", type=Path, default=ROOT / "reports" / "pipeline_path_output.csv"
     )
     parser.add_argument("--output-ids", action="store_true")
+    parser.add_argument(
+        "--top-k",
+        type=positive_int,
+        default=TOP_K_CANDIDATES,
+        help="Origin/destination pairs tried before a route is declared invalid.",
+    )
+    parser.add_argument(
+        "--cache-db",
+        type=Path,
+        default=None,
+        help="sqlite file caching NLP and route results across runs.",
+    )
     args = parser.parse_args()
 
     required = (args.places, args.graph, args.stops_index)
     if any(not path.exists() for path in required):
         return 1
 
-    mapping = load_places(args.places)
-    place_pattern = build_place_pattern(list(mapping.keys()))
-    place_index, max_place_tokens = build_place_index(mapping)
-    nlp_predictor: Callable[[str], tuple[str | None, str | None]] | None = None
+    engine = ResolverEngine.from_places(args.places)
+    nlp_predictor: Callable[[str], tuple[str | None, str | None]]
+    candidate_finder: Callable[[str], list[dict]] | None
+    nlp_predictor, candidate_finder = rule_based_predictors(engine, args.top_k)
 
     if args.nlp_backend == "camembert-ft":
         if not args.origin_model_dir.exists() or not args.destination_model_dir.exists():
@@ -125,9 +183,32 @@ def main() -> int:
             max_length=args.camembert_max_length,
         )
         nlp_predictor = predictor.predict_sentence
+        candidate_finder = None
 
-    graph = pathfind.load_graph(args.graph)
-    stops_index = pathfind.load_stops_index(args.stops_index)
+    # With a cache, the graph is only parsed once a route misses.
+    graph: dict = {}
+    stops_index: dict = {}
+    route_finder = None
+    cache = None
+    if args.cache_db is not None:
+        cache = ResultCache(args.cache_db)
+        if args.nlp_backend == "camembert-ft":
+            nlp_hash = model_hash([args.origin_model_dir, args.destination_model_dir])
+        else:
+            nlp_hash = file_sha256(args.places)
+        nlp_predictor = cache.cached_predictor(
+            nlp_predictor,
+            args.nlp_backend,
+            nlp_hash,
+            sentence_key=normalize if args.nlp_backend == "rule-based" else str.strip,
+        )
+        route_finder = cache.cached_route_finder(
+            pathfind.lazy_route_finder(args.graph, args.stops_index),
+            combined_hash([args.graph, args.stops_index]),
+        )
+    else:
+        graph = pathfind.load_graph(args.graph)
+        stops_index = pathfind.load_stops_index(args.stops_index)
     stop_names = pathfind.load_stop_names(args.stops_areas)
 
     args.output_nlp.parent.mkdir(parents=True, exist_ok=True)
@@ -135,6 +216,7 @@ def main() -> int:
 
     total = 0
     ok = 0
+    alternative_pairs = 0
     nlp_invalid = 0
     path_invalid = 0
 
@@ -153,20 +235,22 @@ def main() -> int:
             nlp_row, path_row, status = process_order(
                 sentence_id,
                 sentence,
-                mapping,
-                place_pattern,
-                place_index,
-                max_place_tokens,
+                nlp_predictor,
                 graph,
                 stops_index,
                 stop_names,
                 args.output_ids,
-                nlp_predictor,
+                route_finder,
+                candidate_finder,
+                args.top_k,
             )
             nlp_writer.writerow(nlp_row)
             path_writer.writerow(path_row)
             if status == "ok":
                 ok += 1
+            elif status == "ok_alternative":
+                ok += 1
+                alternative_pairs += 1
             elif status == "nlp_invalid":
                 nlp_invalid += 1
             else:
@@ -174,10 +258,15 @@ def main() -> int:
 
     print(f"total={total}")
     print(f"ok={ok}")
+    print(f"alternative_pairs={alternative_pairs}")
     print(f"nlp_invalid={nlp_invalid}")
     print(f"path_invalid={path_invalid}")
     print(f"output_nlp={args.output_nlp}")
     print(f"output_path={args.output_path}")
+    if cache is not None:
+        cache.close()
+        for key, value in cache.stats.items():
+            print(f"cache_{key}={value}")
     return 0
 
 
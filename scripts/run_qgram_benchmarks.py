@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import pathfind
+from run_distance_benchmarks import add_typo
+from src.travel_order_resolver import (
+    ResolverProfile,
+    build_place_index,
+    deep_sizeof,
+    find_best_variant,
+    load_places,
+)
+
+INDEX_KEYS = {"symspell": "_symspell", "qgram": "_qgram"}
+
+
+def noisy(value: str, rng: random.Random) -> str:
+    for _ in range(rng.randint(0, 3)):
+        value = add_typo(value, rng)
+    return value
+
+
+def structure_bytes(backend: str, structure) -> int:
+    # Index-specific data only; the variant list is shared by every backend.
+    if backend == "symspell":
+        return deep_sizeof(structure.deletes)
+    return deep_sizeof(structure.postings) + deep_sizeof(structure.by_length)
+
+
+def benchmark_gazetteer(mapping: dict, candidates: list[str]) -> dict:
+    results = {}
+    expected = None
+    for backend in ("scan", "symspell", "qgram"):
+        start = time.perf_counter()
+        place_index, _ = build_place_index(mapping, backend)
+        build_seconds = time.perf_counter() - start
+        profile = ResolverProfile()
+        start = time.perf_counter()
+        matches = [
+            find_best_variant(candidate, place_index.get(len(candidate.split()), {}), backend, profile)
+            for candidate in candidates
+        ]
+        lookup_seconds = time.perf_counter() - start
+        if expected is None:
+            expected = matches
+        elif matches != expected:
+            raise ValueError(f"{backend} lookups differ from the scan")
+        results[backend] = {
+            "build_seconds": build_seconds,
+            "lookup_us": lookup_seconds / len(candidates) * 1e6,
+            "verified_per_lookup": (profile.comparisons / profile.lookups) if profile.lookups else 0.0,
+        }
+        if backend in INDEX_KEYS:
+            results[backend]["index_bytes"] = sum(
+                structure_bytes(backend, buckets[INDEX_KEYS[backend]])
+                for buckets in place_index.values()
+            )
+    return results
+
+
+def benchmark_stops(index: dict, names: list[str]) -> dict:
+    results = {}
+    expected = None
+    for backend in ("scan", "qgram"):
+        start = time.perf_counter()
+        matches = [pathfind.resolve_stop_ids(index, name, backend) for name in names]
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = matches
+        elif matches != expected:
+            raise ValueError(f"{backend} stop ids differ from the scan")
+        results[backend] = {"query_us": seconds / len(names) * 1e6}
+    prefix_indexes = pathfind.STOP_PREFIX_INDEXES["by_token_count"]
+    results["qgram"]["prefix_indexes"] = {
+        str(token_count): {
+            "prefixes": len(prefix_index.prefixes),
+            "index_bytes": structure_bytes("qgram", prefix_index.qgrams),
+        }
+        for token_count, prefix_index in sorted(prefix_indexes.items())
+    }
+    results["qgram"]["index_bytes"] = sum(
+        entry["index_bytes"] for entry in results["qgram"]["prefix_indexes"].values()
+    )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare q-gram, deletion and scan fuzzy lookups.")
+    parser.add_argument(
+        "--places",
+        type=Path,
+        nargs="+",
+        default=[ROOT / "data" / "places_stops.txt", ROOT / "data" / "places_imported.txt"],
+    )
+    parser.add_argument("--stops-index", type=Path, default=ROOT / "data" / "stops_index.json")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=ROOT / "reports" / "qgram_index.json")
+    args = parser.parse_args()
+
+    if any(not path.exists() for path in [*args.places, args.stops_index]):
+        return 1
+
+    rng = random.Random(args.seed)
+    mapping = {}
+    for path in args.places:
+        mapping.update(load_places(path))
+    variants = list(mapping)
+    candidates = [noisy(rng.choice(variants), rng) for _ in range(args.lookups)]
+
+    stops_index = pathfind.load_stops_index(args.stops_index)
+    keys = list(stops_index)
+    names = []
+    for _ in range(args.lookups // 4):
+        tokens = rng.choice(keys).split()
+        names.append(noisy(" ".join(tokens[: rng.randint(1, len(tokens))]), rng))
+
+    results = {
+        "gazetteer": {
+            "variants": len(mapping),
+            "lookups": len(candidates),
+            "backends": benchmark_gazetteer(mapping, candidates),
+        },
+        "stops_index": {
+            "keys": len(stops_index),
+            "queries": len(names),
+            "backends": benchmark_stops(stops_index, names),
+        },
+    }
+    for section in ("gazetteer", "stops_index"):
+        for backend, row in results[section]["backends"].items():
+            timing = row.get("lookup_us", row.get("query_us"))
+            memory = row.get("index_bytes")
+            memory_text = f" index={memory / 2**20:.1f}MiB" if memory is not None else ""
+            print(f"{section} {backend}: {timing:.0f}us/lookup{memory_text}")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
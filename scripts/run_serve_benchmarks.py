@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from run_perf_benchmarks import display_path, load_sentences, percentile
+
+MODES = ("http", "http_batch", "line")
+
+
+async def http_call(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, path: str, payload: dict
+) -> tuple[int, dict]:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def run_http_client(
+    host: str, port: int, requests: list[tuple[str, dict]], cursor: list[int], stats: dict
+) -> None:
+    # Keep-alive connection taking the next request until the shared list runs out.
+    reader, writer = await asyncio.open_connection(host, port)
+    clock = time.perf_counter
+    try:
+        while cursor[0] < len(requests):
+            path, payload = requests[cursor[0]]
+            cursor[0] += 1
+            start = clock()
+            status, _ = await http_call(reader, writer, path, payload)
+            stats["latencies"].append(clock() - start)
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_line_client(host: str, port: int, lines: list[str], window: int, stats: dict) -> None:
+    # Pipelined: up to `window` lines are sent ahead of their replies.
+    reader, writer = await asyncio.open_connection(host, port)
+    clock = time.perf_counter
+    sent_at = []
+    slots = asyncio.Semaphore(window)
+
+    async def send() -> None:
+        for line in lines:
+            await slots.acquire()
+            sent_at.append(clock())
+            writer.write(line.encode("utf-8") + b"\n")
+            await writer.drain()
+
+    sender = asyncio.create_task(send())
+    for index in range(len(lines)):
+        reply = await reader.readline()
+        stats["latencies"].append(clock() - sent_at[index])
+        status = 200 if reply.endswith(b"\n") else 0
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+        slots.release()
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_mode(
+    mode: str,
+    addresses: dict,
+    sentences: list[str],
+    concurrency: int,
+    batch_size: int,
+    window: int,
+) -> dict:
+    stats = {"latencies": [], "statuses": {}}
+    if mode == "line":
+        host, port = addresses["line"]
+        shares = [sentences[offset::concurrency] for offset in range(concurrency)]
+        lines = [[f"{number},{sentence}" for number, sentence in enumerate(share)] for share in shares]
+        clients = [run_line_client(host, port, share, window, stats) for share in lines]
+    else:
+        host, port = addresses["http"]
+        if mode == "http":
+            requests = [("/resolve", {"sentence": sentence}) for sentence in sentences]
+        else:
+            batches = [
+                sentences[start : start + batch_size]
+                for start in range(0, len(sentences), batch_size)
+            ]
+            requests = [
+                ("/resolve/batch", {"requests": [{"sentence": sentence} for sentence in batch]})
+                for batch in batches
+            ]
+        cursor = [0]
+        clients = [run_http_client(host, port, requests, cursor, stats) for _ in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*clients)
+    seconds = time.perf_counter() - start
+
+    latencies = sorted(stats["latencies"])
+    return {
+        "requests": len(latencies),
+        "sentences": len(sentences),
+        "concurrency": concurrency,
+        "seconds": seconds,
+        "requests_per_second": (len(latencies) / seconds) if seconds else 0.0,
+        "sentences_per_second": (len(sentences) / seconds) if seconds else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] * 1000) if latencies else 0.0,
+        },
+        "statuses": {str(status): count for status, count in sorted(stats["statuses"].items())},
+    }
+
+
+def cold_cli_seconds(places: Path, sentence: str) -> float:
+    # What a caller pays per order when shelling out instead of using the server.
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(ROOT / "src" / "travel_order_resolver.py"), "--places", str(places)],
+        input=f"1,{sentence}\n",
+        text=True,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the resolver server.")
+    parser.add_argument("--input", type=Path, default=ROOT / "datasets" / "all_input.txt")
+    parser.add_argument("--places", type=Path, default=ROOT / "data" / "places.txt")
+    parser.add_argument("--limit", type=int, default=5000, help="Sentences sent per mode.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--window", type=int, default=4, help="Pipelined lines per line client.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers of the spawned server.")
+    parser.add_argument(
+        "--addresses",
+        default=None,
+        help='Target a running server, e.g. \'{"http": ["127.0.0.1", 8765]}\'.',
+    )
+    parser.add_argument("--output", type=Path, default=ROOT / "reports" / "serve_benchmarks.json")
+    args = parser.parse_args()
+
+    if not args.input.exists() or not args.places.exists():
+        return 1
+    sentences = load_sentences(args.input, args.limit)
+
+    server = None
+    if args.addresses is None:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                str(ROOT / "scripts" / "serve.py"),
+                "--places",
+                str(args.places),
+                "--port",
+                "0",
+                "--line-port",
+                "0",
+                "--workers",
+                str(args.workers),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        addresses = json.loads(server.stdout.readline())
+    else:
+        addresses = json.loads(args.addresses)
+
+    modes = {}
+    try:
+        for mode in args.modes:
+            if ("line" if mode == "line" else "http") not in addresses:
+                print(f"skipping {mode}: server does not expose it", file=sys.stderr)
+                continue
+            modes[mode] = asyncio.run(
+                run_mode(mode, addresses, sentences, args.concurrency, args.batch_size, args.window)
+            )
+            latency = modes[mode]["latency_ms"]
+            print(
+                f"{mode}: {modes[mode]['requests_per_second']:.0f} requests/s "
+                f"{modes[mode]['sentences_per_second']:.0f} sentences/s "
+                f"p50={latency['p50']:.2f}ms p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms "
+                f"statuses={modes[mode]['statuses']}"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    cold_seconds = cold_cli_seconds(args.places, sentences[0])
+    print(f"cold CLI call: {cold_seconds * 1000:.0f}ms")
+    results = {
+        "input": display_path(args.input.resolve()),
+        "places": display_path(args.places.resolve()),
+        "workers": args.workers if server is not None else None,
+        "cold_cli_call_seconds": cold_seconds,
+        "modes": modes,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
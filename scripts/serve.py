@@ -0,0 +1,697 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS = ROOT / "scripts"
+sys.path.append(str(ROOT))
+sys.path.append(str(SCRIPTS))
+
+import pathfind
+from src.travel_order_resolver import (
+    DEFAULT_FUZZY_BACKEND,
+    FUZZY_BACKENDS,
+    ResolverEngine,
+    SourceWatcher,
+    format_result,
+    load_numpy,
+    non_negative_int,
+    positive_int,
+    result_record,
+)
+
+OPERATIONS = ("resolve", "route")
+HTTP_ROUTES = {
+    "/resolve": ("resolve", False),
+    "/resolve/batch": ("resolve", True),
+    "/route": ("route", False),
+    "/route/batch": ("route", True),
+}
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_REQUESTS = 4096
+
+
+class RequestError(ValueError):
+    pass
+
+
+class ResolverService:
+    # Warm resolver and pathfinder, built once per worker for the server lifetime.
+    def __init__(
+        self,
+        places_path: Path,
+        fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+        artifact_path: Path | None = None,
+        cache_size: int = 0,
+        graph_path: Path | None = None,
+        stops_index_path: Path | None = None,
+        stops_areas_path: Path | None = None,
+    ):
+        self.engine = ResolverEngine.from_places(
+            places_path,
+            fuzzy_backend=fuzzy_backend,
+            artifact_path=artifact_path,
+            cache_size=cache_size,
+        )
+        # Load the fuzzy index now rather than on the first request with a typo.
+        self.engine.place_index
+        self.graph = None
+        self.stops_index: dict = {}
+        self.stop_names: dict = {}
+        if routing_available(graph_path, stops_index_path):
+            self.graph = pathfind.load_graph(graph_path)
+            self.stops_index = pathfind.load_stops_index(stops_index_path)
+            if stops_areas_path is not None and stops_areas_path.exists():
+                self.stop_names = pathfind.load_stop_names(stops_areas_path)
+
+    def resolve(self, request: dict) -> dict:
+        details = None
+        if request["details"]:
+            details = self.engine.resolve_details(request["sentence"])
+            origin, destination = details["origin"], details["destination"]
+        else:
+            origin, destination = self.engine.resolve(request["sentence"])
+        return result_record(request["id"], origin, destination, details)
+
+    def route(self, request: dict) -> dict:
+        if "sentence" in request:
+            origin, destination = self.engine.resolve(request["sentence"])
+        else:
+            origin, destination = request["origin"], request["destination"]
+        route = None
+        if origin and destination and self.graph is not None:
+            route = pathfind.pathfind(origin, destination, self.graph, self.stops_index)
+        if route and not request["ids"]:
+            route = [self.stop_names.get(stop_id, stop_id) for stop_id in route]
+        return {
+            "id": request["id"],
+            "origin": origin,
+            "destination": destination,
+            "route": route or None,
+            "valid": bool(route),
+        }
+
+
+def routing_available(graph_path: Path | None, stops_index_path: Path | None) -> bool:
+    return bool(
+        graph_path is not None
+        and stops_index_path is not None
+        and graph_path.exists()
+        and stops_index_path.exists()
+    )
+
+
+# Thread-local rather than a plain global: with --workers 0 a reload starts a
+# new worker thread in the same process while the old one finishes its jobs.
+WORKER = threading.local()
+
+
+def init_service(*args) -> None:
+    WORKER.service = ResolverService(*args)
+
+
+def worker_pid() -> int:
+    # Keeps the worker busy for a moment so that pings spread over every
+    # worker whose gazetteer is loaded.
+    time.sleep(0.01)
+    return os.getpid()
+
+
+def run_requests(operation: str, requests: list[dict]) -> list[dict]:
+    service = WORKER.service
+    handler = service.resolve if operation == "resolve" else service.route
+    return [handler(request) for request in requests]
+
+
+def make_executor(workers: int, service_args: tuple) -> Executor:
+    # workers=0 resolves on one thread of the server process, which keeps a
+    # single copy of the gazetteer but shares the GIL with the event loop.
+    if workers == 0:
+        return ThreadPoolExecutor(max_workers=1, initializer=init_service, initargs=service_args)
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_service, initargs=service_args)
+
+
+async def start_workers(workers: int, service_args: tuple) -> Executor:
+    # Returns once every worker has answered, i.e. has its gazetteer loaded.
+    executor = make_executor(workers, service_args)
+    loop = asyncio.get_running_loop()
+    expected = max(workers, 1)
+    seen = set()
+    try:
+        while len(seen) < expected:
+            seen.update(
+                await asyncio.gather(
+                    *(loop.run_in_executor(executor, worker_pid) for _ in range(expected))
+                )
+            )
+    except BaseException:
+        executor.shutdown(cancel_futures=True)
+        raise
+    return executor
+
+
+def parse_request(operation: str, payload) -> dict:
+    if not isinstance(payload, dict):
+        raise RequestError("expected a JSON object")
+    request = {"id": payload.get("id")}
+    if operation == "resolve" or "sentence" in payload:
+        if not isinstance(payload.get("sentence"), str):
+            raise RequestError("'sentence' must be a string")
+        request["sentence"] = payload["sentence"]
+    else:
+        for key in ("origin", "destination"):
+            if not isinstance(payload.get(key), str):
+                raise RequestError(f"'{key}' must be a string")
+            request[key] = payload[key]
+    if operation == "resolve":
+        request["details"] = bool(payload.get("details"))
+    else:
+        request["ids"] = bool(payload.get("ids"))
+    return request
+
+
+def parse_batch(operation: str, payload) -> list[dict]:
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise RequestError("expected a 'requests' list")
+    if len(items) > MAX_BATCH_REQUESTS:
+        raise RequestError(f"at most {MAX_BATCH_REQUESTS} requests per batch")
+    return [parse_request(operation, item) for item in items]
+
+
+class JobPool:
+    # At most `max_pending` jobs sit in the executor at once. Further jobs wait
+    # for a slot; overloaded() tells HTTP handlers to answer 503 instead of
+    # queueing once `max_waiting` jobs are already waiting.
+    def __init__(self, executor: Executor, max_pending: int, max_waiting: int):
+        self.executor = executor
+        self.max_pending = max_pending
+        self.max_waiting = max_waiting
+        self.slots = asyncio.Semaphore(max_pending)
+        self.pending = 0
+        self.waiting = 0
+        self.completed = 0
+        self.leases: Counter = Counter()
+        self.released = asyncio.Condition()
+
+    def swap(self, executor: Executor) -> Executor:
+        # Jobs already handed to the previous executor finish there.
+        previous = self.executor
+        self.executor = executor
+        return previous
+
+    @asynccontextmanager
+    async def lease(self):
+        # Pins the current executor for jobs that must all see one gazetteer,
+        # even if a reload swaps it while they wait for a slot.
+        executor = self.executor
+        self.leases[executor] += 1
+        try:
+            yield executor
+        finally:
+            self.leases[executor] -= 1
+            if not self.leases[executor]:
+                del self.leases[executor]
+            async with self.released:
+                self.released.notify_all()
+
+    async def retire(self, executor: Executor) -> None:
+        # Waits until no lease still holds a swapped-out executor.
+        async with self.released:
+            await self.released.wait_for(lambda: not self.leases[executor])
+
+    def overloaded(self) -> bool:
+        return self.slots.locked() and self.waiting >= self.max_waiting
+
+    async def run(self, function, *args, executor: Executor | None = None):
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor or self.executor, function, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self.slots.release()
+
+
+class GazetteerReloader:
+    # Starts a new set of workers in the background when a watched file
+    # changed, then swaps it in between two jobs. Requests keep seeing one
+    # consistent gazetteer and graph, and traffic never waits for a rebuild.
+    def __init__(
+        self,
+        server: "ResolverServer",
+        watcher: SourceWatcher,
+        workers: int,
+        service_args: tuple,
+        interval: float,
+    ):
+        self.server = server
+        self.watcher = watcher
+        self.workers = workers
+        self.service_args = service_args
+        self.interval = interval
+        self.checks = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_build_seconds: float | None = None
+        self.last_reload_at: float | None = None
+        self.last_changed: list[str] = []
+        self.last_error: str | None = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            # Hashing reads whole files, so it stays off the event loop.
+            changed = await loop.run_in_executor(None, self.watcher.changed)
+            self.checks += 1
+            if changed:
+                await self.reload(changed)
+
+    async def reload(self, changed: list[Path]) -> bool:
+        self.last_changed = [str(path) for path in changed]
+        start = time.perf_counter()
+        try:
+            executor = await start_workers(self.workers, self.service_args)
+        except Exception as exc:
+            self.failures += 1
+            self.last_error = repr(exc)
+            print(f"reload failed, keeping the current gazetteer: {exc!r}", file=sys.stderr)
+            return False
+        self.last_build_seconds = time.perf_counter() - start
+        previous = self.server.pool.swap(executor)
+        self.server.routing = routing_available(self.service_args[4], self.service_args[5])
+        self.reloads += 1
+        self.last_reload_at = time.time()
+        await self.server.pool.retire(previous)
+        await asyncio.get_running_loop().run_in_executor(None, previous.shutdown)
+        return True
+
+    def report(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_build_seconds": self.last_build_seconds,
+            "last_reload_at": self.last_reload_at,
+            "last_changed": self.last_changed,
+            "last_error": self.last_error,
+            "versions": self.watcher.versions(),
+        }
+
+
+def http_response(status: int, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        headers.append("Retry-After: 1")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("ascii") + body
+
+
+class ResolverServer:
+    def __init__(
+        self,
+        pool: JobPool,
+        routing: bool,
+        chunk_size: int = 64,
+        pipeline_depth: int = 64,
+        workers: int = 1,
+    ):
+        self.pool = pool
+        self.routing = routing
+        self.chunk_size = chunk_size
+        self.pipeline_depth = pipeline_depth
+        self.workers = workers
+        self.started = time.time()
+        self.requests: Counter = Counter()
+        self.rejected = 0
+        self.errors = 0
+        self.reloader: GazetteerReloader | None = None
+
+    async def submit(self, operation: str, requests: list[dict]) -> list[dict]:
+        # Batches are split so that several workers can share one of them.
+        chunks = [
+            requests[start : start + self.chunk_size]
+            for start in range(0, len(requests), self.chunk_size)
+        ]
+        # Every chunk runs on the executor current when the batch arrived, so a
+        # reload while chunks wait for a slot cannot mix two gazetteers.
+        async with self.pool.lease() as executor:
+            chunk_results = await asyncio.gather(
+                *(
+                    self.pool.run(run_requests, operation, chunk, executor=executor)
+                    for chunk in chunks
+                )
+            )
+        self.requests[operation] += len(requests)
+        return [result for chunk in chunk_results for result in chunk]
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "workers": self.workers,
+            "routing": self.routing,
+            "pending_jobs": self.pool.pending,
+            "waiting_jobs": self.pool.waiting,
+            "completed_jobs": self.pool.completed,
+            "requests": dict(self.requests),
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "reload": self.reloader.report() if self.reloader is not None else None,
+        }
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        path = target.split("?", 1)[0]
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return 200, self.health()
+        if path not in HTTP_ROUTES:
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        operation, batch = HTTP_ROUTES[path]
+        if operation == "route" and not self.routing:
+            return 404, {"error": "routing is disabled: graph or stops index missing"}
+        try:
+            payload = json.loads(body or b"null")
+            if batch:
+                requests = parse_batch(operation, payload)
+            else:
+                requests = [parse_request(operation, payload)]
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        if self.pool.overloaded():
+            self.rejected += 1
+            return 503, {"error": "overloaded, retry later"}
+        try:
+            results = await self.submit(operation, requests)
+        except Exception as exc:
+            self.errors += 1
+            print(f"{operation} failed: {exc!r}", file=sys.stderr)
+            return 500, {"error": "internal error"}
+        return 200, {"results": results} if batch else results[0]
+
+    async def handle_http(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    writer.write(http_response(400, {"error": "malformed request line"}, False))
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_BYTES:
+                    status = 400 if length < 0 else 413
+                    writer.write(http_response(status, {"error": "bad content length"}, False))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, payload = await self.dispatch(method, target, body)
+                writer.write(http_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            await close_writer(writer)
+
+    async def answer_line(self, text: str) -> str:
+        # JSON lines carry {"op": "resolve"|"route", ...} and get a JSON reply;
+        # any other line is "id,sentence" and gets the CLI's csv line back.
+        if text.startswith("{"):
+            try:
+                payload = json.loads(text)
+                operation = payload.get("op", "resolve") if isinstance(payload, dict) else None
+                if operation not in OPERATIONS:
+                    raise RequestError("'op' must be 'resolve' or 'route'")
+                if operation == "route" and not self.routing:
+                    raise RequestError("routing is disabled: graph or stops index missing")
+                request = parse_request(operation, payload)
+            except ValueError as exc:
+                return json.dumps({"error": str(exc)})
+            results = await self.submit(operation, [request])
+            return json.dumps(results[0], ensure_ascii=False)
+        sentence_id, sentence = text.split(",", 1) if "," in text else ("", text)
+        request = {"id": sentence_id, "sentence": sentence, "details": False}
+        result = (await self.submit("resolve", [request]))[0]
+        return format_result(sentence_id, result["origin"], result["destination"])
+
+    async def handle_lines(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Replies keep request order. Once `pipeline_depth` lines of this
+        # connection are unanswered the socket is no longer read, so a fast
+        # client is slowed down by TCP instead of growing server memory.
+        replies: asyncio.Queue = asyncio.Queue(self.pipeline_depth)
+
+        async def send() -> None:
+            connected = True
+            while True:
+                task = await replies.get()
+                if task is None:
+                    break
+                try:
+                    reply = await task
+                except Exception as exc:
+                    self.errors += 1
+                    print(f"line request failed: {exc!r}", file=sys.stderr)
+                    reply = json.dumps({"error": "internal error"})
+                if not connected:
+                    continue
+                try:
+                    writer.write(reply.encode("utf-8") + b"\n")
+                    if replies.empty():
+                        await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not text.strip():
+                    continue
+                await replies.put(asyncio.create_task(self.answer_line(text)))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            await replies.put(None)
+            await sender
+            await close_writer(writer)
+
+
+async def close_writer(writer: asyncio.StreamWriter) -> None:
+    writer.close()
+    # Handlers still closing at shutdown get cancelled here; they are done anyway.
+    with suppress(ConnectionError, asyncio.CancelledError):
+        await writer.wait_closed()
+
+
+async def start_servers(
+    server: ResolverServer,
+    host: str,
+    http_port: int | None,
+    line_port: int | None,
+    unix_path: Path | None,
+) -> tuple[list[asyncio.Server], dict]:
+    servers = []
+    addresses = {}
+    if http_port is not None:
+        http_server = await asyncio.start_server(server.handle_http, host, http_port)
+        servers.append(http_server)
+        addresses["http"] = list(http_server.sockets[0].getsockname()[:2])
+    if line_port is not None:
+        line_server = await asyncio.start_server(server.handle_lines, host, line_port)
+        servers.append(line_server)
+        addresses["line"] = list(line_server.sockets[0].getsockname()[:2])
+    if unix_path is not None:
+        with suppress(FileNotFoundError):
+            unix_path.unlink()
+        servers.append(await asyncio.start_unix_server(server.handle_lines, str(unix_path)))
+        addresses["unix"] = str(unix_path)
+    return servers, addresses
+
+
+async def serve(args: argparse.Namespace) -> None:
+    service_args = (
+        args.places,
+        args.fuzzy_backend,
+        args.artifact,
+        args.cache_size,
+        args.graph,
+        args.stops_index,
+        args.stops_areas,
+    )
+    # Files are fingerprinted before the workers read them, so that a change
+    # made while they start is still seen.
+    watcher = SourceWatcher(
+        [args.places, args.artifact, args.graph, args.stops_index, args.stops_areas]
+    )
+    executor = await start_workers(args.workers, service_args)
+    pool = JobPool(executor, args.max_pending or max(args.workers, 1) * 2, args.max_waiting)
+    loop = asyncio.get_running_loop()
+    try:
+        server = ResolverServer(
+            pool,
+            routing_available(args.graph, args.stops_index),
+            args.chunk_size,
+            args.pipeline_depth,
+            args.workers,
+        )
+        reloading = None
+        if args.watch_interval > 0:
+            server.reloader = GazetteerReloader(
+                server, watcher, args.workers, service_args, args.watch_interval
+            )
+            reloading = asyncio.create_task(server.reloader.run())
+        servers, addresses = await start_servers(
+            server, args.host, None if args.no_http else args.port, args.line_port, args.unix
+        )
+        addresses["routing"] = server.routing
+        print(json.dumps(addresses), flush=True)
+
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await stop.wait()
+        if reloading is not None:
+            reloading.cancel()
+        for listener in servers:
+            listener.close()
+            await listener.wait_closed()
+    finally:
+        pool.executor.shutdown(cancel_futures=True)
+        if args.unix is not None:
+            with suppress(FileNotFoundError):
+                args.unix.unlink()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Serve the resolver and pathfinder over HTTP and a line protocol."
+    )
+    parser.add_argument("--places", type=Path, default=ROOT / "data" / "places.txt")
+    parser.add_argument("--fuzzy-backend", choices=FUZZY_BACKENDS, default=DEFAULT_FUZZY_BACKEND)
+    parser.add_argument("--artifact", type=Path, default=None)
+    parser.add_argument("--cache-size", type=non_negative_int, default=0)
+    parser.add_argument("--graph", type=Path, default=ROOT / "data" / "graph.json")
+    parser.add_argument("--stops-index", type=Path, default=ROOT / "data" / "stops_index.json")
+    parser.add_argument("--stops-areas", type=Path, default=ROOT / "data" / "stops_areas.csv")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP port (0 picks a free one).")
+    parser.add_argument("--no-http", action="store_true", help="Only serve the line protocol.")
+    parser.add_argument(
+        "--line-port",
+        type=int,
+        default=None,
+        help="Also serve the newline-delimited protocol on this TCP port (0 picks one).",
+    )
+    parser.add_argument(
+        "--unix", type=Path, default=None, help="Serve the line protocol on this Unix socket."
+    )
+    parser.add_argument(
+        "--workers",
+        type=non_negative_int,
+        default=1,
+        help="Resolver processes (0 resolves on a thread of the server process).",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=positive_int,
+        default=None,
+        help="Jobs handed to the workers at once (default: 2 per worker).",
+    )
+    parser.add_argument(
+        "--max-waiting",
+        type=non_negative_int,
+        default=256,
+        help="Jobs allowed to wait for a worker before HTTP requests get a 503.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=positive_int,
+        default=64,
+        help="Requests of a batch sent to a worker as one job.",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=positive_int,
+        default=64,
+        help="Unanswered lines per line-protocol connection before it stops being read.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between checks of the places, graph and stops files (0 disables reloads).",
+    )
+    args = parser.parse_args()
+
+    if args.fuzzy_backend == "numpy" and not load_numpy():
+        print("NumPy is required for --fuzzy-backend numpy.", file=sys.stderr)
+        return 1
+    if args.no_http and args.line_port is None and args.unix is None:
+        print("--no-http needs --line-port or --unix.", file=sys.stderr)
+        return 1
+    if not args.places.exists():
+        print(f"Places file not found: {args.places}", file=sys.stderr)
+        return 1
+
+    asyncio.run(serve(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,43 @@
 #!/usr/bin/env python3
 import argparse
+import codecs
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import queue
 import re
 import sys
-import urllib.request
+import threading
+import time
 import unicodedata
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from itertools import chain
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Iterable, Iterator
 
+np = None
 
-def normalize(text: str) -> str:
+
+def load_numpy() -> bool:
+    # numpy only backs the optional "numpy" fuzzy backend and costs more to
+    # import than a compiled gazetteer costs to load, so import it on demand.
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ModuleNotFoundError:
+            return False
+        np = numpy
+    return True
+
+
+def normalize_slow(text: str) -> str:
     text = text.lower()
     text = unicodedata.normalize("NFD", text)
     text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
@@ -18,8 +47,48 @@ def normalize(text: str) -> str:
     return text
 
 
+# Basic Latin, Latin-1 Supplement and Latin Extended-A/B.
+NORMALIZE_TABLE_LIMIT = 0x250
+
+
+def build_normalize_tables() -> tuple[bytes, dict[int, str]]:
+    # Below U+0250 lowercasing, decomposition and mark stripping act on each
+    # character independently, so the slow path can be tabulated per
+    # character; the whitespace run collapsing is redone with split/join.
+    latin_table = {}
+    for code in range(NORMALIZE_TABLE_LIMIT):
+        char = chr(code)
+        value = char.lower()
+        value = unicodedata.normalize("NFD", value)
+        value = "".join(ch for ch in value if unicodedata.category(ch) != "Mn")
+        value = re.sub(r"[^a-z0-9\s-]", " ", value)
+        value = value.replace("-", " ")
+        if value != char:
+            latin_table[code] = value
+    ascii_table = bytes(
+        ord(latin_table.get(code, chr(code))[:1] or " ") for code in range(256)
+    )
+    return ascii_table, latin_table
+
+
+ASCII_NORMALIZE_TABLE, LATIN_NORMALIZE_TABLE = build_normalize_tables()
+LATIN_LIMIT_CHAR = chr(NORMALIZE_TABLE_LIMIT)
+
+
+def normalize(text: str) -> str:
+    if text.isascii():
+        text = text.encode("ascii").translate(ASCII_NORMALIZE_TABLE).decode("ascii")
+    elif max(text) < LATIN_LIMIT_CHAR:
+        text = text.translate(LATIN_NORMALIZE_TABLE)
+    else:
+        return normalize_slow(text)
+    return " ".join(text.split())
+
+
 def load_places(path: Path) -> dict:
+    # Aliases of one place share a single canonical string object.
     variants = {}
+    canonicals: dict[str, str] = {}
     with path.open("r", encoding="utf-8") as handle:
         for line in handle:
             name = line.strip()
@@ -33,7 +102,7 @@ def load_places(path: Path) -> dict:
             if not alias or not canonical:
                 continue
             variant = normalize(alias)
-            variants[variant] = canonical
+            variants[variant] = canonicals.setdefault(canonical, canonical)
     return variants
 
 
@@ -47,21 +116,271 @@ def build_place_pattern(variants: list[str]) -> str:
     return rf"(?<!\w)(?:{combined})(?!\w)"
 
 
-def build_place_index(mapping: dict) -> tuple[dict[int, dict[str, list[tuple[str, str]]]], int]:
-    index = {}
+class PlaceTrie:
+    # Token-level trie over the normalized variants. Matching walks the sentence
+    # tokens once and yields the same leftmost-longest spans as the alternation
+    # built by build_place_pattern.
+    def __init__(self, mapping: dict):
+        self.root: dict = {}
+        self.size = 0
+        tokens_seen: dict[str, str] = {}
+        for variant, canonical in mapping.items():
+            tokens = variant.split()
+            if not tokens:
+                continue
+            node = self.root
+            for token in tokens:
+                token = tokens_seen.setdefault(token, token)
+                node = node.setdefault(token, {})
+            if None not in node:
+                self.size += 1
+            node[None] = canonical
+        # The trie is read-only from here on: leaves ending on the same place
+        # become one shared {None: canonical} node.
+        leaves: dict[str, dict] = {}
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for token, child in node.items():
+                if token is None:
+                    continue
+                if len(child) == 1 and None in child:
+                    node[token] = leaves.setdefault(child[None], child)
+                else:
+                    stack.append(child)
+
+    def longest_at(self, tokens: list[tuple[str, int, int]], index: int) -> tuple[int, str] | None:
+        node = self.root
+        best = None
+        for position in range(index, len(tokens)):
+            node = node.get(tokens[position][0])
+            if node is None:
+                break
+            canonical = node.get(None)
+            if canonical is not None:
+                best = (position + 1, canonical)
+        return best
+
+    def find_spans(
+        self,
+        sentence_norm: str,
+        tokens: list[tuple[str, int, int]] | None = None,
+    ) -> list[tuple[int, int, str]]:
+        if tokens is None:
+            tokens = tokenize_with_positions(sentence_norm)
+        spans = []
+        index = 0
+        while index < len(tokens):
+            match = self.longest_at(tokens, index)
+            if match is None:
+                index += 1
+                continue
+            end_index, canonical = match
+            spans.append((tokens[index][1], tokens[end_index - 1][2], canonical))
+            index = end_index
+        return spans
+
+
+FUZZY_BACKENDS = ("scan", "symspell", "qgram", "numpy")
+# qgram is the fastest backend on every benchmarked gazetteer. symspell builds
+# the distance-3 deletion neighbourhood of each lookup, however small the
+# gazetteer is.
+DEFAULT_FUZZY_BACKEND = "qgram"
+
+
+class VariantTable:
+    # The variants of one token length concatenated in a single string with
+    # array('I') offsets, and their canonical names as ids into a list shared
+    # by the whole gazetteer, instead of one (variant, canonical) tuple each.
+    # Indexing still returns (variant, canonical) pairs.
+    def __init__(self, text: str, offsets: array, canonical_ids: array, canonicals: list[str]):
+        self.text = text
+        self.offsets = offsets
+        self.canonical_ids = canonical_ids
+        self.canonicals = canonicals
+
+    @classmethod
+    def build(
+        cls,
+        variants: Iterable[tuple[str, str]],
+        canonicals: list[str] | None = None,
+        canonical_ids: dict[str, int] | None = None,
+    ) -> "VariantTable":
+        canonicals = [] if canonicals is None else canonicals
+        if canonical_ids is None:
+            canonical_ids = {canonical: number for number, canonical in enumerate(canonicals)}
+        parts = []
+        offsets = array("I", [0])
+        ids = array("I")
+        for variant, canonical in variants:
+            parts.append(variant)
+            offsets.append(offsets[-1] + len(variant))
+            canonical_id = canonical_ids.get(canonical)
+            if canonical_id is None:
+                canonical_id = canonical_ids[canonical] = len(canonicals)
+                canonicals.append(canonical)
+            ids.append(canonical_id)
+        return cls("".join(parts), offsets, ids, canonicals)
+
+    def __len__(self) -> int:
+        return len(self.canonical_ids)
+
+    def variant(self, variant_id: int) -> str:
+        return self.text[self.offsets[variant_id] : self.offsets[variant_id + 1]]
+
+    def canonical(self, variant_id: int) -> str:
+        return self.canonicals[self.canonical_ids[variant_id]]
+
+    def __getitem__(self, variant_id: int) -> tuple[str, str]:
+        if not 0 <= variant_id < len(self.canonical_ids):
+            raise IndexError(variant_id)
+        return self.variant(variant_id), self.canonical(variant_id)
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        text = self.text
+        offsets = self.offsets
+        canonicals = self.canonicals
+        for variant_id, canonical_id in enumerate(self.canonical_ids):
+            yield text[offsets[variant_id] : offsets[variant_id + 1]], canonicals[canonical_id]
+
+    def variants(self) -> list[str]:
+        return [variant for variant, _ in self]
+
+    def state(self) -> tuple:
+        # Builtin containers only, for the compiled gazetteer.
+        return self.text, self.offsets, self.canonical_ids, self.canonicals
+
+
+def build_place_index(
+    mapping: dict,
+    fuzzy_backend: str = "scan",
+) -> tuple[dict[int, dict], int]:
+    # Per token length: "_all" is the VariantTable of that length, each first
+    # character maps to the array('I') of ids starting with it, and the
+    # "_"-prefixed fuzzy structures refer to variants by id as well.
+    if fuzzy_backend not in FUZZY_BACKENDS:
+        raise ValueError(f"Unknown fuzzy backend: {fuzzy_backend}")
+    if fuzzy_backend == "numpy" and not load_numpy():
+        raise ModuleNotFoundError("The numpy fuzzy backend requires numpy.")
+    by_length: dict[int, list[tuple[str, str]]] = {}
     max_tokens = 1
     for variant, canonical in mapping.items():
-        tokens = variant.split()
-        length = len(tokens)
+        length = len(variant.split())
         max_tokens = max(max_tokens, length)
-        if length not in index:
-            index[length] = {"_all": []}
-        index[length]["_all"].append((variant, canonical))
-        first_char = tokens[0][0] if tokens and tokens[0] else ""
-        index[length].setdefault(first_char, []).append((variant, canonical))
+        by_length.setdefault(length, []).append((variant, canonical))
+    canonicals: list[str] = []
+    canonical_ids: dict[str, int] = {}
+    index = {}
+    for length, variants in by_length.items():
+        table = VariantTable.build(variants, canonicals, canonical_ids)
+        buckets: dict = {"_all": table}
+        for variant_id, (variant, _) in enumerate(variants):
+            buckets.setdefault(variant[:1], array("I")).append(variant_id)
+        buckets["_windows"] = build_window_filter(table)
+        index[length] = buckets
+    if fuzzy_backend == "symspell":
+        for buckets in index.values():
+            buckets["_symspell"] = DeletionIndex(buckets["_all"])
+    elif fuzzy_backend == "qgram":
+        for buckets in index.values():
+            buckets["_qgram"] = QGramIndex(buckets["_all"].variants())
+    elif fuzzy_backend == "numpy":
+        for buckets in index.values():
+            buckets["_numpy"] = VariantMatrix(buckets["_all"])
     return index, max_tokens
 
 
+def mapping_fingerprint(mapping: dict) -> str:
+    # Insertion order is part of the fingerprint: it decides ties between
+    # variants at the same distance.
+    digest = hashlib.sha256()
+    for variant, canonical in mapping.items():
+        digest.update(f"{variant}\t{canonical}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+MAPPING_FINGERPRINTS: dict[int, tuple[dict, int, str]] = {}
+
+
+def cached_mapping_fingerprint(mapping: dict) -> str:
+    # Keyed on the mapping object, which the entry keeps alive so that its id
+    # is not reused; a mapping whose size changed is hashed again.
+    entry = MAPPING_FINGERPRINTS.get(id(mapping))
+    if entry is None or entry[1] != len(mapping):
+        entry = (mapping, len(mapping), mapping_fingerprint(mapping))
+        MAPPING_FINGERPRINTS[id(mapping)] = entry
+    return entry[2]
+
+
+SHARED_PLACE_INDEXES: dict[tuple[str, str], dict] = {}
+SHARED_PLACE_INDEX_LOCK = threading.Lock()
+
+
+def shared_place_index(
+    mapping: dict,
+    fuzzy_backend: str = "scan",
+    loader: Callable[[], tuple[dict, int]] | None = None,
+    fingerprint: str | None = None,
+) -> dict:
+    # One place index per gazetteer content and fuzzy backend for the whole
+    # process; `loader` replaces build_place_index (e.g. a compiled artifact).
+    key = (fingerprint or cached_mapping_fingerprint(mapping), fuzzy_backend)
+    with SHARED_PLACE_INDEX_LOCK:
+        entry = SHARED_PLACE_INDEXES.get(key)
+        if entry is None:
+            start = time.perf_counter()
+            if loader is None:
+                place_index, max_place_tokens = build_place_index(mapping, fuzzy_backend)
+            else:
+                place_index, max_place_tokens = loader()
+            entry = {
+                "fingerprint": key[0],
+                "fuzzy_backend": fuzzy_backend,
+                "variants": len(mapping),
+                "build_seconds": time.perf_counter() - start,
+                "requests": 0,
+                "place_index": place_index,
+                "max_place_tokens": max_place_tokens,
+            }
+            SHARED_PLACE_INDEXES[key] = entry
+        entry["requests"] += 1
+    return entry
+
+
+def deep_sizeof(value: object) -> int:
+    total = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(vars(item))
+    return total
+
+
+def place_index_stats(memory: bool = False) -> list[dict]:
+    stats = []
+    for entry in SHARED_PLACE_INDEXES.values():
+        row = {
+            key: value
+            for key, value in entry.items()
+            if key not in ("place_index", "max_place_tokens")
+        }
+        if memory:
+            row["memory_bytes"] = deep_sizeof(entry["place_index"])
+        stats.append(row)
+    return stats
+
+
 def tokenize_with_positions(sentence_norm: str) -> list[tuple[str, int, int]]:
     return [
         (match.group(0), match.start(), match.end())
@@ -69,8 +388,14 @@ def tokenize_with_positions(sentence_norm: str) -> list[tuple[str, int, int]]:
     ]
 
 
+MAX_FUZZY_DISTANCE = 3
+
+
 def max_distance(value: str) -> int:
-    length = len(value)
+    return max_distance_for_length(len(value))
+
+
+def max_distance_for_length(length: int) -> int:
     if length <= 4:
         return 0
     if length <= 6:
@@ -108,30 +433,449 @@ def levenshtein(a: str, b: str) -> int:
     return distance[-1][-1]
 
 
-def find_best_variant(
+BIT_PARALLEL_MAX_LENGTH = 64
+
+
+def _bit_parallel_levenshtein(a: str, b: str, threshold: int) -> int:
+    # Hyyro's bit-vector edit distance with the transposition term, so it
+    # agrees with levenshtein() (optimal string alignment).
+    length = len(a)
+    mask = (1 << length) - 1
+    last_bit = 1 << (length - 1)
+    peq: dict[str, int] = {}
+    for position, char in enumerate(a):
+        peq[char] = peq.get(char, 0) | (1 << position)
+
+    vp = mask
+    vn = 0
+    d0 = 0
+    previous_pm = 0
+    score = length
+    remaining = len(b)
+    for char in b:
+        pm = peq.get(char, 0)
+        transposition = (((~d0) & pm) << 1) & previous_pm
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | transposition) & mask
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & last_bit:
+            score += 1
+        elif hn & last_bit:
+            score -= 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = (hn | ~(d0 | hp)) & mask
+        vn = d0 & hp
+        previous_pm = pm
+        remaining -= 1
+        # The last row moves by at most one per column.
+        if score - remaining > threshold:
+            return threshold + 1
+    return score if score <= threshold else threshold + 1
+
+
+def _banded_levenshtein(a: str, b: str, threshold: int) -> int:
+    limit = threshold + 1
+    cols = len(b) + 1
+    before_previous: list[int] = []
+    previous = [j if j <= threshold else limit for j in range(cols)]
+    for i in range(1, len(a) + 1):
+        current = [limit] * cols
+        current[0] = i if i <= threshold else limit
+        row_min = current[0]
+        char = a[i - 1]
+        for j in range(max(1, i - threshold), min(cols - 1, i + threshold) + 1):
+            cost = 0 if char == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before_previous[j - 2] + 1)
+            if value > limit:
+                value = limit
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > threshold:
+            return limit
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+def bounded_levenshtein(a: str, b: str, threshold: int) -> int:
+    # Same distance as levenshtein() when it is <= threshold, threshold + 1 otherwise.
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > threshold:
+        return threshold + 1
+    if not a or not b:
+        return max(len(a), len(b))
+    if len(a) <= BIT_PARALLEL_MAX_LENGTH:
+        return _bit_parallel_levenshtein(a, b, threshold)
+    return _banded_levenshtein(a, b, threshold)
+
+
+def deletion_neighbourhood(value: str, distance: int) -> set[str]:
+    keys = {value}
+    frontier = {value}
+    for _ in range(distance):
+        frontier = {item[:i] + item[i + 1 :] for item in frontier for i in range(len(item))}
+        keys |= frontier
+    return keys
+
+
+class DeletionIndex:
+    # SymSpell-style index: every variant is stored under the strings reachable
+    # by deleting up to max_distance(variant) characters from its last
+    # `suffix_length` characters. If two strings are within d edits, their
+    # aligned suffixes share such a deletion, so querying the candidate suffixes
+    # whose length is within MAX_FUZZY_DISTANCE of `suffix_length` finds every
+    # variant the full scan would accept. Candidates are then verified.
+    # Most keys lead to a single variant: such postings are stored as the bare
+    # id, longer ones as compact_ids() sequences.
+    def __init__(
+        self,
+        variants: "VariantTable | list[tuple[str, str]]",
+        suffix_length: int = 7,
+        deletes: dict[str, "int | tuple[int, ...] | array"] | None = None,
+    ):
+        self.variants = variants
+        self.suffix_length = suffix_length
+        if deletes is not None:
+            self.deletes = deletes
+            return
+        postings: dict[str, list[int]] = {}
+        for variant_id, (variant, _) in enumerate(variants):
+            suffix = variant[-suffix_length:]
+            for key in deletion_neighbourhood(suffix, max_distance(variant)):
+                postings.setdefault(key, []).append(variant_id)
+        self.deletes = {key: compact_ids(ids) for key, ids in postings.items()}
+
+    def _query_keys(self, candidate: str) -> set[str]:
+        lengths = {
+            length
+            for length in range(
+                self.suffix_length - MAX_FUZZY_DISTANCE,
+                self.suffix_length + MAX_FUZZY_DISTANCE + 1,
+            )
+            if 0 < length <= len(candidate)
+        }
+        if len(candidate) <= self.suffix_length + MAX_FUZZY_DISTANCE:
+            lengths.add(len(candidate))
+        keys = set()
+        for length in lengths:
+            keys |= deletion_neighbourhood(candidate[-length:], MAX_FUZZY_DISTANCE)
+        return keys
+
+    def variant_ids(self, candidate: str) -> set[int]:
+        variant_ids = set()
+        deletes = self.deletes
+        for key in self._query_keys(candidate):
+            ids = deletes.get(key)
+            if ids is None:
+                continue
+            if ids.__class__ is int:
+                variant_ids.add(ids)
+            else:
+                variant_ids.update(ids)
+        return variant_ids
+
+    def lookup(
+        self, candidate: str, profile: "ResolverProfile | None" = None
+    ) -> tuple[str, int] | None:
+        return pick_best_variant(candidate, self.variants, self.variant_ids(candidate), profile)
+
+
+COMPACT_TUPLE_MAX = 6
+
+
+def compact_ids(ids: list[int]) -> "int | tuple[int, ...] | array":
+    # A bare int for one id, a tuple up to COMPACT_TUPLE_MAX ids (a tuple of
+    # already existing ints is smaller than an array there), array('I') above.
+    if len(ids) == 1:
+        return ids[0]
+    if len(ids) <= COMPACT_TUPLE_MAX:
+        return tuple(ids)
+    return array("I", ids)
+
+
+def pick_best_variant(
     candidate: str,
-    buckets: dict[str, list[tuple[str, str]]],
+    variants: VariantTable,
+    variant_ids: Iterable[int],
+    profile: "ResolverProfile | None" = None,
 ) -> tuple[str, int] | None:
-    best: tuple[str, int] | None = None
+    # Verifies index candidates with the scan's preference: same first letter
+    # first, then the rest, earliest variant wins on ties.
+    variant_ids = sorted(variant_ids)
+    if profile is not None:
+        profile.comparisons += len(variant_ids)
+    text = variants.text
+    offsets = variants.offsets
+    first_char = candidate[:1]
+    best_same_first = None
+    best_any = None
+    for variant_id in variant_ids:
+        variant = text[offsets[variant_id] : offsets[variant_id + 1]]
+        threshold = max_distance(variant)
+        distance = bounded_levenshtein(candidate, variant, threshold)
+        if distance > threshold:
+            continue
+        if variant[:1] == first_char:
+            if best_same_first is None or distance < best_same_first[1]:
+                best_same_first = (variants.canonical(variant_id), distance)
+        if best_any is None or distance < best_any[1]:
+            best_any = (variants.canonical(variant_id), distance)
+    return best_same_first if best_same_first is not None else best_any
 
-    def update_best(variants: list[tuple[str, str]], current_best: tuple[str, int] | None):
-        best_local = current_best
-        for variant, canonical in variants:
-            distance = levenshtein(candidate, variant)
-            if distance > max_distance(variant):
+
+QGRAM_PAD_START = "\x02"
+QGRAM_PAD_END = "\x03"
+
+
+def numbered_qgrams(value: str, q: int = 3) -> list[str]:
+    # Padded q-grams; the n-th repeat of a q-gram gets an occurrence suffix,
+    # so set intersections of numbered q-grams are multiset intersections.
+    padded = QGRAM_PAD_START * (q - 1) + value + QGRAM_PAD_END * (q - 1)
+    seen: dict[str, int] = {}
+    grams = []
+    for start in range(len(padded) - q + 1):
+        gram = padded[start : start + q]
+        count = seen.get(gram, 0) + 1
+        seen[gram] = count
+        grams.append(gram if count == 1 else f"{gram}\x01{count}")
+    return grams
+
+
+class QGramIndex:
+    # Inverted index from padded character q-grams to string ids, one sorted
+    # compact_ids() posting list per q-gram and string length (keyed by the
+    # q-gram, "\x00" and chr(length), cheaper than tuples). Two strings within
+    # k edits (optimal string alignment) share at least
+    # max(len) + q - 1 - k * (q + 1) q-grams: an insertion, deletion or
+    # substitution touches at most q of them, a transposition q + 1. Lookups
+    # only count postings of the lengths within the threshold and return the
+    # ids that reach that bound; callers verify them. `postings` and
+    # `by_length` restore an index from state(), e.g. a compiled gazetteer.
+    def __init__(
+        self,
+        strings: list[str],
+        q: int = 3,
+        postings: dict[str, "int | tuple[int, ...] | array"] | None = None,
+        by_length: dict[int, array] | None = None,
+    ):
+        self.q = q
+        if postings is not None and by_length is not None:
+            self.postings = postings
+            self.by_length = by_length
+            return
+        postings = {}
+        by_length: dict[int, list[int]] = {}
+        for string_id, value in enumerate(strings):
+            by_length.setdefault(len(value), []).append(string_id)
+            suffix = "\x00" + chr(len(value))
+            for gram in numbered_qgrams(value, q):
+                postings.setdefault(gram + suffix, []).append(string_id)
+        self.postings = {key: compact_ids(ids) for key, ids in postings.items()}
+        self.by_length = {length: array("I", ids) for length, ids in by_length.items()}
+
+    def state(self) -> tuple:
+        # Builtin containers only, for the compiled gazetteer.
+        return self.q, self.postings, self.by_length
+
+    def candidates(self, query: str, threshold: int | None = None) -> list[int]:
+        # Without `threshold`, each string gets max_distance() of its own
+        # length, like the place index variants.
+        length = len(query)
+        spread = MAX_FUZZY_DISTANCE if threshold is None else threshold
+        grams = numbered_qgrams(query, self.q)
+        ids = []
+        for string_length in range(max(0, length - spread), length + spread + 1):
+            same_length = self.by_length.get(string_length)
+            if same_length is None:
                 continue
-            if best_local is None or distance < best_local[1]:
-                best_local = (canonical, distance)
-        return best_local
+            limit = max_distance_for_length(string_length) if threshold is None else threshold
+            if abs(length - string_length) > limit:
+                continue
+            required = max(length, string_length) + self.q - 1 - limit * (self.q + 1)
+            if required <= 0:
+                ids.extend(same_length)
+                continue
+            suffix = "\x00" + chr(string_length)
+            lists = []
+            for gram in grams:
+                ids_list = self.postings.get(gram + suffix)
+                if ids_list is not None:
+                    lists.append((ids_list,) if ids_list.__class__ is int else ids_list)
+            if len(lists) < required:
+                continue
+            counts = Counter(chain.from_iterable(lists))
+            ids.extend(string_id for string_id, count in counts.items() if count >= required)
+        return ids
+
+    def lookup(
+        self,
+        candidate: str,
+        variants: "VariantTable",
+        profile: "ResolverProfile | None" = None,
+    ) -> tuple[str, int] | None:
+        return pick_best_variant(candidate, variants, self.candidates(candidate), profile)
+
+
+class VariantMatrix:
+    # All variants of a bucket as a padded code-point matrix, so one candidate
+    # is compared against every variant with a handful of array operations.
+    def __init__(self, variants: list[tuple[str, str]]):
+        self.variants = variants
+        width = max((len(variant) for variant, _ in variants), default=0)
+        padded = "".join(variant.ljust(width, "\0") for variant, _ in variants)
+        codes = np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32)
+        if codes.size and codes.max() < 256:
+            codes = codes.astype(np.uint8)
+        self.codes = codes.reshape(len(variants), width)
+        self.lengths = np.array([len(variant) for variant, _ in variants], dtype=np.int32)
+        self.thresholds = np.array(
+            [max_distance(variant) for variant, _ in variants], dtype=np.int32
+        )
+
+    def distances(self, candidate: str, rows: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        # Row-by-row OSA dynamic programming vectorized over variants and
+        # columns: the left-neighbour term is resolved with a running minimum
+        # of (cell - column), as D[i][j] = min_k<=j(T[k] + j - k). Variants whose
+        # last two rows are already above their threshold are dropped.
+        codes = self.codes[rows]
+        thresholds = self.thresholds[rows]
+        candidate_codes = np.frombuffer(candidate.encode("utf-32-le"), dtype=np.uint32)
+        columns = np.arange(codes.shape[1] + 1, dtype=np.int32)
+        before_previous = None
+        previous = np.broadcast_to(columns, (len(rows), columns.size))
+        for i, code in enumerate(candidate_codes, start=1):
+            matches = codes == code
+            current = np.empty_like(previous)
+            current[:, 0] = i
+            current[:, 1:] = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + ~matches)
+            if before_previous is not None and codes.shape[1] > 1:
+                swapped = (codes[:, :-1] == code) & (codes[:, 1:] == candidate_codes[i - 2])
+                current[:, 2:] = np.where(
+                    swapped,
+                    np.minimum(current[:, 2:], before_previous[:, :-2] + 1),
+                    current[:, 2:],
+                )
+            current = np.minimum.accumulate(current - columns, axis=1) + columns
+            alive = np.minimum(current.min(axis=1), previous.min(axis=1)) <= thresholds
+            if not alive.all():
+                rows = rows[alive]
+                codes = codes[alive]
+                thresholds = thresholds[alive]
+                current = current[alive]
+                previous = previous[alive]
+                if rows.size == 0:
+                    break
+            before_previous, previous = previous, current
+        return rows, previous[np.arange(len(rows)), self.lengths[rows]]
+
+    def best_match(self, candidate: str) -> tuple[str, int] | None:
+        rows = np.flatnonzero(np.abs(self.lengths - len(candidate)) <= self.thresholds)
+        if rows.size == 0:
+            return None
+        rows, distances = self.distances(candidate, rows)
+        accepted = distances <= self.thresholds[rows]
+        if not accepted.any():
+            return None
+        # argmin keeps the earliest variant on ties, like the scan.
+        best = int(np.argmin(np.where(accepted, distances, np.iinfo(np.int32).max)))
+        return self.variants[int(rows[best])][1], int(distances[best])
+
+
+def build_window_filter(variants: list[tuple[str, str]]) -> tuple[frozenset[int], dict[str, str]]:
+    # Candidate lengths within max_distance of at least one variant that
+    # tolerates typos, and the short variants that only match exactly. A
+    # candidate of any other length can at best be one of those short
+    # variants, which a dict lookup answers without any distance computation.
+    fuzzy_lengths = set()
+    exact_only = {}
+    for variant, canonical in variants:
+        threshold = max_distance(variant)
+        if threshold:
+            fuzzy_lengths.update(range(len(variant) - threshold, len(variant) + threshold + 1))
+        else:
+            exact_only.setdefault(variant, canonical)
+    return frozenset(fuzzy_lengths), exact_only
+
+
+def scan_variants(
+    candidate: str,
+    variants: VariantTable,
+    variant_ids: Iterable[int],
+    best: tuple[str, int] | None = None,
+    profile: "ResolverProfile | None" = None,
+) -> tuple[str, int] | None:
+    # The earliest variant wins on ties.
+    if profile is not None:
+        profile.comparisons += len(variant_ids)
+    text = variants.text
+    offsets = variants.offsets
+    for variant_id in variant_ids:
+        variant = text[offsets[variant_id] : offsets[variant_id + 1]]
+        threshold = max_distance(variant)
+        distance = bounded_levenshtein(candidate, variant, threshold)
+        if distance > threshold:
+            continue
+        if best is None or distance < best[1]:
+            best = (variants.canonical(variant_id), distance)
+    return best
 
-    first_char = candidate[0] if candidate else ""
-    by_first_char = buckets.get(first_char, [])
-    all_variants = buckets.get("_all", [])
 
-    best = update_best(by_first_char, best)
+def find_best_variant(
+    candidate: str,
+    buckets: dict,
+    fuzzy_backend: str = "scan",
+    profile: "ResolverProfile | None" = None,
+) -> tuple[str, int] | None:
+    flat_table = buckets.get("_flat")
+    if flat_table is not None:
+        return flat_table.find_best_variant(candidate, fuzzy_backend, profile)
+    window_filter = buckets.get("_windows")
+    if window_filter is None and buckets.get("_all"):
+        window_filter = build_window_filter(buckets["_all"])
+        buckets["_windows"] = window_filter
+    if window_filter is not None and len(candidate) not in window_filter[0]:
+        if profile is not None:
+            profile.skipped += 1
+        canonical = window_filter[1].get(candidate)
+        return (canonical, 0) if canonical is not None else None
+
+    # `profile`, when given, counts the distance computations of the lookup.
+    if profile is not None:
+        profile.lookups += 1
+    table = buckets.get("_all")
+    if not table:
+        return None
+    if fuzzy_backend == "symspell":
+        deletion_index = buckets.get("_symspell")
+        if deletion_index is None:
+            deletion_index = DeletionIndex(table)
+            buckets["_symspell"] = deletion_index
+        return deletion_index.lookup(candidate, profile)
+    if fuzzy_backend == "qgram":
+        qgram_index = buckets.get("_qgram")
+        if qgram_index is None:
+            qgram_index = QGramIndex(table.variants())
+            buckets["_qgram"] = qgram_index
+        return qgram_index.lookup(candidate, table, profile)
+
+    first_char = candidate[0] if candidate else ""
+    best = scan_variants(candidate, table, buckets.get(first_char, ()), None, profile)
     # Fallback to all variants to handle first-letter typos like "trasbourg".
     if best is None:
-        best = update_best(all_variants, best)
+        if fuzzy_backend == "numpy":
+            variant_matrix = buckets.get("_numpy")
+            if variant_matrix is None:
+                variant_matrix = VariantMatrix(table)
+                buckets["_numpy"] = variant_matrix
+            if profile is not None:
+                profile.comparisons += len(table)
+            best = variant_matrix.best_match(candidate)
+        else:
+            best = scan_variants(candidate, table, range(len(table)), best, profile)
 
     return best
 
@@ -157,24 +901,73 @@ def extract_candidates(
     return matches
 
 
+def extract_candidates_trie(
+    sentence_norm: str,
+    cue_pattern: str | re.Pattern,
+    place_trie: PlaceTrie,
+    max_gap_tokens: int = 3,
+    blocked_spans: list[tuple[int, int]] | None = None,
+    tokens: list[tuple[str, int, int]] | None = None,
+) -> list:
+    if tokens is None:
+        tokens = tokenize_with_positions(sentence_norm)
+    next_token = {end: idx + 1 for idx, (_, _, end) in enumerate(tokens)}
+    regex = re.compile(cue_pattern)
+    matches = []
+    pos = 0
+    while True:
+        cue_match = regex.search(sentence_norm, pos)
+        if cue_match is None:
+            break
+        first = next_token.get(cue_match.end(), len(tokens))
+        place_match = None
+        for gap in range(min(max_gap_tokens, len(tokens) - first - 1), -1, -1):
+            place_match = place_trie.longest_at(tokens, first + gap)
+            if place_match is not None:
+                place_index = first + gap
+                break
+        if place_match is None:
+            pos = cue_match.start() + 1
+            continue
+        end_index, canonical = place_match
+        pos = tokens[end_index - 1][2]
+        if blocked_spans and is_in_spans(cue_match.start(), blocked_spans):
+            continue
+        matches.append((tokens[place_index][1], canonical))
+    return matches
+
+
 def collect_candidates(
     sentence_norm: str,
-    cue_specs: list[tuple[str, int]],
+    cue_specs: list[tuple[str | re.Pattern, int]],
     place_pattern: str,
     mapping: dict,
     blocked_spans: list[tuple[int, int]] | None = None,
+    place_trie: PlaceTrie | None = None,
 ) -> list:
     candidates = []
     seen = set()
+    tokens = tokenize_with_positions(sentence_norm) if place_trie is not None else None
     for cue_pattern, max_gap_tokens in cue_specs:
-        for pos, place in extract_candidates(
-            sentence_norm,
-            cue_pattern,
-            place_pattern,
-            mapping,
-            max_gap_tokens,
-            blocked_spans,
-        ):
+        if place_trie is not None:
+            extracted = extract_candidates_trie(
+                sentence_norm,
+                cue_pattern,
+                place_trie,
+                max_gap_tokens,
+                blocked_spans,
+                tokens,
+            )
+        else:
+            extracted = extract_candidates(
+                sentence_norm,
+                cue_pattern,
+                place_pattern,
+                mapping,
+                max_gap_tokens,
+                blocked_spans,
+            )
+        for pos, place in extracted:
             key = (pos, place)
             if key not in seen:
                 candidates.append((pos, place))
@@ -184,10 +977,11 @@ def collect_candidates(
 
 def collect_fuzzy_candidates(
     sentence_norm: str,
-    cue_specs: list[tuple[str, int]],
+    cue_specs: list[tuple[str | re.Pattern, int]],
     place_index: dict[int, dict[str, list[tuple[str, str]]]],
     max_place_tokens: int,
     blocked_spans: list[tuple[int, int]] | None = None,
+    fuzzy_backend: str = "scan",
 ) -> list:
     candidates = []
     seen = set()
@@ -214,7 +1008,7 @@ def collect_fuzzy_candidates(
                 candidate_tokens = tokens[token_index : token_index + length]
                 candidate = " ".join(token for token, _, _ in candidate_tokens)
                 buckets = place_index.get(length, {})
-                match = find_best_variant(candidate, buckets)
+                match = find_best_variant(candidate, buckets, fuzzy_backend)
                 if match is None:
                     continue
                 canonical, distance = match
@@ -233,7 +1027,14 @@ def collect_fuzzy_candidates(
     return sorted(candidates, key=lambda item: item[0])
 
 
-def extract_places(sentence_norm: str, place_pattern: str, mapping: dict) -> list:
+def extract_places(
+    sentence_norm: str,
+    place_pattern: str,
+    mapping: dict,
+    place_trie: PlaceTrie | None = None,
+) -> list:
+    if place_trie is not None:
+        return [(start, canonical) for start, _, canonical in place_trie.find_spans(sentence_norm)]
     regex = re.compile(rf"(?P<place>{place_pattern})")
     matches = []
     for match in regex.finditer(sentence_norm):
@@ -248,6 +1049,7 @@ def extract_places_fuzzy(
     sentence_norm: str,
     place_index: dict[int, dict[str, list[tuple[str, str]]]],
     max_place_tokens: int,
+    fuzzy_backend: str = "scan",
 ) -> list:
     tokens = tokenize_with_positions(sentence_norm)
     matches = []
@@ -260,7 +1062,7 @@ def extract_places_fuzzy(
             candidate_tokens = tokens[idx : idx + length]
             candidate = " ".join(token for token, _, _ in candidate_tokens)
             buckets = place_index.get(length, {})
-            match = find_best_variant(candidate, buckets)
+            match = find_best_variant(candidate, buckets, fuzzy_backend)
             if match is None:
                 continue
             canonical, distance = match
@@ -275,7 +1077,13 @@ def extract_places_fuzzy(
     return sorted(matches, key=lambda item: item[0])
 
 
-def extract_place_spans(sentence_norm: str, place_pattern: str) -> list[tuple[int, int]]:
+def extract_place_spans(
+    sentence_norm: str,
+    place_pattern: str,
+    place_trie: PlaceTrie | None = None,
+) -> list[tuple[int, int]]:
+    if place_trie is not None:
+        return [(start, end) for start, end, _ in place_trie.find_spans(sentence_norm)]
     regex = re.compile(rf"(?P<place>{place_pattern})")
     return [(match.start("place"), match.end("place")) for match in regex.finditer(sentence_norm)]
 
@@ -287,29 +1095,22 @@ def is_in_spans(position: int, spans: list[tuple[int, int]]) -> bool:
     return False
 
 
-def resolve_order(
-    sentence: str,
-    mapping: dict,
-    place_pattern: str,
-    place_index: dict[int, dict[str, list[tuple[str, str]]]] | None = None,
-    max_place_tokens: int | None = None,
-) -> tuple:
-    sentence_norm = normalize(sentence)
-    origin_specs = [
-        (r"\bdepuis\b", 3),
-        (r"\ben\s+partant\s+de\b", 1),
-        (r"\bpartant\s+de\b", 1),
-        (r"\bdepart\b", 1),
-        (r"\bde\b", 1),
-    ]
-    dest_specs = [
-        (r"\ba\b", 1),
-        (r"\bvers\b", 1),
-        (r"\bpour\b", 1),
-        (r"\bjusqu\s*a\b", 1),
-        (r"\bdestination\b", 1),
-    ]
-    fallback_markers = {
+ORIGIN_CUE_SPECS = [
+    (r"\bdepuis\b", 3),
+    (r"\ben\s+partant\s+de\b", 1),
+    (r"\bpartant\s+de\b", 1),
+    (r"\bdepart\b", 1),
+    (r"\bde\b", 1),
+]
+DESTINATION_CUE_SPECS = [
+    (r"\ba\b", 1),
+    (r"\bvers\b", 1),
+    (r"\bpour\b", 1),
+    (r"\bjusqu\s*a\b", 1),
+    (r"\bdestination\b", 1),
+]
+FALLBACK_MARKERS = frozenset(
+    {
         "je",
         "veux",
         "voudrais",
@@ -329,8 +1130,10 @@ def resolve_order(
         "depuis",
         "faire",
     }
-    english_markers = {"from", "to", "going", "any"}
-    french_markers = {
+)
+ENGLISH_MARKERS = frozenset({"from", "to", "going", "any"})
+FRENCH_MARKERS = frozenset(
+    {
         "depuis",
         "vers",
         "pour",
@@ -347,127 +1150,2277 @@ def resolve_order(
         "voudrais",
         "souhaite",
     }
+)
 
-    place_spans = extract_place_spans(sentence_norm, place_pattern)
-    if place_index is None or max_place_tokens is None:
-        place_index, max_place_tokens = build_place_index(mapping)
-    origin_candidates = collect_candidates(
-        sentence_norm, origin_specs, place_pattern, mapping, place_spans
-    )
-    dest_candidates = collect_candidates(
-        sentence_norm, dest_specs, place_pattern, mapping, place_spans
-    )
-    if not origin_candidates:
-        origin_candidates = collect_fuzzy_candidates(
-            sentence_norm, origin_specs, place_index, max_place_tokens, place_spans
-        )
-    if not dest_candidates:
-        dest_candidates = collect_fuzzy_candidates(
-            sentence_norm, dest_specs, place_index, max_place_tokens, place_spans
-        )
+GAP_TOKEN_REGEX = re.compile(r"\s+\w+")
+SPACE_REGEX = re.compile(r"\s+")
 
-    all_places = extract_places(sentence_norm, place_pattern, mapping)
-    tokens = set(sentence_norm.split())
-    marker_hit = bool(tokens & fallback_markers)
-    english_only = bool(tokens & english_markers) and not bool(tokens & french_markers)
-    if english_only and not (origin_candidates or dest_candidates):
-        return None, None
-    fallback_allowed = bool(origin_candidates or dest_candidates) or marker_hit
-    if fallback_allowed and len(all_places) < 2:
-        fuzzy_places = extract_places_fuzzy(sentence_norm, place_index, max_place_tokens)
-        known = {place for _, place in all_places}
-        for pos, place in fuzzy_places:
-            if place not in known:
-                all_places.append((pos, place))
-                known.add(place)
-        all_places.sort(key=lambda item: item[0])
 
-    ordered = []
-    for _, place in sorted(all_places, key=lambda item: item[0]):
-        if place not in ordered:
-            ordered.append(place)
+def compile_cue_specs(cue_specs: list[tuple[str, int]]) -> list[tuple[re.Pattern, int]]:
+    return [(re.compile(cue_pattern), max_gap_tokens) for cue_pattern, max_gap_tokens in cue_specs]
 
-    origin = origin_candidates[-1][1] if origin_candidates else None
-    destination = dest_candidates[-1][1] if dest_candidates else None
 
-    if origin is None and ordered and fallback_allowed:
-        origin = ordered[0]
+def match_cue_candidates(
+    sentence_norm: str,
+    cue_regex: re.Pattern,
+    max_gap_tokens: int,
+    place_regex: re.Pattern,
+    mapping: dict,
+    blocked_spans: list[tuple[int, int]] | None = None,
+) -> list:
+    # Same matches as `cue gap \s+ place` in extract_candidates, but the place
+    # alternation is only compiled once and tried at the few positions after a cue.
+    matches = []
+    pos = 0
+    while True:
+        cue_match = cue_regex.search(sentence_norm, pos)
+        if cue_match is None:
+            break
+        gap_ends = [cue_match.end()]
+        for _ in range(max_gap_tokens):
+            gap_match = GAP_TOKEN_REGEX.match(sentence_norm, gap_ends[-1])
+            if gap_match is None:
+                break
+            gap_ends.append(gap_match.end())
+        place_match = None
+        for gap_end in reversed(gap_ends):
+            space_match = SPACE_REGEX.match(sentence_norm, gap_end)
+            if space_match is None:
+                continue
+            place_match = place_regex.match(sentence_norm, space_match.end())
+            if place_match is not None:
+                break
+        if place_match is None:
+            pos = cue_match.start() + 1
+            continue
+        pos = place_match.end()
+        if blocked_spans and is_in_spans(cue_match.start(), blocked_spans):
+            continue
+        raw = re.sub(r"\s+", " ", place_match.group("place")).strip()
+        canonical = mapping.get(raw)
+        if canonical:
+            matches.append((place_match.start("place"), canonical))
+    return matches
 
-    if destination is None and fallback_allowed:
-        if origin is None:
-            if len(ordered) >= 2:
-                destination = ordered[1]
-        else:
-            for place in ordered:
-                if place != origin:
-                    destination = place
-                    break
 
-    if not origin or not destination or origin == destination:
-        return None, None
+def cue_token_forms(cue_pattern: str) -> list[tuple[str, ...]]:
+    # Token sequences matched by a cue regex made of words, \b, \s+ and \s*.
+    forms = [""]
+    for part in re.split(r"(\\s[+*])", cue_pattern.replace(r"\b", "")):
+        if part == r"\s+":
+            forms = [form + " " for form in forms]
+        elif part == r"\s*":
+            forms = [form + " " for form in forms] + forms
+        elif re.fullmatch(r"\w+", part):
+            forms = [form + part for form in forms]
+        elif part:
+            raise ValueError(f"Unsupported cue pattern: {cue_pattern}")
+    return [tuple(form.split()) for form in forms]
 
-    return origin, destination
 
+class CueScanner:
+    # Tags every cue occurrence of a tokenized sentence in a single pass.
+    def __init__(self, cue_specs: list[tuple[str, int]]):
+        self.max_gap_tokens = [max_gap_tokens for _, max_gap_tokens in cue_specs]
+        self.by_first_token: dict[str, list[tuple[int, tuple[str, ...]]]] = {}
+        for cue_id, (cue_pattern, _) in enumerate(cue_specs):
+            for form in cue_token_forms(cue_pattern):
+                self.by_first_token.setdefault(form[0], []).append((cue_id, form))
 
-def read_url_lines(url: str) -> Iterable[str]:
-    with urllib.request.urlopen(url) as response:
-        content = response.read().decode("utf-8", errors="replace")
-    for line in content.splitlines():
-        yield line
+    def find(self, words: list[str]) -> list[list[tuple[int, int]]]:
+        hits: list[list[tuple[int, int]]] = [[] for _ in self.max_gap_tokens]
+        for index, word in enumerate(words):
+            for cue_id, form in self.by_first_token.get(word, ()):
+                end = index + len(form)
+                if tuple(words[index:end]) == form:
+                    hits[cue_id].append((index, end))
+        return hits
 
 
-def iter_input_lines(inputs: list[str]) -> Iterable[str]:
-    if not inputs:
-        for line in sys.stdin:
-            yield line.rstrip("\n")
-        return
-    for item in inputs:
-        if item == "-":
-            for line in sys.stdin:
-                yield line.rstrip("\n")
-            continue
-        if item.startswith("http://") or item.startswith("https://"):
-            for line in read_url_lines(item):
-                yield line.rstrip("\n")
-            continue
-        path = Path(item)
-        with path.open("r", encoding="utf-8") as handle:
-            for line in handle:
-                yield line.rstrip("\n")
+class SentenceScan:
+    # Tokens, cue occurrences and exact place matches of one normalized
+    # sentence, shared by every candidate extraction step.
+    def __init__(self, sentence_norm: str, place_trie: PlaceTrie, cue_scanner: CueScanner):
+        self.sentence_norm = sentence_norm
+        self.tokens = tokenize_with_positions(sentence_norm)
+        self.words = [token for token, _, _ in self.tokens]
+        self.place_at = [
+            place_trie.longest_at(self.tokens, index) for index in range(len(self.tokens))
+        ]
+        self.places: list[tuple[int, int, str]] = []
+        self.blocked = [False] * len(self.tokens)
+        index = 0
+        while index < len(self.tokens):
+            match = self.place_at[index]
+            if match is None:
+                index += 1
+                continue
+            end_index, canonical = match
+            self.places.append((self.tokens[index][1], self.tokens[end_index - 1][2], canonical))
+            for covered in range(index, end_index):
+                self.blocked[covered] = True
+            index = end_index
+        self.cue_hits = cue_scanner.find(self.words)
+        # token index -> (start, canonical, distance, end) of the best fuzzy match
+        self.fuzzy_at: dict[int, tuple[int, str, int, int] | None] = {}
+        self.stop_flags: list[bool] | None = None
 
 
-def main() -> int:
-    default_places = Path(__file__).resolve().parents[1] / "data" / "places.txt"
-    parser = argparse.ArgumentParser(description="Extract origin and destination from travel orders.")
-    parser.add_argument("inputs", nargs="*", help="Input files, URLs, or '-' for stdin")
-    parser.add_argument("--places", type=Path, default=default_places, help="Path to places list")
-    args = parser.parse_args()
+class ResolutionCache:
+    # Bounded LRU of resolve results keyed by normalized sentence. A cache
+    # belongs to one engine, whose gazetteer never changes: a reload builds a
+    # new engine, and with it an empty cache.
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: OrderedDict[str, tuple] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-    if not args.places.exists():
-        print(f"Places file not found: {args.places}", file=sys.stderr)
-        return 1
+    def get(self, sentence_norm: str) -> tuple | None:
+        result = self.entries.get(sentence_norm)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(sentence_norm)
+        self.hits += 1
+        return result
 
-    mapping = load_places(args.places)
-    if not mapping:
-        print("Places list is empty.", file=sys.stderr)
-        return 1
+    def put(self, sentence_norm: str, result: tuple) -> None:
+        self.entries[sentence_norm] = result
+        self.entries.move_to_end(sentence_norm)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
 
-    place_pattern = build_place_pattern(list(mapping.keys()))
-    place_index, max_place_tokens = build_place_index(mapping)
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
 
-    for line in iter_input_lines(args.inputs):
-        if not line.strip():
-            continue
-        if "," not in line:
-            continue
-        sentence_id, sentence = line.split(",", 1)
-        origin, destination = resolve_order(
-            sentence, mapping, place_pattern, place_index, max_place_tokens
-        )
-        if origin and destination:
-            print(f"{sentence_id},{origin},{destination}")
-        else:
-            print(f"{sentence_id},INVALID,")
+
+PROFILE_STAGES = (
+    "normalize",
+    "cache",
+    "extract_places",
+    "exact_cues",
+    "index_load",
+    "fuzzy_cues",
+    "fuzzy_fallback",
+    "select",
+    "regex_matcher",
+)
+
+
+class ResolverProfile:
+    # Aggregated per-stage wall time and call counts, fuzzy lookup and
+    # Levenshtein comparison counts, and how each answer was reached. Only
+    # the profiled resolve path touches it, so a disabled profile costs one
+    # attribute check per sentence.
+    def __init__(self):
+        self.sentences = 0
+        self.stages = {stage: [0, 0.0] for stage in PROFILE_STAGES}
+        self.paths: dict[str, int] = {}
+        self.lookups = 0
+        self.skipped = 0
+        self.memoized = 0
+        self.comparisons = 0
+
+    def add(self, stage: str, seconds: float) -> None:
+        entry = self.stages[stage]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def count_path(self, path: str) -> None:
+        self.paths[path] = self.paths.get(path, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            "sentences": self.sentences,
+            "stages": {stage: list(entry) for stage, entry in self.stages.items()},
+            "paths": dict(self.paths),
+            "lookups": self.lookups,
+            "skipped": self.skipped,
+            "memoized": self.memoized,
+            "comparisons": self.comparisons,
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        self.sentences += snapshot["sentences"]
+        for stage, (calls, seconds) in snapshot["stages"].items():
+            entry = self.stages[stage]
+            entry[0] += calls
+            entry[1] += seconds
+        for path, count in snapshot["paths"].items():
+            self.paths[path] = self.paths.get(path, 0) + count
+        self.lookups += snapshot["lookups"]
+        self.skipped += snapshot["skipped"]
+        self.memoized += snapshot["memoized"]
+        self.comparisons += snapshot["comparisons"]
+
+    def report(self) -> dict:
+        total = sum(seconds for _, seconds in self.stages.values())
+        stages = {}
+        for stage, (calls, seconds) in self.stages.items():
+            if not calls:
+                continue
+            stages[stage] = {
+                "calls": calls,
+                "total_ms": seconds * 1000,
+                "mean_us": seconds / calls * 1e6,
+                "share": (seconds / total) if total else 0.0,
+            }
+        return {
+            "sentences": self.sentences,
+            "total_ms": total * 1000,
+            "us_per_sentence": (total / self.sentences * 1e6) if self.sentences else 0.0,
+            "stages": stages,
+            "fuzzy_lookups": self.lookups,
+            "fuzzy_windows_skipped": self.skipped,
+            "fuzzy_windows_memoized": self.memoized,
+            "levenshtein_comparisons": self.comparisons,
+            "comparisons_per_lookup": (self.comparisons / self.lookups) if self.lookups else 0.0,
+            "paths": dict(sorted(self.paths.items())),
+        }
+
+
+def answer_path(result: tuple, trace: dict, fuzzy_places_used: bool) -> str:
+    # exact_cue / fuzzy_cue when both endpoints follow a cue, fallback (or
+    # fuzzy_fallback when the fuzzy place pass ran) otherwise.
+    if not (result[0] and result[1]):
+        return "invalid"
+    sources = (
+        (trace["origin"][0], trace["origin_cue_exact"]),
+        (trace["destination"][0], trace["destination_cue_exact"]),
+    )
+    if any(kind == "fallback" for kind, _ in sources):
+        return "fuzzy_fallback" if fuzzy_places_used else "fallback"
+    return "exact_cue" if all(exact for _, exact in sources) else "fuzzy_cue"
+
+
+# Function words and order vocabulary: windows made only of these are looked
+# up once per engine (see ResolverEngine.window_memo).
+WINDOW_STOP_TOKENS = (
+    FALLBACK_MARKERS
+    | FRENCH_MARKERS
+    | ENGLISH_MARKERS
+    | frozenset(
+        {
+            "a",
+            "au",
+            "aux",
+            "avec",
+            "besoin",
+            "bonjour",
+            "c",
+            "ce",
+            "cette",
+            "comment",
+            "d",
+            "de",
+            "demain",
+            "des",
+            "du",
+            "elle",
+            "en",
+            "est",
+            "et",
+            "il",
+            "j",
+            "je",
+            "juste",
+            "l",
+            "la",
+            "le",
+            "les",
+            "m",
+            "mais",
+            "me",
+            "merci",
+            "moi",
+            "nous",
+            "on",
+            "ou",
+            "par",
+            "pars",
+            "passant",
+            "plait",
+            "pour",
+            "qu",
+            "que",
+            "quil",
+            "s",
+            "sans",
+            "sil",
+            "suis",
+            "t",
+            "te",
+            "un",
+            "une",
+            "voulais",
+            "vous",
+            "y",
+        }
+    )
+)
+WINDOW_MEMO_LIMIT = 65536
+
+PLACE_MATCHERS = ("trie", "regex")
+
+
+TOP_K_CANDIDATES = 3
+CANDIDATE_SOURCE_WEIGHTS = {"cue": 1.0, "fallback": 0.5}
+CANDIDATE_DISTANCE_PENALTY = 0.1
+CANDIDATE_RANK_PENALTY = 0.05
+
+
+def rank_candidates(
+    ranking: dict,
+    answer: tuple,
+    top_k: int = TOP_K_CANDIDATES,
+    evidence: Callable[[str, str, int, str], dict] | None = None,
+) -> dict:
+    # Scores the candidates gathered by select_origin_destination(): the
+    # weight of their source, minus CANDIDATE_DISTANCE_PENALTY per edit and
+    # CANDIDATE_RANK_PENALTY per candidate of the same source preferred over
+    # them. `evidence(role, source, position, place)` gives the match type
+    # and distance when the caller knows them. The resolver's answer stays
+    # first, the other candidates follow by score; pairs score the product of
+    # their endpoints and are only emitted for a valid answer.
+    ranked = {}
+    for role, chosen in (("origin", answer[0]), ("destination", answer[1])):
+        candidates = []
+        source_ranks: Counter = Counter()
+        for source, position, place in ranking.get(role, ()):
+            candidate = {
+                "place": place,
+                "score": 0.0,
+                "source": source,
+                "match": None,
+                "distance": None,
+                "position": position,
+            }
+            if evidence is not None:
+                candidate.update(evidence(role, source, position, place))
+            score = (
+                CANDIDATE_SOURCE_WEIGHTS[source]
+                - CANDIDATE_DISTANCE_PENALTY * (candidate["distance"] or 0)
+                - CANDIDATE_RANK_PENALTY * source_ranks[source]
+            )
+            source_ranks[source] += 1
+            candidate["score"] = round(max(score, 0.0), 3)
+            candidates.append(candidate)
+        candidates.sort(key=lambda item: (item["place"] != chosen, -item["score"]))
+        ranked[role] = candidates
+
+    pairs = []
+    if answer[0] and answer[1]:
+        for origin in ranked["origin"]:
+            for destination in ranked["destination"]:
+                if origin["place"] != destination["place"]:
+                    pairs.append(
+                        {
+                            "origin": origin["place"],
+                            "destination": destination["place"],
+                            "score": round(origin["score"] * destination["score"], 3),
+                        }
+                    )
+        pairs.sort(
+            key=lambda pair: ((pair["origin"], pair["destination"]) != answer, -pair["score"])
+        )
+    return {
+        "origin_candidates": ranked["origin"][:top_k],
+        "destination_candidates": ranked["destination"][:top_k],
+        "pairs": pairs[:top_k],
+    }
+
+
+class ResolverEngine:
+    def __init__(
+        self,
+        mapping: dict,
+        place_pattern: str | None = None,
+        place_index: dict[int, dict[str, list[tuple[str, str]]]] | None = None,
+        max_place_tokens: int | None = None,
+        matcher: str = "trie",
+        fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+        place_trie: PlaceTrie | None = None,
+        index_loader: Callable[[], tuple[dict, int]] | None = None,
+        cache_size: int = 0,
+        gazetteer_version: str | None = None,
+    ):
+        if matcher not in PLACE_MATCHERS:
+            raise ValueError(f"Unknown place matcher: {matcher}")
+        if fuzzy_backend not in FUZZY_BACKENDS:
+            raise ValueError(f"Unknown fuzzy backend: {fuzzy_backend}")
+        if fuzzy_backend == "numpy" and not load_numpy():
+            raise ModuleNotFoundError("The numpy fuzzy backend requires numpy.")
+        if place_index is None or max_place_tokens is None:
+            place_index = None
+            max_place_tokens = None
+        self.mapping = mapping
+        self.matcher = matcher
+        self.fuzzy_backend = fuzzy_backend
+        # Most sentences resolve on the exact pass: the fuzzy index is built
+        # (or read from the artifact) on first need and shared process-wide.
+        self._place_index = place_index
+        self._max_place_tokens = max_place_tokens
+        self._index_loader = index_loader
+        self._index_entry: dict | None = None
+        self._gazetteer_version = gazetteer_version
+        self.cache = ResolutionCache(cache_size) if cache_size > 0 else None
+        self.profile: ResolverProfile | None = None
+        # Fuzzy lookups of windows made only of WINDOW_STOP_TOKENS recur in
+        # most sentences; their results are kept across sentences.
+        self.window_memo: dict[str, tuple[str, int] | None] = {}
+        self._place_pattern = place_pattern
+        if matcher == "trie":
+            self.place_trie = place_trie if place_trie is not None else PlaceTrie(mapping)
+        else:
+            self.place_trie = None
+        self.place_regex = (
+            re.compile(rf"(?P<place>{self.place_pattern})") if matcher == "regex" else None
+        )
+        self.origin_cues = compile_cue_specs(ORIGIN_CUE_SPECS)
+        self.destination_cues = compile_cue_specs(DESTINATION_CUE_SPECS)
+        self.cue_scanner = CueScanner(ORIGIN_CUE_SPECS + DESTINATION_CUE_SPECS)
+        self.origin_cue_ids = range(len(ORIGIN_CUE_SPECS))
+        self.destination_cue_ids = range(
+            len(ORIGIN_CUE_SPECS), len(ORIGIN_CUE_SPECS) + len(DESTINATION_CUE_SPECS)
+        )
+
+    @classmethod
+    def from_places(
+        cls,
+        path: Path,
+        matcher: str = "trie",
+        fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+        artifact_path: Path | None = None,
+        cache_size: int = 0,
+    ) -> "ResolverEngine":
+        artifact_path = artifact_path or default_artifact_path(path)
+        flat_gazetteer = FlatGazetteer.open(artifact_path, path)
+        if flat_gazetteer is not None:
+            return flat_gazetteer.engine(matcher, fuzzy_backend, cache_size)
+        artifact = GazetteerArtifact.open(artifact_path, path)
+        if artifact is not None:
+            return artifact.engine(matcher, fuzzy_backend, cache_size)
+        return cls(
+            load_places(path), matcher=matcher, fuzzy_backend=fuzzy_backend, cache_size=cache_size
+        )
+
+    @property
+    def gazetteer_version(self) -> str:
+        if self._gazetteer_version is None:
+            self._gazetteer_version = cached_mapping_fingerprint(self.mapping)
+        return self._gazetteer_version
+
+    def _load_place_index(self) -> None:
+        entry = shared_place_index(
+            self.mapping, self.fuzzy_backend, self._index_loader, self.gazetteer_version
+        )
+        self._index_entry = entry
+        self._place_index = entry["place_index"]
+        self._max_place_tokens = entry["max_place_tokens"]
+
+    @property
+    def place_index(self) -> dict[int, dict[str, list[tuple[str, str]]]]:
+        if self._place_index is None:
+            self._load_place_index()
+        return self._place_index
+
+    @property
+    def max_place_tokens(self) -> int:
+        if self._max_place_tokens is None:
+            self._load_place_index()
+        return self._max_place_tokens
+
+    def index_stats(self, memory: bool = False) -> dict:
+        stats = {
+            "built": self._place_index is not None,
+            "fuzzy_backend": self.fuzzy_backend,
+            "variants": len(self.mapping),
+            "build_seconds": None,
+            "shared_requests": None,
+        }
+        if self._index_entry is not None:
+            stats["build_seconds"] = self._index_entry["build_seconds"]
+            stats["shared_requests"] = self._index_entry["requests"]
+        if memory and self._place_index is not None:
+            stats["memory_bytes"] = deep_sizeof(self._place_index)
+        return stats
+
+    @property
+    def place_pattern(self) -> str:
+        # Only the regex matcher needs the alternation; build it on demand.
+        if self._place_pattern is None:
+            self._place_pattern = build_place_pattern(list(self.mapping.keys()))
+        return self._place_pattern
+
+    def _collect_candidates(
+        self,
+        sentence_norm: str,
+        cues: list[tuple[re.Pattern, int]],
+        blocked_spans: list[tuple[int, int]],
+    ) -> list:
+        candidates = []
+        seen = set()
+        for cue_regex, max_gap_tokens in cues:
+            for pos, place in match_cue_candidates(
+                sentence_norm,
+                cue_regex,
+                max_gap_tokens,
+                self.place_regex,
+                self.mapping,
+                blocked_spans,
+            ):
+                key = (pos, place)
+                if key not in seen:
+                    candidates.append((pos, place))
+                    seen.add(key)
+        return sorted(candidates, key=lambda item: item[0])
+
+    def _scan_candidates(self, scan: SentenceScan, cue_ids: range) -> list:
+        # Replays `cue gap \s+ place` finditer semantics on the tagged tokens:
+        # greedy gap, longest place, search resumes after the matched place.
+        candidates = []
+        seen = set()
+        token_count = len(scan.tokens)
+        for cue_id in cue_ids:
+            max_gap_tokens = self.cue_scanner.max_gap_tokens[cue_id]
+            resume = 0
+            for start, end in scan.cue_hits[cue_id]:
+                if start < resume:
+                    continue
+                for gap in range(min(max_gap_tokens, token_count - end - 1), -1, -1):
+                    match = scan.place_at[end + gap]
+                    if match is not None:
+                        place_index = end + gap
+                        break
+                else:
+                    continue
+                end_index, canonical = match
+                resume = end_index
+                if scan.blocked[start]:
+                    continue
+                key = (scan.tokens[place_index][1], canonical)
+                if key not in seen:
+                    candidates.append(key)
+                    seen.add(key)
+        return sorted(candidates, key=lambda item: item[0])
+
+    def _fuzzy_at(self, scan: SentenceScan, index: int) -> tuple[int, str, int, int] | None:
+        if index in scan.fuzzy_at:
+            return scan.fuzzy_at[index]
+        if scan.stop_flags is None:
+            scan.stop_flags = [word in WINDOW_STOP_TOKENS for word in scan.words]
+        best = None
+        stop_window = True
+        for length in range(1, self.max_place_tokens + 1):
+            if index + length > len(scan.tokens):
+                break
+            candidate = " ".join(scan.words[index : index + length])
+            stop_window = stop_window and scan.stop_flags[index + length - 1]
+            if stop_window and candidate in self.window_memo:
+                match = self.window_memo[candidate]
+                if self.profile is not None:
+                    self.profile.memoized += 1
+            else:
+                buckets = self.place_index.get(length, {})
+                match = find_best_variant(candidate, buckets, self.fuzzy_backend, self.profile)
+                if stop_window and len(self.window_memo) < WINDOW_MEMO_LIMIT:
+                    self.window_memo[candidate] = match
+            if match is None:
+                continue
+            canonical, distance = match
+            if best is None or distance < best[2]:
+                best = (
+                    scan.tokens[index][1],
+                    canonical,
+                    distance,
+                    scan.tokens[index + length - 1][2],
+                )
+        scan.fuzzy_at[index] = best
+        return best
+
+    def _scan_fuzzy_candidates(self, scan: SentenceScan, cue_ids: range) -> list:
+        candidates = []
+        seen = set()
+        for cue_id in cue_ids:
+            resume = 0
+            for start, end in scan.cue_hits[cue_id]:
+                if start < resume:
+                    continue
+                resume = end
+                if scan.blocked[start] or end >= len(scan.tokens):
+                    continue
+                best = self._fuzzy_at(scan, end)
+                if best is None:
+                    continue
+                key = (best[0], best[1])
+                if key not in seen:
+                    candidates.append(key)
+                    seen.add(key)
+        return sorted(candidates, key=lambda item: item[0])
+
+    def _scan_fuzzy_places(self, scan: SentenceScan) -> list:
+        matches = []
+        seen = set()
+        for index in range(len(scan.tokens)):
+            best = self._fuzzy_at(scan, index)
+            if best is None:
+                continue
+            key = (best[0], best[1])
+            if key not in seen:
+                matches.append(key)
+                seen.add(key)
+        return sorted(matches, key=lambda item: item[0])
+
+    def _resolve_regex(self, sentence_norm: str, ranking: dict | None = None) -> tuple:
+        places = []
+        for match in self.place_regex.finditer(sentence_norm):
+            raw = re.sub(r"\s+", " ", match.group("place")).strip()
+            places.append((match.start("place"), match.end("place"), self.mapping.get(raw)))
+        place_spans = [(start, end) for start, end, _ in places]
+
+        origin_candidates = self._collect_candidates(sentence_norm, self.origin_cues, place_spans)
+        dest_candidates = self._collect_candidates(
+            sentence_norm, self.destination_cues, place_spans
+        )
+        if not origin_candidates:
+            origin_candidates = collect_fuzzy_candidates(
+                sentence_norm,
+                self.origin_cues,
+                self.place_index,
+                self.max_place_tokens,
+                place_spans,
+                self.fuzzy_backend,
+            )
+        if not dest_candidates:
+            dest_candidates = collect_fuzzy_candidates(
+                sentence_norm,
+                self.destination_cues,
+                self.place_index,
+                self.max_place_tokens,
+                place_spans,
+                self.fuzzy_backend,
+            )
+
+        all_places = [(start, canonical) for start, _, canonical in places if canonical]
+        return select_origin_destination(
+            sentence_norm,
+            origin_candidates,
+            dest_candidates,
+            all_places,
+            lambda: extract_places_fuzzy(
+                sentence_norm, self.place_index, self.max_place_tokens, self.fuzzy_backend
+            ),
+            ranking=ranking,
+        )
+
+    def enable_profile(self) -> ResolverProfile:
+        if self.profile is None:
+            self.profile = ResolverProfile()
+        return self.profile
+
+    def resolve(self, sentence: str) -> tuple:
+        if self.profile is not None:
+            return self._resolve_profiled(sentence)
+        # Resolution only depends on the normalized sentence, so casing and
+        # accent variants of a sentence share one cache entry.
+        sentence_norm = normalize(sentence)
+        if self.cache is None:
+            return self.resolve_normalized(sentence_norm)
+        result = self.cache.get(sentence_norm)
+        if result is None:
+            result = self.resolve_normalized(sentence_norm)
+            self.cache.put(sentence_norm, result)
+        return result
+
+    def resolve_normalized(self, sentence_norm: str) -> tuple:
+        if self.place_trie is None:
+            return self._resolve_regex(sentence_norm)
+        scan = SentenceScan(sentence_norm, self.place_trie, self.cue_scanner)
+        return self._resolve_scan(scan)
+
+    def _resolve_scan(
+        self, scan: SentenceScan, trace: dict | None = None, ranking: dict | None = None
+    ) -> tuple:
+        origin_candidates = self._scan_candidates(scan, self.origin_cue_ids)
+        dest_candidates = self._scan_candidates(scan, self.destination_cue_ids)
+        if trace is not None:
+            trace["origin_cue_exact"] = bool(origin_candidates)
+            trace["destination_cue_exact"] = bool(dest_candidates)
+        if not origin_candidates:
+            origin_candidates = self._scan_fuzzy_candidates(scan, self.origin_cue_ids)
+        if not dest_candidates:
+            dest_candidates = self._scan_fuzzy_candidates(scan, self.destination_cue_ids)
+
+        all_places = [(start, canonical) for start, _, canonical in scan.places if canonical]
+        return select_origin_destination(
+            scan.sentence_norm,
+            origin_candidates,
+            dest_candidates,
+            all_places,
+            lambda: self._scan_fuzzy_places(scan),
+            trace,
+            ranking,
+        )
+
+    def _resolve_profiled(self, sentence: str) -> tuple:
+        # Same steps as resolve() / _resolve_scan(), timed stage by stage.
+        profile = self.profile
+        clock = time.perf_counter
+        profile.sentences += 1
+        start = clock()
+        sentence_norm = normalize(sentence)
+        now = clock()
+        profile.add("normalize", now - start)
+        if self.cache is not None:
+            start = now
+            result = self.cache.get(sentence_norm)
+            now = clock()
+            profile.add("cache", now - start)
+            if result is not None:
+                profile.count_path("cached")
+                return result
+
+        if self.place_trie is None:
+            start = now
+            result = self._resolve_regex(sentence_norm)
+            profile.add("regex_matcher", clock() - start)
+            profile.count_path("regex" if result[0] and result[1] else "invalid")
+        else:
+            start = now
+            scan = SentenceScan(sentence_norm, self.place_trie, self.cue_scanner)
+            now = clock()
+            profile.add("extract_places", now - start)
+            start = now
+            origin_candidates = self._scan_candidates(scan, self.origin_cue_ids)
+            dest_candidates = self._scan_candidates(scan, self.destination_cue_ids)
+            now = clock()
+            profile.add("exact_cues", now - start)
+            trace = {
+                "origin_cue_exact": bool(origin_candidates),
+                "destination_cue_exact": bool(dest_candidates),
+            }
+            if not origin_candidates or not dest_candidates:
+                self._profile_index_load()
+                start = clock()
+                if not origin_candidates:
+                    origin_candidates = self._scan_fuzzy_candidates(scan, self.origin_cue_ids)
+                if not dest_candidates:
+                    dest_candidates = self._scan_fuzzy_candidates(
+                        scan, self.destination_cue_ids
+                    )
+                now = clock()
+                profile.add("fuzzy_cues", now - start)
+
+            fallback_seconds = []
+
+            def find_fuzzy_places() -> list:
+                load_seconds = self._profile_index_load()
+                fallback_start = clock()
+                matches = self._scan_fuzzy_places(scan)
+                fallback_seconds.append(clock() - fallback_start)
+                fallback_seconds.append(load_seconds)
+                return matches
+
+            all_places = [(start, canonical) for start, _, canonical in scan.places if canonical]
+            start = now
+            result = select_origin_destination(
+                sentence_norm,
+                origin_candidates,
+                dest_candidates,
+                all_places,
+                find_fuzzy_places,
+                trace,
+            )
+            elapsed = clock() - start
+            if fallback_seconds:
+                profile.add("fuzzy_fallback", fallback_seconds[0])
+            profile.add("select", elapsed - sum(fallback_seconds))
+            profile.count_path(answer_path(result, trace, bool(fallback_seconds)))
+
+        if self.cache is not None:
+            self.cache.put(sentence_norm, result)
+        return result
+
+    def _profile_index_load(self) -> float:
+        # The fuzzy index is loaded on first need; keep that one-off cost out
+        # of the fuzzy stages.
+        if self._place_index is not None:
+            return 0.0
+        start = time.perf_counter()
+        self._load_place_index()
+        elapsed = time.perf_counter() - start
+        self.profile.add("index_load", elapsed)
+        return elapsed
+
+    def _candidate_evidence(
+        self, scan: SentenceScan, kind: str, position: int, canonical: str, exact_cue: bool
+    ) -> dict:
+        index = next(i for i, token in enumerate(scan.tokens) if token[1] == position)
+        exact = scan.place_at[index]
+        if exact is not None and exact[1] == canonical and (kind == "fallback" or exact_cue):
+            return {"match": "exact", "distance": 0, "end": scan.tokens[exact[0] - 1][2]}
+        _, _, distance, end = scan.fuzzy_at[index]
+        return {"match": "fuzzy", "distance": distance, "end": end}
+
+    def _match_evidence(
+        self, scan: SentenceScan, source: tuple[str, int], canonical: str, exact_cue: bool
+    ) -> dict:
+        kind, position = source
+        evidence = self._candidate_evidence(scan, kind, position, canonical, exact_cue)
+        end, distance = evidence["end"], evidence["distance"]
+        if kind == "fallback":
+            match_type = "fallback"
+        else:
+            match_type = "exact" if distance == 0 and exact_cue else "fuzzy"
+        return {
+            "type": match_type,
+            "span": [position, end],
+            "text": scan.sentence_norm[position:end],
+            "distance": distance,
+        }
+
+    def resolve_details(self, sentence: str) -> dict:
+        # Uncached resolution that also reports, for each endpoint, how it was
+        # matched (exact/fuzzy after a cue, or fallback on place order), its
+        # span in the normalized sentence and the fuzzy distance.
+        start = time.perf_counter()
+        sentence_norm = normalize(sentence)
+        details = {"sentence_norm": sentence_norm, "origin_match": None, "destination_match": None}
+        if self.place_trie is None:
+            origin, destination = self._resolve_regex(sentence_norm)
+        else:
+            scan = SentenceScan(sentence_norm, self.place_trie, self.cue_scanner)
+            trace = {}
+            origin, destination = self._resolve_scan(scan, trace)
+            if origin and destination:
+                details["origin_match"] = self._match_evidence(
+                    scan, trace["origin"], origin, trace["origin_cue_exact"]
+                )
+                details["destination_match"] = self._match_evidence(
+                    scan, trace["destination"], destination, trace["destination_cue_exact"]
+                )
+        details["origin"] = origin
+        details["destination"] = destination
+        details["latency_ms"] = (time.perf_counter() - start) * 1000
+        return details
+
+    def resolve_candidates(self, sentence: str, top_k: int = TOP_K_CANDIDATES) -> dict:
+        # Uncached: the answer of resolve() and, from the same pass, the
+        # ranked origin, destination and pair candidates of rank_candidates().
+        answer, ranking, evidence = self.resolve_ranking(sentence)
+        return {
+            "origin": answer[0],
+            "destination": answer[1],
+            **rank_candidates(ranking, answer, top_k, evidence),
+        }
+
+    def resolve_ranking(self, sentence: str) -> tuple[tuple, dict, Callable | None]:
+        # The uncached resolve() pass, keeping what rank_candidates() scores
+        # so that callers can rank only the answers they end up rejecting.
+        sentence_norm = normalize(sentence)
+        ranking: dict = {}
+        evidence = None
+        if self.place_trie is None:
+            answer = self._resolve_regex(sentence_norm, ranking)
+        else:
+            scan = SentenceScan(sentence_norm, self.place_trie, self.cue_scanner)
+            trace: dict = {}
+            answer = self._resolve_scan(scan, trace, ranking)
+
+            def evidence(role: str, kind: str, position: int, canonical: str) -> dict:
+                found = self._candidate_evidence(
+                    scan, kind, position, canonical, trace[f"{role}_cue_exact"]
+                )
+                return {"match": found["match"], "distance": found["distance"]}
+
+        return answer, ranking, evidence
+
+    def resolve_many(self, sentences: Iterable[str]) -> Iterable[tuple]:
+        for sentence in sentences:
+            yield self.resolve(sentence)
+
+
+def select_origin_destination(
+    sentence_norm: str,
+    origin_candidates: list,
+    dest_candidates: list,
+    all_places: list,
+    find_fuzzy_places: Callable[[], list],
+    trace: dict | None = None,
+    ranking: dict | None = None,
+) -> tuple:
+    # `trace`, when given, receives where each endpoint came from:
+    # ("cue", position) or ("fallback", position). `ranking` receives every
+    # origin and destination candidate as (source, position, place), in the
+    # order the rules below prefer them: the last cue hit first, then the
+    # other places in sentence order when the fallback applies.
+    tokens = set(sentence_norm.split())
+    marker_hit = bool(tokens & FALLBACK_MARKERS)
+    english_only = bool(tokens & ENGLISH_MARKERS) and not bool(tokens & FRENCH_MARKERS)
+    if english_only and not (origin_candidates or dest_candidates):
+        return None, None
+    fallback_allowed = bool(origin_candidates or dest_candidates) or marker_hit
+    if fallback_allowed and len(all_places) < 2:
+        fuzzy_places = find_fuzzy_places()
+        known = {place for _, place in all_places}
+        for pos, place in fuzzy_places:
+            if place not in known:
+                all_places.append((pos, place))
+                known.add(place)
+        all_places.sort(key=lambda item: item[0])
+
+    ordered = []
+    first_positions = {}
+    for pos, place in sorted(all_places, key=lambda item: item[0]):
+        if place not in first_positions:
+            ordered.append(place)
+            first_positions[place] = pos
+
+    origin = origin_candidates[-1][1] if origin_candidates else None
+    destination = dest_candidates[-1][1] if dest_candidates else None
+    origin_source = ("cue", origin_candidates[-1][0]) if origin_candidates else None
+    destination_source = ("cue", dest_candidates[-1][0]) if dest_candidates else None
+
+    if origin is None and ordered and fallback_allowed:
+        origin = ordered[0]
+        origin_source = ("fallback", first_positions[origin])
+
+    if destination is None and fallback_allowed:
+        if origin is None:
+            if len(ordered) >= 2:
+                destination = ordered[1]
+        else:
+            for place in ordered:
+                if place != origin:
+                    destination = place
+                    break
+        if destination is not None:
+            destination_source = ("fallback", first_positions[destination])
+
+    if ranking is not None:
+        # The destination fallback skips the origin, so it goes last there.
+        fallback_order = {
+            "origin": ordered,
+            "destination": [place for place in ordered if place != origin]
+            + [place for place in ordered if place == origin],
+        }
+        for role, candidates in (("origin", origin_candidates), ("destination", dest_candidates)):
+            entries = [("cue", pos, place) for pos, place in reversed(candidates)]
+            if fallback_allowed:
+                entries += [
+                    ("fallback", first_positions[place], place) for place in fallback_order[role]
+                ]
+            seen = set()
+            ranking[role] = []
+            for entry in entries:
+                if entry[2] not in seen:
+                    ranking[role].append(entry)
+                    seen.add(entry[2])
+
+    if not origin or not destination or origin == destination:
+        return None, None
+
+    if trace is not None:
+        trace["origin"] = origin_source
+        trace["destination"] = destination_source
+    return origin, destination
+
+
+def resolve_order(
+    sentence: str,
+    mapping: dict,
+    place_pattern: str,
+    place_index: dict[int, dict[str, list[tuple[str, str]]]] | None = None,
+    max_place_tokens: int | None = None,
+    ranking: dict | None = None,
+) -> tuple:
+    sentence_norm = normalize(sentence)
+    place_spans = extract_place_spans(sentence_norm, place_pattern)
+    fuzzy_index = []
+
+    def load_fuzzy_index() -> tuple[dict, int]:
+        # Sentences the exact passes resolve never look the shared index up.
+        if not fuzzy_index:
+            if place_index is None or max_place_tokens is None:
+                entry = shared_place_index(mapping)
+                fuzzy_index.extend((entry["place_index"], entry["max_place_tokens"]))
+            else:
+                fuzzy_index.extend((place_index, max_place_tokens))
+        return fuzzy_index[0], fuzzy_index[1]
+
+    origin_candidates = collect_candidates(
+        sentence_norm, ORIGIN_CUE_SPECS, place_pattern, mapping, place_spans
+    )
+    dest_candidates = collect_candidates(
+        sentence_norm, DESTINATION_CUE_SPECS, place_pattern, mapping, place_spans
+    )
+    if not origin_candidates:
+        origin_candidates = collect_fuzzy_candidates(
+            sentence_norm, ORIGIN_CUE_SPECS, *load_fuzzy_index(), place_spans
+        )
+    if not dest_candidates:
+        dest_candidates = collect_fuzzy_candidates(
+            sentence_norm, DESTINATION_CUE_SPECS, *load_fuzzy_index(), place_spans
+        )
+
+    all_places = extract_places(sentence_norm, place_pattern, mapping)
+    return select_origin_destination(
+        sentence_norm,
+        origin_candidates,
+        dest_candidates,
+        all_places,
+        lambda: extract_places_fuzzy(sentence_norm, *load_fuzzy_index()),
+        ranking=ranking,
+    )
+
+
+GAZETTEER_ARTIFACT_MAGIC = b"TRAVEL-ORDER-GAZETTEER"
+GAZETTEER_ARTIFACT_VERSION = 3
+GAZETTEER_ARTIFACT_SUFFIX = ".compiled"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SourceWatcher:
+    # Polled by long-running processes. A file counts as changed once its
+    # (mtime, size) moved and then held still for one poll, so a file still
+    # being rewritten is not picked up half way, and only if its sha256
+    # differs, so touching a file does not trigger a reload.
+    def __init__(self, paths: Iterable[Path | None]):
+        self.paths = [path for path in paths if path is not None]
+        self.stamps = {path: file_stamp(path) for path in self.paths}
+        self.hashes = {path: self._sha256(path) for path in self.paths}
+        self.moving: dict[Path, tuple[int, int] | None] = {}
+
+    @staticmethod
+    def _sha256(path: Path) -> str | None:
+        try:
+            return file_sha256(path)
+        except FileNotFoundError:
+            return None
+
+    def changed(self) -> list[Path]:
+        changed = []
+        for path in self.paths:
+            stamp = file_stamp(path)
+            if stamp == self.stamps[path]:
+                self.moving.pop(path, None)
+                continue
+            if path not in self.moving or self.moving[path] != stamp:
+                self.moving[path] = stamp
+                continue
+            del self.moving[path]
+            self.stamps[path] = stamp
+            digest = self._sha256(path)
+            if digest != self.hashes[path]:
+                self.hashes[path] = digest
+                changed.append(path)
+        return changed
+
+    def versions(self) -> dict[str, str | None]:
+        return {str(path): digest and digest[:12] for path, digest in self.hashes.items()}
+
+
+def default_artifact_path(places_path: Path) -> Path:
+    return places_path.with_name(places_path.name + GAZETTEER_ARTIFACT_SUFFIX)
+
+
+def compile_gazetteer(
+    places_path: Path,
+    output_path: Path | None = None,
+    fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+) -> dict:
+    # Layout: magic line, JSON header line, then one pickle per section. The
+    # header records section sizes so each section can be read on its own.
+    # Sections hold builtin containers only, so loading never depends on the
+    # module path the artifact was compiled under.
+    output_path = output_path or default_artifact_path(places_path)
+    source_sha256 = file_sha256(places_path)
+    mapping = load_places(places_path)
+    place_trie = PlaceTrie(mapping)
+    place_index, max_place_tokens = build_place_index(mapping)
+    fuzzy = {}
+    if fuzzy_backend == "symspell":
+        for length, buckets in place_index.items():
+            deletion_index = DeletionIndex(buckets["_all"])
+            fuzzy[length] = (deletion_index.suffix_length, deletion_index.deletes)
+    elif fuzzy_backend == "qgram":
+        for length, buckets in place_index.items():
+            fuzzy[length] = QGramIndex(buckets["_all"].variants()).state()
+    sections = {
+        "core": pickle.dumps(
+            {"mapping": mapping, "trie": place_trie.root, "trie_size": place_trie.size},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        ),
+        "index": pickle.dumps(
+            (
+                {
+                    length: {**buckets, "_all": buckets["_all"].state()}
+                    for length, buckets in place_index.items()
+                },
+                max_place_tokens,
+            ),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        ),
+        "fuzzy": pickle.dumps(fuzzy, protocol=pickle.HIGHEST_PROTOCOL),
+    }
+    header = {
+        "version": GAZETTEER_ARTIFACT_VERSION,
+        "source": places_path.name,
+        "source_sha256": source_sha256,
+        "fuzzy_backend": fuzzy_backend,
+        "variants": len(mapping),
+        "max_place_tokens": max_place_tokens,
+        "sections": [[name, len(payload)] for name, payload in sections.items()],
+    }
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with temp_path.open("wb") as handle:
+        handle.write(GAZETTEER_ARTIFACT_MAGIC + b"\n")
+        handle.write(json.dumps(header, sort_keys=True).encode("utf-8") + b"\n")
+        for payload in sections.values():
+            handle.write(payload)
+    os.replace(temp_path, output_path)
+    return header
+
+
+class GazetteerArtifact:
+    def __init__(self, path: Path, header: dict, data_offset: int):
+        self.path = path
+        self.header = header
+        self.offsets = {}
+        offset = data_offset
+        for name, size in header["sections"]:
+            self.offsets[name] = (offset, size)
+            offset += size
+
+    @classmethod
+    def open(cls, path: Path, places_path: Path | None = None) -> "GazetteerArtifact | None":
+        # Returns None when the artifact is missing, from another format version,
+        # or compiled from a places file whose content has changed since.
+        if not path.exists():
+            return None
+        with path.open("rb") as handle:
+            if handle.readline().rstrip(b"\n") != GAZETTEER_ARTIFACT_MAGIC:
+                return None
+            try:
+                header = json.loads(handle.readline())
+            except ValueError:
+                return None
+            data_offset = handle.tell()
+        if header.get("version") != GAZETTEER_ARTIFACT_VERSION:
+            return None
+        if places_path is not None and (
+            not places_path.exists() or file_sha256(places_path) != header.get("source_sha256")
+        ):
+            return None
+        return cls(path, header, data_offset)
+
+    def read_section(self, name: str):
+        offset, size = self.offsets[name]
+        with self.path.open("rb") as handle:
+            handle.seek(offset)
+            return pickle.loads(handle.read(size))
+
+    def load_index(self, fuzzy_backend: str) -> tuple[dict, int]:
+        # Fuzzy structures the artifact does not carry are built lazily by
+        # find_best_variant, as for engines built from a places file.
+        place_index, max_place_tokens = self.read_section("index")
+        for buckets in place_index.values():
+            buckets["_all"] = VariantTable(*buckets["_all"])
+        if fuzzy_backend != self.header["fuzzy_backend"]:
+            return place_index, max_place_tokens
+        if fuzzy_backend == "symspell":
+            for length, (suffix_length, deletes) in self.read_section("fuzzy").items():
+                buckets = place_index[length]
+                buckets["_symspell"] = DeletionIndex(buckets["_all"], suffix_length, deletes)
+        elif fuzzy_backend == "qgram":
+            for length, (q, postings, by_length) in self.read_section("fuzzy").items():
+                place_index[length]["_qgram"] = QGramIndex([], q, postings, by_length)
+        return place_index, max_place_tokens
+
+    def engine(
+        self,
+        matcher: str = "trie",
+        fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+        cache_size: int = 0,
+    ) -> ResolverEngine:
+        core = self.read_section("core")
+        place_trie = None
+        if matcher == "trie":
+            place_trie = PlaceTrie({})
+            place_trie.root = core["trie"]
+            place_trie.size = core["trie_size"]
+        return ResolverEngine(
+            core["mapping"],
+            matcher=matcher,
+            fuzzy_backend=fuzzy_backend,
+            place_trie=place_trie,
+            index_loader=lambda: self.load_index(fuzzy_backend),
+            cache_size=cache_size,
+        )
+
+
+GAZETTEER_FLAT_MAGIC = b"TRAVEL-ORDER-FLAT-GAZETTEER"
+GAZETTEER_FLAT_VERSION = 1
+GAZETTEER_FLAT_SUFFIX = ".flat"
+FLAT_SECTION_ALIGNMENT = 8
+
+
+def default_flat_path(places_path: Path) -> Path:
+    return places_path.with_name(places_path.name + GAZETTEER_FLAT_SUFFIX)
+
+
+def flat_strings(values: Iterable[bytes]) -> tuple[bytes, array]:
+    offsets = array("I", [0])
+    parts = []
+    for value in values:
+        parts.append(value)
+        offsets.append(offsets[-1] + len(value))
+    return b"".join(parts), offsets
+
+
+def flat_hash_slots(keys: list[bytes]) -> tuple[array, array]:
+    # Open addressing: key id + 1 (0 marks a free slot) in a power-of-two
+    # table at most half full, probed linearly from crc32(key). The crc32 of
+    # each slot is kept alongside, so probes only compare the keys on a hash
+    # match.
+    size = 2
+    while size < 2 * len(keys):
+        size <<= 1
+    mask = size - 1
+    slots = array("I", bytes(4 * size))
+    hashes = array("I", bytes(4 * size))
+    for key_id, key in enumerate(keys):
+        key_hash = zlib.crc32(key)
+        slot = key_hash & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = key_id + 1
+        hashes[slot] = key_hash
+    return slots, hashes
+
+
+def flat_string_table(name: str, keys: list[bytes]) -> dict[str, bytes]:
+    blob, offsets = flat_strings(keys)
+    slots, hashes = flat_hash_slots(keys)
+    return {
+        f"{name}.keys": blob,
+        f"{name}.offsets": offsets.tobytes(),
+        f"{name}.slots": slots.tobytes(),
+        f"{name}.hashes": hashes.tobytes(),
+    }
+
+
+def compile_flat_gazetteer(
+    places_path: Path,
+    output_path: Path | None = None,
+    fuzzy_backend: str = "symspell",
+) -> dict:
+    # Layout: magic line, JSON header line padded so that the data starts
+    # aligned, then raw arrays (bytes or native-order uint32) at the aligned
+    # offsets listed in the header. Normalized variants are ASCII, so their
+    # byte offsets are character offsets.
+    output_path = output_path or default_flat_path(places_path)
+    source_sha256 = file_sha256(places_path)
+    mapping = load_places(places_path)
+    place_index, max_place_tokens = build_place_index(mapping)
+    canonicals = next(iter(place_index.values()))["_all"].canonicals if place_index else []
+    canonical_ids = {canonical: number for number, canonical in enumerate(canonicals)}
+
+    # Every token prefix of every variant, like the PlaceTrie nodes: the
+    # value is canonical id + 1 for complete variants and 0 for prefixes.
+    prefixes: dict[bytes, int] = {}
+    for variant, canonical in mapping.items():
+        tokens = variant.split()
+        for end in range(1, len(tokens)):
+            prefixes.setdefault(" ".join(tokens[:end]).encode("ascii"), 0)
+        prefixes[variant.encode("ascii")] = canonical_ids[canonical] + 1
+
+    canonical_blob, canonical_offsets = flat_strings(
+        canonical.encode("utf-8") for canonical in canonicals
+    )
+    sections = {
+        "canonicals.keys": canonical_blob,
+        "canonicals.offsets": canonical_offsets.tobytes(),
+        **flat_string_table("places", list(prefixes)),
+        "places.values": array("I", prefixes.values()).tobytes(),
+    }
+    suffix_length = None
+    for length, buckets in place_index.items():
+        table = buckets["_all"]
+        first_chars = sorted(key for key in buckets if len(key) == 1)
+        first_starts = array("I", [0])
+        by_first = array("I")
+        for first_char in first_chars:
+            by_first.extend(buckets[first_char])
+            first_starts.append(len(by_first))
+        fuzzy_lengths = buckets["_windows"][0]
+        length_flags = bytearray(max(fuzzy_lengths, default=-1) + 1)
+        for fuzzy_length in fuzzy_lengths:
+            length_flags[fuzzy_length] = 1
+        prefix = f"{length}/"
+        sections.update(
+            {
+                prefix + "text": table.text.encode("ascii"),
+                prefix + "offsets": table.offsets.tobytes(),
+                prefix + "canonical_ids": table.canonical_ids.tobytes(),
+                prefix + "first_chars": "".join(first_chars).encode("ascii"),
+                prefix + "first_starts": first_starts.tobytes(),
+                prefix + "by_first": by_first.tobytes(),
+                prefix + "fuzzy_lengths": bytes(length_flags),
+            }
+        )
+        if fuzzy_backend == "symspell":
+            deletion_index = DeletionIndex(table)
+            suffix_length = deletion_index.suffix_length
+            posting_offsets = array("I", [0])
+            postings = array("I")
+            for ids in deletion_index.deletes.values():
+                if ids.__class__ is int:
+                    postings.append(ids)
+                else:
+                    postings.extend(ids)
+                posting_offsets.append(len(postings))
+            keys = [key.encode("ascii") for key in deletion_index.deletes]
+            sections.update(flat_string_table(prefix + "deletes", keys))
+            sections[prefix + "deletes.posting_offsets"] = posting_offsets.tobytes()
+            sections[prefix + "deletes.postings"] = postings.tobytes()
+
+    layout = {}
+    offset = 0
+    for name, payload in sections.items():
+        offset += -offset % FLAT_SECTION_ALIGNMENT
+        layout[name] = [offset, len(payload)]
+        offset += len(payload)
+    header = {
+        "version": GAZETTEER_FLAT_VERSION,
+        "source": places_path.name,
+        "source_sha256": source_sha256,
+        "fingerprint": mapping_fingerprint(mapping),
+        "fuzzy_backend": fuzzy_backend,
+        "suffix_length": suffix_length,
+        "variants": len(mapping),
+        "max_place_tokens": max_place_tokens,
+        "lengths": sorted(place_index),
+        "byteorder": sys.byteorder,
+        "sections": layout,
+    }
+    head = GAZETTEER_FLAT_MAGIC + b"\n" + json.dumps(header, sort_keys=True).encode("utf-8")
+    head += b" " * (-(len(head) + 1) % FLAT_SECTION_ALIGNMENT) + b"\n"
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with temp_path.open("wb") as handle:
+        handle.write(head)
+        position = 0
+        for name, payload in sections.items():
+            handle.write(b"\0" * (layout[name][0] - position))
+            handle.write(payload)
+            position = layout[name][0] + len(payload)
+    os.replace(temp_path, output_path)
+    return header
+
+
+class FlatStringTable:
+    # Read side of flat_string_table(): find() returns the key id or -1.
+    def __init__(
+        self, keys: memoryview, offsets: memoryview, slots: memoryview, hashes: memoryview
+    ):
+        self.keys = keys
+        self.offsets = offsets
+        self.slots = slots
+        self.hashes = hashes
+        self.mask = len(slots) - 1
+
+    def find(self, key: bytes) -> int:
+        keys = self.keys
+        offsets = self.offsets
+        slots = self.slots
+        hashes = self.hashes
+        mask = self.mask
+        key_hash = zlib.crc32(key)
+        slot = key_hash & mask
+        while True:
+            key_id = slots[slot] - 1
+            if key_id < 0:
+                return -1
+            if hashes[slot] == key_hash and keys[offsets[key_id] : offsets[key_id + 1]] == key:
+                return key_id
+            slot = (slot + 1) & mask
+
+
+class FlatDeletionIndex(DeletionIndex):
+    # DeletionIndex whose keys and posting lists are read from a
+    # FlatGazetteer; candidates and keys are ASCII bytes.
+    def __init__(
+        self,
+        variants: "FlatVariantTable",
+        suffix_length: int,
+        keys: FlatStringTable,
+        posting_offsets: memoryview,
+        postings: memoryview,
+    ):
+        self.variants = variants
+        self.suffix_length = suffix_length
+        self.keys = keys
+        self.posting_offsets = posting_offsets
+        self.postings = postings
+
+    def variant_ids(self, candidate: bytes) -> set[int]:
+        # FlatStringTable.find() inlined: a lookup probes hundreds of keys.
+        keys = self.keys.keys
+        key_offsets = self.keys.offsets
+        slots = self.keys.slots
+        hashes = self.keys.hashes
+        mask = self.keys.mask
+        posting_offsets = self.posting_offsets
+        postings = self.postings
+        crc32 = zlib.crc32
+        variant_ids = set()
+        for key in self._query_keys(candidate):
+            key_hash = crc32(key)
+            slot = key_hash & mask
+            while True:
+                key_id = slots[slot] - 1
+                if key_id < 0:
+                    break
+                if (
+                    hashes[slot] == key_hash
+                    and keys[key_offsets[key_id] : key_offsets[key_id + 1]] == key
+                ):
+                    variant_ids.update(
+                        postings[posting_offsets[key_id] : posting_offsets[key_id + 1]]
+                    )
+                    break
+                slot = (slot + 1) & mask
+        return variant_ids
+
+
+class FlatVariantTable:
+    # One token length of a FlatGazetteer, the counterpart of a place index
+    # buckets dict: variants as ASCII bytes with their offsets, first
+    # character buckets and, when compiled in, the SymSpell postings, all
+    # read in place. Lookups work on the encoded candidate and give the
+    # same answers as find_best_variant() on a VariantTable.
+    def __init__(self, gazetteer: "FlatGazetteer", length: int):
+        prefix = f"{length}/"
+        self.gazetteer = gazetteer
+        self.length = length
+        self.text = gazetteer.section(prefix + "text")
+        self.offsets = gazetteer.section(prefix + "offsets", "I")
+        self.canonical_ids = gazetteer.section(prefix + "canonical_ids", "I")
+        by_first = gazetteer.section(prefix + "by_first", "I")
+        first_starts = gazetteer.section(prefix + "first_starts", "I")
+        self.first_char_ids = {
+            bytes([first_char]): by_first[first_starts[number] : first_starts[number + 1]]
+            for number, first_char in enumerate(gazetteer.section(prefix + "first_chars"))
+        }
+        self.fuzzy_lengths = frozenset(
+            fuzzy_length
+            for fuzzy_length, flag in enumerate(gazetteer.section(prefix + "fuzzy_lengths"))
+            if flag
+        )
+        self.deletion_index = None
+        if gazetteer.header["fuzzy_backend"] == "symspell":
+            self.deletion_index = FlatDeletionIndex(
+                self,
+                gazetteer.header["suffix_length"],
+                gazetteer.string_table(prefix + "deletes"),
+                gazetteer.section(prefix + "deletes.posting_offsets", "I"),
+                gazetteer.section(prefix + "deletes.postings", "I"),
+            )
+
+    def __len__(self) -> int:
+        return len(self.canonical_ids)
+
+    def canonical(self, variant_id: int) -> str:
+        return self.gazetteer.canonical(self.canonical_ids[variant_id])
+
+    def find_best_variant(
+        self,
+        candidate: str,
+        fuzzy_backend: str = "scan",
+        profile: "ResolverProfile | None" = None,
+    ) -> tuple[str, int] | None:
+        # The flat file only stores a deletion index: the other fuzzy backends
+        # (qgram, numpy) use it when present, otherwise scan. All of them
+        # return the same matches.
+        if len(candidate) not in self.fuzzy_lengths:
+            if profile is not None:
+                profile.skipped += 1
+            if candidate.count(" ") + 1 != self.length:
+                return None
+            canonical = self.gazetteer.exact(candidate.encode("utf-8"))
+            return (canonical, 0) if canonical is not None else None
+
+        if profile is not None:
+            profile.lookups += 1
+        candidate = candidate.encode("utf-8")
+        if fuzzy_backend != "scan" and self.deletion_index is not None:
+            return self.deletion_index.lookup(candidate, profile)
+        best = scan_variants(
+            candidate, self, self.first_char_ids.get(candidate[:1], ()), None, profile
+        )
+        if best is None:
+            best = scan_variants(candidate, self, range(len(self)), best, profile)
+        return best
+
+
+class FlatPlaceTrie(PlaceTrie):
+    # PlaceTrie walk over the token prefix table of a FlatGazetteer: each
+    # step probes the tokens joined so far instead of following a child dict.
+    def __init__(self, gazetteer: "FlatGazetteer"):
+        self.gazetteer = gazetteer
+        self.size = gazetteer.header["variants"]
+
+    def longest_at(self, tokens: list[tuple[str, int, int]], index: int) -> tuple[int, str] | None:
+        places = self.gazetteer.places
+        values = self.gazetteer.place_values
+        best = None
+        key = b""
+        for position in range(index, len(tokens)):
+            token = tokens[position][0].encode("utf-8")
+            key = key + b" " + token if key else token
+            key_id = places.find(key)
+            if key_id < 0:
+                break
+            value = values[key_id]
+            if value:
+                best = (position + 1, self.gazetteer.canonical(value - 1))
+        return best
+
+
+class FlatMapping(Mapping):
+    # Read-only variant -> canonical view of a FlatGazetteer, iterated by
+    # token length.
+    def __init__(self, gazetteer: "FlatGazetteer"):
+        self.gazetteer = gazetteer
+
+    def __getitem__(self, variant: str) -> str:
+        canonical = self.gazetteer.exact(variant.encode("utf-8"))
+        if canonical is None:
+            raise KeyError(variant)
+        return canonical
+
+    def __len__(self) -> int:
+        return self.gazetteer.header["variants"]
+
+    def __iter__(self) -> Iterator[str]:
+        for length in self.gazetteer.header["lengths"]:
+            table = self.gazetteer.table(length)
+            text = table.text
+            offsets = table.offsets
+            for variant_id in range(len(table)):
+                yield str(text[offsets[variant_id] : offsets[variant_id + 1]], "ascii")
+
+
+class FlatGazetteer:
+    # A compile_flat_gazetteer() file mapped read-only. Every process that
+    # opens the same file shares its page cache pages, and the matcher and
+    # fuzzy lookups read the arrays in place: nothing is unpickled.
+    def __init__(self, path: Path, header: dict, data_offset: int):
+        self.path = path
+        self.header = header
+        with path.open("rb") as handle:
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)[data_offset:]
+        self.canonical_keys = self.section("canonicals.keys")
+        self.canonical_offsets = self.section("canonicals.offsets", "I")
+        self.places = self.string_table("places")
+        self.place_values = self.section("places.values", "I")
+        self.tables: dict[int, FlatVariantTable] = {}
+
+    @classmethod
+    def open(cls, path: Path, places_path: Path | None = None) -> "FlatGazetteer | None":
+        # Same contract as GazetteerArtifact.open(), plus the byte order the
+        # uint32 arrays were written in.
+        if not path.exists():
+            return None
+        with path.open("rb") as handle:
+            if handle.readline().rstrip(b"\n") != GAZETTEER_FLAT_MAGIC:
+                return None
+            try:
+                header = json.loads(handle.readline())
+            except ValueError:
+                return None
+            data_offset = handle.tell()
+        if header.get("version") != GAZETTEER_FLAT_VERSION:
+            return None
+        if header.get("byteorder") != sys.byteorder:
+            return None
+        if places_path is not None and (
+            not places_path.exists() or file_sha256(places_path) != header.get("source_sha256")
+        ):
+            return None
+        return cls(path, header, data_offset)
+
+    def section(self, name: str, typecode: str | None = None) -> memoryview:
+        offset, size = self.header["sections"][name]
+        view = self.buffer[offset : offset + size]
+        return view.cast(typecode) if typecode else view
+
+    def string_table(self, name: str) -> FlatStringTable:
+        return FlatStringTable(
+            self.section(name + ".keys"),
+            self.section(name + ".offsets", "I"),
+            self.section(name + ".slots", "I"),
+            self.section(name + ".hashes", "I"),
+        )
+
+    def canonical(self, canonical_id: int) -> str:
+        offsets = self.canonical_offsets
+        return str(self.canonical_keys[offsets[canonical_id] : offsets[canonical_id + 1]], "utf-8")
+
+    def exact(self, variant: bytes) -> str | None:
+        key_id = self.places.find(variant)
+        if key_id < 0 or not self.place_values[key_id]:
+            return None
+        return self.canonical(self.place_values[key_id] - 1)
+
+    def table(self, length: int) -> FlatVariantTable:
+        table = self.tables.get(length)
+        if table is None:
+            table = self.tables[length] = FlatVariantTable(self, length)
+        return table
+
+    def load_index(self) -> tuple[dict, int]:
+        place_index = {
+            length: {"_flat": self.table(length)} for length in self.header["lengths"]
+        }
+        return place_index, self.header["max_place_tokens"]
+
+    def engine(
+        self,
+        matcher: str = "trie",
+        fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+        cache_size: int = 0,
+    ) -> ResolverEngine:
+        # Opening the flat index costs nothing, so it is handed over directly
+        # rather than loaded lazily through shared_place_index(), which could
+        # return an in-memory index of the same gazetteer.
+        place_index, max_place_tokens = self.load_index()
+        return ResolverEngine(
+            FlatMapping(self),
+            place_index=place_index,
+            max_place_tokens=max_place_tokens,
+            matcher=matcher,
+            fuzzy_backend=fuzzy_backend,
+            place_trie=FlatPlaceTrie(self) if matcher == "trie" else None,
+            cache_size=cache_size,
+            gazetteer_version=self.header["fingerprint"],
+        )
+
+
+URL_READ_BUFFER_SIZE = 64 * 1024
+
+
+def iter_gunzip(chunks: Iterable[bytes]) -> Iterable[bytes]:
+    # Streaming gzip decoding, including multi-member files.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def iter_decoded_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterable[str]:
+    # Same lines as decoding the whole body and calling splitlines(): a
+    # trailing partial line, or one ending in "\r" that may be the first half
+    # of "\r\n", is carried over to the next chunk.
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+        if not text:
+            continue
+        lines = text.splitlines(keepends=True)
+        pending = lines.pop()
+        if pending.endswith("\r\n"):
+            lines.append(pending)
+            pending = ""
+        elif not pending.endswith("\r") and pending.splitlines()[0] != pending:
+            lines.append(pending)
+            pending = ""
+        for line in lines:
+            yield line.splitlines()[0]
+    yield from (pending + decoder.decode(b"", final=True)).splitlines()
+
+
+def read_url_lines(url: str, buffer_size: int = URL_READ_BUFFER_SIZE) -> Iterable[str]:
+    # urllib.request pulls in http.client and email; only URL inputs pay for it.
+    import urllib.parse
+    import urllib.request
+
+    with urllib.request.urlopen(url) as response:
+        read = getattr(response, "read1", response.read)
+        chunks = iter(lambda: read(buffer_size), b"")
+        # A server that sets Content-Encoding on a .gz file compressed the body
+        # once, so the suffix only counts when the header is absent.
+        encoding = response.headers.get("Content-Encoding")
+        if encoding is None:
+            gzipped = urllib.parse.urlsplit(url).path.endswith(".gz")
+        else:
+            gzipped = encoding.lower() in ("gzip", "x-gzip")
+        if gzipped:
+            chunks = iter_gunzip(chunks)
+        yield from iter_decoded_lines(chunks)
+
+
+def iter_input_lines(
+    inputs: list[str],
+    buffer_size: int = URL_READ_BUFFER_SIZE,
+) -> Iterable[str]:
+    if not inputs:
+        for line in sys.stdin:
+            yield line.rstrip("\n")
+        return
+    for item in inputs:
+        if item == "-":
+            for line in sys.stdin:
+                yield line.rstrip("\n")
+            continue
+        if item.startswith("http://") or item.startswith("https://"):
+            for line in read_url_lines(item, buffer_size):
+                yield line.rstrip("\n")
+            continue
+        path = Path(item)
+        if path.suffix == ".gz":
+            handle = gzip.open(path, "rt", encoding="utf-8")
+        else:
+            handle = path.open("r", encoding="utf-8", buffering=buffer_size)
+        with handle:
+            for line in handle:
+                yield line.rstrip("\n")
+
+
+PREFETCH_BATCH_LINES = 256
+INPUT_ORDERS = ("source", "interleave")
+
+
+def put_unless_stopped(lines_queue: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            lines_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def prefetch_source(
+    source: str,
+    buffer_size: int,
+    lines_queue: queue.Queue,
+    stop: threading.Event,
+    stats: dict,
+) -> None:
+    start = time.perf_counter()
+    batch = []
+    try:
+        for line in iter_input_lines([source], buffer_size):
+            stats["lines"] += 1
+            stats["bytes"] += len(line.encode("utf-8")) + 1
+            batch.append(line)
+            if len(batch) >= PREFETCH_BATCH_LINES:
+                if not put_unless_stopped(lines_queue, batch, stop):
+                    return
+                batch = []
+        if batch and not put_unless_stopped(lines_queue, batch, stop):
+            return
+    except Exception as exc:
+        put_unless_stopped(lines_queue, exc, stop)
+        return
+    finally:
+        stats["seconds"] = time.perf_counter() - start
+    put_unless_stopped(lines_queue, None, stop)
+
+
+def iter_queued_lines(lines_queue: queue.Queue) -> Iterable[str]:
+    while True:
+        batch = lines_queue.get()
+        if batch is None:
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield from batch
+
+
+def iter_tagged_input_lines(
+    inputs: list[str],
+    buffer_size: int = URL_READ_BUFFER_SIZE,
+    workers: int = 4,
+    read_ahead: int = 16,
+    order: str = "source",
+    stats: list[dict] | None = None,
+) -> Iterable[tuple[str, str]]:
+    # Reads the sources concurrently in a thread pool; each source fills its
+    # own queue of at most `read_ahead` batches. The yield order only depends
+    # on the inputs: source by source, or one line per source in turn for
+    # "interleave" (which runs a thread per source so no queue waits on a
+    # source that has not started).
+    from concurrent.futures import ThreadPoolExecutor
+
+    if order not in INPUT_ORDERS:
+        raise ValueError(f"Unknown input order: {order}")
+    sources = inputs or ["-"]
+    if stats is None:
+        stats = []
+    if order == "interleave":
+        workers = len(sources)
+    stop = threading.Event()
+    readers = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(sources))) as pool:
+        try:
+            for source in sources:
+                source_stats = {"source": source, "lines": 0, "bytes": 0, "seconds": 0.0}
+                stats.append(source_stats)
+                lines_queue = queue.Queue(maxsize=read_ahead)
+                pool.submit(prefetch_source, source, buffer_size, lines_queue, stop, source_stats)
+                readers.append((source, iter_queued_lines(lines_queue)))
+
+            if order == "source":
+                for source, lines in readers:
+                    for line in lines:
+                        yield source, line
+            while order == "interleave" and readers:
+                active = []
+                for source, lines in readers:
+                    line = next(lines, None)
+                    if line is not None:
+                        yield source, line
+                        active.append((source, lines))
+                readers = active
+        finally:
+            # Lets blocked readers exit if the consumer stops early.
+            stop.set()
+    for source_stats in stats:
+        seconds = source_stats["seconds"]
+        source_stats["lines_per_second"] = (source_stats["lines"] / seconds) if seconds else 0.0
+        source_stats["bytes_per_second"] = (source_stats["bytes"] / seconds) if seconds else 0.0
+
+
+OUTPUT_FORMATS = ("csv", "jsonl")
+OUTPUT_BUFFER_SIZE = 1 << 20
+OUTPUT_BATCH_LINES = 4096
+
+
+def result_record(
+    sentence_id: str | None,
+    origin: str | None,
+    destination: str | None,
+    details: dict | None = None,
+) -> dict:
+    valid = bool(origin and destination)
+    record = {
+        "id": sentence_id,
+        "origin": origin if valid else None,
+        "destination": destination if valid else None,
+        "valid": valid,
+    }
+    if details is not None:
+        record["origin_match"] = details["origin_match"]
+        record["destination_match"] = details["destination_match"]
+        record["latency_ms"] = round(details["latency_ms"], 4)
+    return record
+
+
+def format_result(
+    sentence_id: str,
+    origin: str | None,
+    destination: str | None,
+    output_format: str = "csv",
+    details: dict | None = None,
+) -> str:
+    if output_format == "csv":
+        if origin and destination:
+            return f"{sentence_id},{origin},{destination}"
+        return f"{sentence_id},INVALID,"
+    return json.dumps(result_record(sentence_id, origin, destination, details), ensure_ascii=False)
+
+
+def resolve_line(
+    engine: ResolverEngine, line: str, output_format: str = "csv", details: bool = False
+) -> str | None:
+    if not line.strip():
+        return None
+    if "," not in line:
+        return None
+    sentence_id, sentence = line.split(",", 1)
+    if details:
+        result = engine.resolve_details(sentence)
+        return format_result(
+            sentence_id, result["origin"], result["destination"], output_format, result
+        )
+    origin, destination = engine.resolve(sentence)
+    return format_result(sentence_id, origin, destination, output_format)
+
+
+class OutputWriter:
+    # Collects result lines and hands them to the underlying binary stream in
+    # one joined write per `batch_lines`, so a pipe sees a few large writes
+    # instead of one flush per line.
+    def __init__(self, stream, batch_lines: int = OUTPUT_BATCH_LINES, encoding: str = "utf-8"):
+        self.stream = stream
+        self.batch_lines = batch_lines
+        self.encoding = encoding
+        self.pending: list[str] = []
+        self.lines = 0
+
+    def write(self, line: str) -> None:
+        self.pending.append(line)
+        if len(self.pending) >= self.batch_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.stream.write(("\n".join(self.pending) + "\n").encode(self.encoding))
+            self.lines += len(self.pending)
+            self.pending = []
+        self.stream.flush()
+
+
+def open_output(path: str | None, buffer_size: int = OUTPUT_BUFFER_SIZE):
+    if path is None or path == "-":
+        sys.stdout.flush()
+        return open(sys.stdout.fileno(), "wb", buffering=buffer_size, closefd=False)
+    return open(path, "wb", buffering=buffer_size)
+
+
+def iter_chunks(lines: Iterable[str], chunk_size: int) -> Iterable[list[str]]:
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+WORKER_ENGINE: ResolverEngine | None = None
+WORKER_OUTPUT: tuple[str, bool] = ("csv", False)
+
+
+def init_worker(
+    places_path: Path,
+    fuzzy_backend: str,
+    artifact_path: Path | None,
+    cache_size: int = 0,
+    output_format: str = "csv",
+    details: bool = False,
+    profile: bool = False,
+) -> None:
+    global WORKER_ENGINE, WORKER_OUTPUT
+    WORKER_ENGINE = ResolverEngine.from_places(
+        places_path,
+        fuzzy_backend=fuzzy_backend,
+        artifact_path=artifact_path,
+        cache_size=cache_size,
+    )
+    if profile:
+        WORKER_ENGINE.enable_profile()
+    WORKER_OUTPUT = (output_format, details)
+
+
+def worker_variants() -> int:
+    return len(WORKER_ENGINE.mapping)
+
+
+def resolve_chunk(lines: list[str]) -> tuple[list[str], dict | None]:
+    output_format, details = WORKER_OUTPUT
+    results = []
+    for line in lines:
+        result = resolve_line(WORKER_ENGINE, line, output_format, details)
+        if result is not None:
+            results.append(result)
+    # Profiled workers send the counters of this chunk along with its results.
+    snapshot = None
+    if WORKER_ENGINE.profile is not None:
+        snapshot = WORKER_ENGINE.profile.snapshot()
+        WORKER_ENGINE.profile = ResolverProfile()
+    return results, snapshot
+
+
+def resolve_lines_parallel(
+    lines: Iterable[str],
+    places_path: Path,
+    fuzzy_backend: str = DEFAULT_FUZZY_BACKEND,
+    artifact_path: Path | None = None,
+    workers: int = 2,
+    chunk_size: int = 256,
+    max_in_flight: int | None = None,
+    cache_size: int = 0,
+    output_format: str = "csv",
+    details: bool = False,
+    profile: ResolverProfile | None = None,
+) -> Iterable[str]:
+    # Chunks are submitted as input is read and collected strictly in
+    # submission order; at most `max_in_flight` chunks are pending, so memory
+    # stays flat whatever the input size.
+    from concurrent.futures import ProcessPoolExecutor
+
+    max_in_flight = max_in_flight or workers * 2
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(
+            places_path,
+            fuzzy_backend,
+            artifact_path,
+            cache_size,
+            output_format,
+            details,
+            profile is not None,
+        ),
+    ) as pool:
+        # The workers load the gazetteer (or its artifact); the main process
+        # never does, so one of them reports an empty places list.
+        if not pool.submit(worker_variants).result():
+            raise ValueError("Places list is empty.")
+        pending = deque()
+
+        def collect() -> list[str]:
+            results, snapshot = pending.popleft().result()
+            if profile is not None and snapshot is not None:
+                profile.merge(snapshot)
+            return results
+
+        for chunk in iter_chunks(lines, chunk_size):
+            pending.append(pool.submit(resolve_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                yield from collect()
+        while pending:
+            yield from collect()
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be a positive integer")
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError("must be a non-negative integer")
+    return number
+
+
+def main() -> int:
+    default_places = Path(__file__).resolve().parents[1] / "data" / "places.txt"
+    parser = argparse.ArgumentParser(description="Extract origin and destination from travel orders.")
+    parser.add_argument("inputs", nargs="*", help="Input files, URLs, or '-' for stdin")
+    parser.add_argument("--places", type=Path, default=default_places, help="Path to places list")
+    parser.add_argument(
+        "--fuzzy-backend",
+        choices=FUZZY_BACKENDS,
+        default=DEFAULT_FUZZY_BACKEND,
+        help="Fuzzy place lookup backend.",
+    )
+    parser.add_argument(
+        "--artifact",
+        type=Path,
+        default=None,
+        help=(
+            "Compiled gazetteer, or flat gazetteer mapped and shared by the workers "
+            "(default: <places>.compiled when up to date)."
+        ),
+    )
+    parser.add_argument(
+        "--index-stats",
+        action="store_true",
+        help="Print the fuzzy index stats (built, build time, memory) to stderr (--workers 1).",
+    )
+    parser.add_argument(
+        "--read-buffer",
+        type=positive_int,
+        default=URL_READ_BUFFER_SIZE,
+        help="Read buffer size in bytes for file and URL inputs.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=non_negative_int,
+        default=0,
+        help="Read input sources concurrently with N threads (0 reads them in sequence).",
+    )
+    parser.add_argument(
+        "--input-order",
+        choices=INPUT_ORDERS,
+        default="source",
+        help="Keep source order or interleave sources line by line.",
+    )
+    parser.add_argument(
+        "--input-stats",
+        action="store_true",
+        help="Print per-source line counts, sizes and read throughput to stderr.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=1,
+        help="Resolve input chunks in a pool of N processes (output keeps input order).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=positive_int,
+        default=256,
+        help="Lines per chunk sent to a worker.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=non_negative_int,
+        default=0,
+        help="Keep the last N resolved sentences in an LRU cache per process (0 disables).",
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="Print the cache counters to stderr (--workers 1).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output one 'id,origin,destination' line or one JSON record per sentence.",
+    )
+    parser.add_argument(
+        "--details",
+        action="store_true",
+        help="With --format jsonl, add match type, span, fuzzy distance and latency.",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write results to this file instead of stdout.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print per-stage timings, fuzzy comparison counts and answer paths to stderr.",
+    )
+    parser.add_argument(
+        "--write-buffer",
+        type=positive_int,
+        default=OUTPUT_BUFFER_SIZE,
+        help="Output buffer size in bytes.",
+    )
+    args = parser.parse_args()
+
+    if args.details and args.format != "jsonl":
+        print("--details requires --format jsonl.", file=sys.stderr)
+        return 1
+
+    if args.workers > 1 and (args.index_stats or args.cache_stats):
+        parser.error("--index-stats and --cache-stats describe one engine: use --workers 1.")
+
+    if args.fuzzy_backend == "numpy" and not load_numpy():
+        print("NumPy is required for --fuzzy-backend numpy.", file=sys.stderr)
+        return 1
+
+    if not args.places.exists():
+        print(f"Places file not found: {args.places}", file=sys.stderr)
+        return 1
+
+    # Workers build their own engine: the main process only needs one to
+    # resolve the lines itself.
+    engine = None
+    if args.workers > 1:
+        profile = ResolverProfile() if args.profile else None
+    else:
+        engine = ResolverEngine.from_places(
+            args.places,
+            fuzzy_backend=args.fuzzy_backend,
+            artifact_path=args.artifact,
+            cache_size=args.cache_size,
+        )
+        if not engine.mapping:
+            print("Places list is empty.", file=sys.stderr)
+            return 1
+        profile = engine.enable_profile() if args.profile else None
+
+    input_stats = []
+    if args.prefetch > 0 or args.input_stats or args.input_order == "interleave":
+        lines = (
+            line
+            for _, line in iter_tagged_input_lines(
+                args.inputs,
+                args.read_buffer,
+                max(args.prefetch, 1),
+                order=args.input_order,
+                stats=input_stats,
+            )
+        )
+    else:
+        lines = iter_input_lines(args.inputs, args.read_buffer)
+    if engine is None:
+        results = resolve_lines_parallel(
+            lines,
+            args.places,
+            args.fuzzy_backend,
+            args.artifact,
+            args.workers,
+            args.chunk_size,
+            cache_size=args.cache_size,
+            output_format=args.format,
+            details=args.details,
+            profile=profile,
+        )
+        try:
+            first = next(results, None)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        results = chain([first], results)
+    else:
+        results = (resolve_line(engine, line, args.format, args.details) for line in lines)
+    with open_output(args.output, args.write_buffer) as stream:
+        writer = OutputWriter(stream)
+        for result in results:
+            if result is not None:
+                writer.write(result)
+        writer.flush()
+
+    if args.index_stats:
+        print(json.dumps(engine.index_stats(memory=True), sort_keys=True), file=sys.stderr)
+    if args.input_stats:
+        for source_stats in input_stats:
+            print(json.dumps(source_stats, sort_keys=True), file=sys.stderr)
+    if profile is not None:
+        print(json.dumps(profile.report(), sort_keys=True), file=sys.stderr)
+    if args.cache_stats and engine.cache is not None:
+        print(json.dumps(engine.cache.stats(), sort_keys=True), file=sys.stderr)
 
     return 0
 
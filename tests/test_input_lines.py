@@ -0,0 +1,104 @@
+import gzip
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from src.travel_order_resolver import iter_input_lines, iter_tagged_input_lines, read_url_lines
+
+BODY = "1,de Paris à Lyon\r\n2,billet Nantes Brest\n3,Genève\r4,fin"
+LINES = ["1,de Paris à Lyon", "2,billet Nantes Brest", "3,Genève", "4,fin"]
+
+
+class LinesHandler(BaseHTTPRequestHandler):
+    release = threading.Event()
+
+    def do_GET(self) -> None:
+        body = BODY.encode("utf-8")
+        self.send_response(200)
+        if self.path in ("/encoded.txt", "/encoded.txt.gz"):
+            self.send_header("Content-Encoding", "gzip")
+            body = gzip.compress(body)
+        elif self.path == "/batch.txt.gz":
+            body = gzip.compress(body)
+        self.end_headers()
+        if self.path == "/slow.txt":
+            # Send the first line, then hold the rest until the client saw it.
+            first, rest = body.split(b"\n", 1)
+            self.wfile.write(first + b"\n")
+            self.wfile.flush()
+            self.release.wait(5)
+            body = rest
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class InputLinesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), LinesHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_url_lines_match_full_decode(self) -> None:
+        for path in ("/plain.txt", "/encoded.txt", "/batch.txt.gz", "/encoded.txt.gz"):
+            for buffer_size in (1, 3, 65536):
+                lines = list(read_url_lines(self.base_url + path, buffer_size))
+                self.assertEqual(LINES, lines, (path, buffer_size))
+
+    def test_url_lines_stream_before_body_ends(self) -> None:
+        LinesHandler.release.clear()
+        lines = read_url_lines(self.base_url + "/slow.txt", 4096)
+        self.assertEqual(LINES[0], next(lines))
+        LinesHandler.release.set()
+        self.assertEqual(LINES[1:], list(lines))
+
+    def test_local_gzip_input(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "batch.txt.gz"
+            with gzip.open(path, "wt", encoding="utf-8") as handle:
+                handle.write("1,de Paris à Lyon\n2,billet Nantes Brest\n")
+            self.assertEqual(LINES[:2], list(iter_input_lines([str(path)])))
+
+    def test_prefetched_sources_keep_deterministic_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            sources = []
+            for index, count in enumerate((600, 3, 0, 300)):
+                path = Path(tmp) / f"shard_{index}.txt"
+                path.write_text("".join(f"{index}-{n},ligne\n" for n in range(count)), "utf-8")
+                sources.append(str(path))
+            sources.append(self.base_url + "/plain.txt")
+            sequential = list(iter_input_lines(sources))
+
+            stats = []
+            tagged = list(iter_tagged_input_lines(sources, workers=2, read_ahead=1, stats=stats))
+            self.assertEqual(sequential, [line for _, line in tagged])
+            self.assertEqual([600, 3, 0, 300, 4], [row["lines"] for row in stats])
+            self.assertEqual(Path(sources[0]).stat().st_size, stats[0]["bytes"])
+
+            interleaved = list(iter_tagged_input_lines(sources, order="interleave"))
+            self.assertEqual(sorted(tagged), sorted(interleaved))
+            self.assertEqual(
+                [sources[0], sources[1], sources[3], sources[4]],
+                [source for source, _ in interleaved[:4]],
+            )
+
+            lines = iter_tagged_input_lines(sources, workers=1, read_ahead=1)
+            self.assertEqual((sources[0], "0-0,ligne"), next(lines))
+            lines.close()
+
+            with self.assertRaises(FileNotFoundError):
+                list(iter_tagged_input_lines([sources[0], str(Path(tmp) / "missing.txt")]))
+
+
+if __name__ == "__main__":
+    unittest.main()
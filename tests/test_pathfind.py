@@ -48,6 +48,25 @@ class PathfindTest(unittest.TestCase):
         ids = pathfind.resolve_stop_ids(index, "Saint-Etienne")
         self.assertEqual(["StopArea:ST_ETIENNE"], ids)
 
+    def test_resolve_stop_ids_fuzzy_backends_agree(self) -> None:
+        index = {
+            "marseille st charles": {"stop_ids": ["StopArea:MARSEILLE"]},
+            "marseille blancarde": {"stop_ids": ["StopArea:BLANCARDE"]},
+            "montpellier st roch": {"stop_ids": ["StopArea:MONTPELLIER"]},
+            "strasbourg": {"stop_ids": ["StopArea:STRASBOURG"]},
+            "lyon part dieu": {"stop_ids": ["StopArea:LYON_PD"]},
+        }
+        for name in ["Marseile", "Marsielle St Charles", "Montpelier", "Trasbourg", "Lyon Prat"]:
+            self.assertEqual(
+                pathfind.resolve_stop_ids(index, name, "scan"),
+                pathfind.resolve_stop_ids(index, name, "qgram"),
+                msg=name,
+            )
+        self.assertEqual(
+            {"StopArea:MARSEILLE", "StopArea:BLANCARDE"},
+            set(pathfind.resolve_stop_ids(index, "Marseile")),
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
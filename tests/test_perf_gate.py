@@ -0,0 +1,48 @@
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS = ROOT / "scripts"
+sys.path.append(str(SCRIPTS))
+
+from perf_gate import DEFAULT_TOLERANCES, compare
+
+
+def make_report(calibration: float, rate: float, p95: float, rss: int) -> dict:
+    return {
+        "calibration_seconds": calibration,
+        "cases": {
+            "places": {
+                "sentences": 100,
+                "sentences_per_second": rate,
+                "startup_seconds": 0.1,
+                "latency_ms": {"p50": 0.05, "p95": p95, "p99": 20.0},
+                "peak_rss_bytes": rss,
+            }
+        },
+    }
+
+
+class PerfGateTest(unittest.TestCase):
+    def test_calibration_scales_timings(self) -> None:
+        baseline = make_report(0.05, 400.0, 10.0, 20_000_000)
+        # Twice slower machine, twice slower numbers: no regression.
+        slower = make_report(0.10, 200.0, 20.0, 20_000_000)
+        rows = compare(slower, baseline, DEFAULT_TOLERANCES)
+        self.assertEqual({"ok"}, {row["status"] for row in rows})
+
+    def test_regressions_are_reported(self) -> None:
+        baseline = make_report(0.05, 400.0, 10.0, 20_000_000)
+        report = make_report(0.05, 250.0, 10.0, 30_000_000)
+        rows = compare(report, baseline, DEFAULT_TOLERANCES)
+        failed = {row["metric"] for row in rows if row["status"] != "ok"}
+        self.assertEqual({"sentences_per_second", "peak_rss_bytes"}, failed)
+
+        report["cases"] = {}
+        rows = compare(report, baseline, DEFAULT_TOLERANCES)
+        self.assertEqual(["missing"], [row["status"] for row in rows])
+
+
+if __name__ == "__main__":
+    unittest.main()
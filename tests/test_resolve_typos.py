@@ -1,8 +1,19 @@
+import importlib.util
+import tempfile
 import unittest
+from array import array
+from pathlib import Path
 
 from src.travel_order_resolver import (
+    ResolverEngine,
+    QGramIndex,
+    bounded_levenshtein,
     build_place_index,
     build_place_pattern,
+    extract_places_fuzzy,
+    find_best_variant,
+    levenshtein,
+    load_places,
     resolve_order,
 )
 
@@ -26,6 +37,191 @@ class ResolveTyposTest(unittest.TestCase):
         self.assertEqual("Strasbourg", origin)
         self.assertEqual("Tours", destination)
 
+    def test_place_index_stores_variants_once_with_integer_buckets(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            places = Path(tmp) / "places.txt"
+            places.write_text(
+                "Saint-Etienne\nSt Etienne|Saint-Etienne\nStrasbourg\nSete\n", encoding="utf-8"
+            )
+            mapping = load_places(places)
+        self.assertIs(mapping["saint etienne"], mapping["st etienne"])
+
+        index, _ = build_place_index(mapping, "symspell")
+        self.assertEqual([("strasbourg", "Strasbourg"), ("sete", "Sete")], list(index[1]["_all"]))
+        self.assertEqual(
+            [("saint etienne", "Saint-Etienne"), ("st etienne", "Saint-Etienne")],
+            list(index[2]["_all"]),
+        )
+        self.assertIs(index[1]["_all"].canonicals, index[2]["_all"].canonicals)
+        self.assertEqual(3, len(index[1]["_all"].canonicals))
+        self.assertEqual(array("I", [0, 1]), index[1]["s"])
+        deletes = index[1]["_symspell"].deletes
+        self.assertEqual(0, deletes["asbourg"])
+        self.assertEqual(1, deletes["sete"])
+        self.assertEqual(("Strasbourg", 1), find_best_variant("strasbourgg", index[1], "symspell"))
+
+    def test_symspell_backend_matches_scan(self) -> None:
+        mapping = {
+            "strasbourg": "Strasbourg",
+            "saint etienne": "Saint-Etienne",
+            "saint emilion": "Saint-Emilion",
+            "tours": "Tours",
+            "lyon": "Lyon",
+        }
+        scan_index, max_tokens = build_place_index(mapping)
+        symspell_index, _ = build_place_index(mapping, "symspell")
+        candidates = [
+            "trasbourg",
+            "strasbuorg",
+            "sait etienne",
+            "saint etiene",
+            "saint emillion",
+            "lyom",
+            "tours",
+            "paris",
+        ]
+        for candidate in candidates:
+            length = len(candidate.split())
+            self.assertEqual(
+                find_best_variant(candidate, scan_index.get(length, {})),
+                find_best_variant(candidate, symspell_index.get(length, {}), "symspell"),
+                msg=candidate,
+            )
+        sentence = "billet de trasbourg pour saint etiene"
+        self.assertEqual(
+            extract_places_fuzzy(sentence, scan_index, max_tokens),
+            extract_places_fuzzy(sentence, scan_index, max_tokens, "symspell"),
+        )
+
+    def test_bounded_levenshtein_agrees_with_full_distance(self) -> None:
+        long_name = "saint germain des fosses " * 4
+        pairs = [
+            ("strasbourg", "trasbourg"),
+            ("strasbourg", "strasbuorg"),
+            ("saint etienne", "sait etiene"),
+            ("lyon", "lyon"),
+            ("lyon", "tours"),
+            ("", "abc"),
+            ("ab", "ba"),
+            (long_name, long_name.replace("germain", "gremain")),
+            (long_name, long_name[:-5]),
+        ]
+        for a, b in pairs:
+            full = levenshtein(a, b)
+            for threshold in range(4):
+                self.assertEqual(
+                    min(full, threshold + 1),
+                    bounded_levenshtein(a, b, threshold),
+                    msg=(a, b, threshold),
+                )
+
+    def test_window_filter_keeps_lookup_results(self) -> None:
+        mapping = {
+            "ay": "Ay",
+            "dax": "Dax",
+            "metz": "Metz",
+            "nice": "Nice",
+            "tours": "Tours",
+            "angers": "Angers",
+            "strasbourg": "Strasbourg",
+            "saint etienne": "Saint-Etienne",
+        }
+        for backend in ("scan", "symspell"):
+            index, _ = build_place_index(mapping, backend)
+            unfiltered, _ = build_place_index(mapping, backend)
+            for buckets in unfiltered.values():
+                buckets["_windows"] = (frozenset(range(64)), {})
+            for candidate in [
+                "a",
+                "ay",
+                "ax",
+                "dax",
+                "je",
+                "metz",
+                "metzz",
+                "nice",
+                "pour",
+                "tour",
+                "anger",
+                "angesr",
+                "billet",
+                "voudrais",
+                "trasbourg",
+                "strasbourgeois",
+                "de metz",
+                "sait etienne",
+                "je voudrais",
+            ]:
+                length = len(candidate.split())
+                self.assertEqual(
+                    find_best_variant(candidate, unfiltered.get(length, {}), backend),
+                    find_best_variant(candidate, index.get(length, {}), backend),
+                    msg=(backend, candidate),
+                )
+
+        engine = ResolverEngine(mapping)
+        profile = engine.enable_profile()
+        sentence = "je voudrais un billet pour angesr"
+        first = engine.resolve(sentence)
+        self.assertEqual(first, engine.resolve(sentence))
+        self.assertGreater(profile.skipped, 0)
+        self.assertGreater(profile.memoized, 0)
+        self.assertIn("je voudrais", engine.window_memo)
+
+    def test_qgram_backend_matches_scan(self) -> None:
+        mapping = {
+            "strasbourg": "Strasbourg",
+            "saint etienne": "Saint-Etienne",
+            "saint emilion": "Saint-Emilion",
+            "marseille": "Marseille",
+            "montpellier": "Montpellier",
+            "tours": "Tours",
+            "lyon": "Lyon",
+        }
+        scan_index, _ = build_place_index(mapping)
+        qgram_index, _ = build_place_index(mapping, "qgram")
+        for candidate in [
+            "trasbourg",
+            "strasbuorg",
+            "marsielle",
+            "montpelier",
+            "montpellierr",
+            "sait etienne",
+            "saint emillion",
+            "tousr",
+            "lyon",
+            "paris",
+        ]:
+            length = len(candidate.split())
+            self.assertEqual(
+                find_best_variant(candidate, scan_index.get(length, {})),
+                find_best_variant(candidate, qgram_index.get(length, {}), "qgram"),
+                msg=candidate,
+            )
+
+        qgrams = QGramIndex(["abcabc", "bcabca", "xyz"])
+        self.assertIn(0, qgrams.candidates("abcabd", 1))
+        self.assertNotIn(2, qgrams.candidates("abcabd", 1))
+
+    @unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy is not installed")
+    def test_numpy_backend_matches_scan(self) -> None:
+        mapping = {
+            "strasbourg": "Strasbourg",
+            "saint etienne": "Saint-Etienne",
+            "saint emilion": "Saint-Emilion",
+            "marseille": "Marseille",
+            "tours": "Tours",
+        }
+        scan_index, _ = build_place_index(mapping)
+        numpy_index, _ = build_place_index(mapping, "numpy")
+        for candidate in ["trasbourg", "zarseille", "aint etienne", "xaint emillion", "vours"]:
+            length = len(candidate.split())
+            self.assertEqual(
+                find_best_variant(candidate, scan_index.get(length, {})),
+                find_best_variant(candidate, numpy_index.get(length, {}), "numpy"),
+                msg=candidate,
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,454 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.travel_order_resolver import (
+    FlatGazetteer,
+    GazetteerArtifact,
+    OutputWriter,
+    PlaceTrie,
+    ResolutionCache,
+    ResolverEngine,
+    ResolverProfile,
+    SourceWatcher,
+    build_place_index,
+    build_place_pattern,
+    collect_candidates,
+    compile_flat_gazetteer,
+    compile_gazetteer,
+    cue_token_forms,
+    extract_place_spans,
+    extract_places,
+    load_places,
+    normalize,
+    normalize_slow,
+    place_index_stats,
+    resolve_line,
+    resolve_lines_parallel,
+    resolve_order,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "scripts"))
+
+import run_memory_benchmarks
+
+
+class ResolverEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        root = Path(__file__).resolve().parents[1]
+        self.mapping = load_places(root / "data" / "places.txt")
+        self.engine = ResolverEngine(self.mapping)
+
+    def test_engine_matches_resolve_order(self) -> None:
+        place_pattern = build_place_pattern(list(self.mapping.keys()))
+        place_index, max_place_tokens = build_place_index(self.mapping)
+        sentences = [
+            "je veux aller de toulouse a bordeaux",
+            "depuis la gare de Lyon jusqu a Marseille",
+            "billet pour paris en partant de lille",
+            "comment aller a Tours depuis trasbourg",
+            "je voudrais un cafe",
+            "depuis la jolie ville de nantes jusqu'a rennes",
+            "de de paris a a lyon",
+            "je pars de parsi pour bordeaux",
+            "billet jusqua lille depart marseille",
+        ]
+        for sentence in sentences:
+            self.assertEqual(
+                resolve_order(sentence, self.mapping, place_pattern, place_index, max_place_tokens),
+                self.engine.resolve(sentence),
+                msg=sentence,
+            )
+
+    def test_resolve_many_keeps_input_order(self) -> None:
+        results = list(
+            self.engine.resolve_many(
+                [
+                    "je veux aller de toulouse a bordeaux",
+                    "une phrase sans trajet",
+                    "de paris vers lyon",
+                ]
+            )
+        )
+        self.assertEqual(
+            [("Toulouse", "Bordeaux"), (None, None), ("Paris", "Lyon")],
+            results,
+        )
+
+    def test_trie_matches_regex_spans(self) -> None:
+        mapping = {
+            "gare": "Gare",
+            "lyon": "Lyon",
+            "gare de lyon": "Paris Gare de Lyon",
+            "paris gare de lyon": "Paris Gare de Lyon",
+            "paris": "Paris",
+            "saint etienne": "Saint-Etienne",
+        }
+        place_pattern = build_place_pattern(list(mapping.keys()))
+        place_trie = PlaceTrie(mapping)
+        sentences = [
+            "de paris gare de lyon a saint etienne",
+            "depuis la gare de lyon vers paris",
+            "jusqu a lyon depuis saint etienne gare",
+            "gare gare de paris",
+        ]
+        for sentence in sentences:
+            sentence_norm = normalize(sentence)
+            self.assertEqual(
+                extract_place_spans(sentence_norm, place_pattern),
+                extract_place_spans(sentence_norm, place_pattern, place_trie),
+            )
+            self.assertEqual(
+                extract_places(sentence_norm, place_pattern, mapping),
+                extract_places(sentence_norm, place_pattern, mapping, place_trie),
+            )
+            spans = extract_place_spans(sentence_norm, place_pattern)
+            self.assertEqual(
+                collect_candidates(
+                    sentence_norm,
+                    [(r"\bde\b", 1), (r"\ba\b", 1)],
+                    place_pattern,
+                    mapping,
+                    spans,
+                ),
+                collect_candidates(
+                    sentence_norm,
+                    [(r"\bde\b", 1), (r"\ba\b", 1)],
+                    place_pattern,
+                    mapping,
+                    spans,
+                    place_trie,
+                ),
+            )
+
+    def test_normalize_fast_path_matches_legacy(self) -> None:
+        texts = [
+            "Je veux aller de Saint-\u00c9tienne \u00e0 L'Ha\u00ff-les-Roses",
+            "  C\u0152UR\tde\u00a0Lyon\u2026 ",
+            "\u0130stanbul \u01c4 \u1e9e \ufb01n",
+            "gare de Lyon-Part-Dieu, 08h30 !",
+        ]
+        texts.extend(self.mapping.keys())
+        for text in texts + [chr(code) for code in range(0x300)]:
+            self.assertEqual(normalize_slow(text), normalize(text), repr(text))
+
+    def test_compiled_gazetteer_matches_places_file(self) -> None:
+        root = Path(__file__).resolve().parents[1]
+        sentences = [
+            "je veux aller de toulouse a bordeaux",
+            "comment aller a Tours depuis trasbourg",
+            "de Lille vers Nantes puis Paris",
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            places = Path(tmp) / "places.txt"
+            places.write_text((root / "data" / "places.txt").read_text(encoding="utf-8"), "utf-8")
+            header = compile_gazetteer(places, fuzzy_backend="symspell")
+            self.assertEqual(len(self.mapping), header["variants"])
+
+            engine = ResolverEngine.from_places(places, fuzzy_backend="symspell")
+            self.assertEqual(self.mapping, engine.mapping)
+            self.assertIsNone(engine._place_index)
+            for sentence in sentences:
+                self.assertEqual(self.engine.resolve(sentence), engine.resolve(sentence))
+            self.assertIn("_symspell", engine.place_index[1])
+
+            artifact = places.with_name("places.txt.compiled")
+            self.assertIsNotNone(GazetteerArtifact.open(artifact, places))
+
+            # The default backend's q-gram postings are stored as well.
+            self.assertEqual("qgram", compile_gazetteer(places)["fuzzy_backend"])
+            place_index, _ = GazetteerArtifact.open(artifact, places).load_index("qgram")
+            built, _ = build_place_index(self.mapping, "qgram")
+            for length, buckets in place_index.items():
+                self.assertEqual(built[length]["_qgram"].postings, buckets["_qgram"].postings)
+            engine = ResolverEngine.from_places(places)
+            for sentence in sentences:
+                self.assertEqual(self.engine.resolve(sentence), engine.resolve(sentence))
+            with places.open("a", encoding="utf-8") as handle:
+                handle.write("Quimper\n")
+            self.assertIsNone(GazetteerArtifact.open(artifact, places))
+            self.assertIn("quimper", ResolverEngine.from_places(places).mapping)
+
+    def test_flat_gazetteer_matches_places_file(self) -> None:
+        sentences = [
+            "je veux aller de toulouse a bordeaux",
+            "comment aller a Tours depuis trasbourg",
+            "de Lille vers Nantes puis Paris",
+            "depuis la gare de Lyon jusqu a Marseille",
+            "je pars de parsi pour bordeaux",
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            places = Path(tmp) / "places.txt"
+            places.write_text((ROOT / "data" / "places.txt").read_text(encoding="utf-8"), "utf-8")
+            flat = places.with_name("places.txt.flat")
+            header = compile_flat_gazetteer(places, flat)
+            self.assertEqual(len(self.mapping), header["variants"])
+            self.assertIsNone(GazetteerArtifact.open(flat, places))
+
+            for fuzzy_backend in ("symspell", "qgram", "scan"):
+                engine = ResolverEngine.from_places(
+                    places, fuzzy_backend=fuzzy_backend, artifact_path=flat
+                )
+                reference = ResolverEngine(self.mapping, fuzzy_backend=fuzzy_backend)
+                self.assertEqual(self.mapping, dict(engine.mapping))
+                self.assertEqual(reference.gazetteer_version, engine.gazetteer_version)
+                self.assertIn("_flat", engine.place_index[1])
+                for sentence in sentences:
+                    self.assertEqual(reference.resolve(sentence), engine.resolve(sentence))
+                    self.assertEqual(
+                        reference.resolve_details(sentence)["origin_match"],
+                        engine.resolve_details(sentence)["origin_match"],
+                    )
+
+            with places.open("a", encoding="utf-8") as handle:
+                handle.write("Quimper\n")
+            self.assertIsNone(FlatGazetteer.open(flat, places))
+            self.assertIn("quimper", ResolverEngine.from_places(places, artifact_path=flat).mapping)
+
+    @unittest.skipUnless(Path("/proc/self/smaps_rollup").exists(), "needs /proc smaps_rollup")
+    def test_flat_gazetteer_pages_are_shared_by_workers(self) -> None:
+        places = ROOT / "data" / "places_stops.txt"
+        sentences = ["de trasbourg a tours", "billet paris lyon"]
+        with tempfile.TemporaryDirectory() as tmp:
+            flat = Path(tmp) / "places_stops.txt.flat"
+            compile_flat_gazetteer(places, flat, "scan")
+            private = run_memory_benchmarks.worker_memory(places, None, "scan", 4, sentences)
+            shared = run_memory_benchmarks.worker_memory(places, flat, "scan", 4, sentences)
+        # Each private copy holds a few MiB of dicts and strings; the mapped
+        # file is counted once across the four workers.
+        self.assertLess(shared["pss_bytes"], private["pss_bytes"] - 4 * 2 * 2**20)
+        self.assertLess(shared["rss_bytes"], private["rss_bytes"])
+
+    def test_fuzzy_index_is_lazy_and_shared(self) -> None:
+        mapping = dict(self.mapping)
+        mapping["quimper"] = "Quimper"
+        engine = ResolverEngine(mapping)
+        self.assertFalse(engine.index_stats()["built"])
+        self.assertEqual(("Toulouse", "Bordeaux"), engine.resolve("de toulouse a bordeaux"))
+        self.assertFalse(engine.index_stats()["built"])
+
+        self.assertEqual(("Strasbourg", "Tours"), engine.resolve("de trasbourg a tours"))
+        stats = engine.index_stats(memory=True)
+        self.assertTrue(stats["built"])
+        self.assertGreater(stats["memory_bytes"], 0)
+
+        other = ResolverEngine(dict(mapping))
+        self.assertIs(engine.place_index, other.place_index)
+        self.assertEqual(2, other.index_stats()["shared_requests"])
+
+        # resolve_order() only looks its (scan) index up for a fuzzy pass.
+        def scan_requests() -> list[int]:
+            return [
+                row["requests"]
+                for row in place_index_stats()
+                if row["fingerprint"] == engine.gazetteer_version and row["fuzzy_backend"] == "scan"
+            ]
+
+        place_pattern = build_place_pattern(list(mapping.keys()))
+        resolve_order("de toulouse a bordeaux", mapping, place_pattern)
+        self.assertEqual([], scan_requests())
+        resolve_order("de trasbourg a tours", mapping, place_pattern)
+        resolve_order("de trasbourg a tours", mapping, place_pattern)
+        self.assertEqual([2], scan_requests())
+
+    def test_parallel_lines_keep_input_order(self) -> None:
+        root = Path(__file__).resolve().parents[1]
+        lines = [
+            "1,je veux aller de toulouse a bordeaux",
+            "",
+            "2,comment aller a Tours depuis trasbourg",
+            "no comma",
+            "3,bonjour",
+            "4,de Lille vers Nantes",
+        ] * 5
+        expected = [
+            result for result in (resolve_line(self.engine, line) for line in lines) if result
+        ]
+        results = list(
+            resolve_lines_parallel(
+                iter(lines), root / "data" / "places.txt", workers=2, chunk_size=3, max_in_flight=2
+            )
+        )
+        self.assertEqual(expected, results)
+
+    def test_parallel_lines_reject_an_empty_places_list(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            places = Path(tmp) / "places.txt"
+            places.write_text("", encoding="utf-8")
+            results = resolve_lines_parallel(iter(["1,de toulouse a bordeaux"]), places, workers=2)
+            with self.assertRaisesRegex(ValueError, "empty"):
+                next(results)
+
+    def test_jsonl_details_report_match_evidence(self) -> None:
+        self.assertEqual("1,Toulouse,Bordeaux", resolve_line(self.engine, "1,de toulouse a bordeaux"))
+        self.assertEqual("2,INVALID,", resolve_line(self.engine, "2,bonjour"))
+
+        lines = [
+            "1,je veux aller de toulouse a bordeaux",
+            "2,comment aller a Tours depuis trasbourg",
+            "3,billet Lille Nantes",
+            "4,bonjour",
+        ]
+        records = [json.loads(resolve_line(self.engine, line, "jsonl", True)) for line in lines]
+        self.assertEqual(
+            {"type": "exact", "span": [17, 25], "text": "toulouse", "distance": 0},
+            records[0]["origin_match"],
+        )
+        self.assertEqual(
+            {"type": "fuzzy", "span": [29, 38], "text": "trasbourg", "distance": 1},
+            records[1]["origin_match"],
+        )
+        self.assertEqual("exact", records[1]["destination_match"]["type"])
+        self.assertEqual("fallback", records[2]["origin_match"]["type"])
+        self.assertEqual("fallback", records[2]["destination_match"]["type"])
+        self.assertEqual(
+            {"id": "4", "origin": None, "destination": None, "valid": False},
+            json.loads(resolve_line(self.engine, lines[3], "jsonl")),
+        )
+        self.assertTrue(all(record["latency_ms"] >= 0 for record in records))
+
+        stream = io.BytesIO()
+        writer = OutputWriter(stream, batch_lines=3)
+        for line in lines:
+            writer.write(resolve_line(self.engine, line))
+        self.assertEqual(3, writer.lines)
+        writer.flush()
+        self.assertEqual(
+            "1,Toulouse,Bordeaux\n2,Strasbourg,Tours\n3,Lille,Nantes\n4,INVALID,\n",
+            stream.getvalue().decode("utf-8"),
+        )
+
+    def test_top_candidates_rank_the_resolved_pair_first(self) -> None:
+        regex_engine = ResolverEngine(self.mapping, matcher="regex")
+        sentences = [
+            "je veux aller de toulouse a bordeaux",
+            "comment aller a Tours depuis trasbourg",
+            "billet Lille Nantes Paris",
+            "de paris a paris",
+            "bonjour",
+        ]
+        for engine in (self.engine, regex_engine):
+            for sentence in sentences:
+                result = engine.resolve_candidates(sentence)
+                pairs = [(pair["origin"], pair["destination"]) for pair in result["pairs"]]
+                answer = engine.resolve(sentence)
+                self.assertEqual(answer, (result["origin"], result["destination"]), msg=sentence)
+                self.assertEqual([answer] if answer[0] else [], pairs[:1], msg=sentence)
+
+        result = self.engine.resolve_candidates("comment aller a Tours depuis trasbourg", top_k=1)
+        self.assertEqual(
+            [
+                {
+                    "place": "Strasbourg",
+                    "score": 0.9,
+                    "source": "cue",
+                    "match": "fuzzy",
+                    "distance": 1,
+                    "position": 29,
+                }
+            ],
+            result["origin_candidates"],
+        )
+        self.assertEqual(1.0, result["destination_candidates"][0]["score"])
+        self.assertEqual(1, len(result["pairs"]))
+
+        result = self.engine.resolve_candidates("billet Lille Nantes Paris")
+        self.assertEqual(
+            [("Lille", "Nantes"), ("Lille", "Paris"), ("Nantes", "Paris")],
+            [(pair["origin"], pair["destination"]) for pair in result["pairs"]],
+        )
+        self.assertEqual(["fallback"] * 3, [row["source"] for row in result["origin_candidates"]])
+
+    def test_profile_counts_stages_and_paths(self) -> None:
+        engine = ResolverEngine(self.mapping)
+        profile = engine.enable_profile()
+        sentences = {
+            "je veux aller de toulouse a bordeaux": "exact_cue",
+            "comment aller a Tours depuis trasbourg": "fuzzy_cue",
+            "billet Lille Nantes": "fallback",
+            "bonjour": "invalid",
+        }
+        for sentence in sentences:
+            self.assertEqual(self.engine.resolve(sentence), engine.resolve(sentence))
+        report = profile.report()
+        self.assertEqual(4, report["sentences"])
+        self.assertEqual({path: 1 for path in sentences.values()}, report["paths"])
+        self.assertEqual(4, report["stages"]["normalize"]["calls"])
+        self.assertEqual(4, report["stages"]["select"]["calls"])
+        self.assertIn("fuzzy_cues", report["stages"])
+        self.assertGreater(report["levenshtein_comparisons"], 0)
+        self.assertIsNone(self.engine.profile)
+
+        merged = ResolverProfile()
+        merged.merge(profile.snapshot())
+        merged.merge(profile.snapshot())
+        self.assertEqual(8, merged.report()["sentences"])
+        self.assertEqual(2 * report["levenshtein_comparisons"], merged.comparisons)
+
+    def test_resolution_cache_counts_and_evicts(self) -> None:
+        engine = ResolverEngine(self.mapping, cache_size=2)
+        sentences = [
+            "je veux aller de toulouse a bordeaux",
+            "Je veux aller de TOULOUSE à Bordeaux !",
+            "de trasbourg a tours",
+            "bonjour",
+            "je veux aller de toulouse a bordeaux",
+        ]
+        for sentence in sentences:
+            self.assertEqual(self.engine.resolve(sentence), engine.resolve(sentence))
+        stats = engine.cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(4, stats["misses"])
+        self.assertEqual(2, stats["evictions"])
+        self.assertEqual(2, stats["size"])
+
+        cache = ResolutionCache(4)
+        cache.put("de paris a lyon", ("Paris", "Lyon"))
+        self.assertEqual(("Paris", "Lyon"), cache.get("de paris a lyon"))
+        self.assertIsNone(cache.get("de lyon a paris"))
+
+    def test_source_watcher_reports_settled_content_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "places.txt"
+            path.write_text("Paris\n", encoding="utf-8")
+            watcher = SourceWatcher([path, None])
+            self.assertEqual([], watcher.changed())
+
+            # Touched with the same content: no change.
+            os.utime(path, ns=(1, 1))
+            self.assertEqual([], watcher.changed())
+            self.assertEqual([], watcher.changed())
+
+            # Rewritten: reported once the stamp held still for one poll.
+            path.write_text("Paris\nLyon\n", encoding="utf-8")
+            self.assertEqual([], watcher.changed())
+            self.assertEqual([path], watcher.changed())
+            self.assertEqual([], watcher.changed())
+
+            path.unlink()
+            watcher.changed()
+            self.assertEqual([path], watcher.changed())
+            self.assertEqual({str(path): None}, watcher.versions())
+
+    def test_cue_token_forms(self) -> None:
+        self.assertEqual([("depuis",)], cue_token_forms(r"\bdepuis\b"))
+        self.assertEqual([("en", "partant", "de")], cue_token_forms(r"\ben\s+partant\s+de\b"))
+        self.assertEqual([("jusqu", "a"), ("jusqua",)], cue_token_forms(r"\bjusqu\s*a\b"))
+        with self.assertRaises(ValueError):
+            cue_token_forms(r"\b(de|du)\b")
+
+    def test_regex_matcher_fallback(self) -> None:
+        regex_engine = ResolverEngine(self.mapping, matcher="regex")
+        for sentence in ("de paris vers lyon", "billet pour paris en partant de lille"):
+            self.assertEqual(self.engine.resolve(sentence), regex_engine.resolve(sentence))
+        with self.assertRaises(ValueError):
+            ResolverEngine(self.mapping, matcher="unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS = ROOT / "scripts"
+sys.path.append(str(SCRIPTS))
+
+import pathfind
+from result_cache import ResultCache, combined_hash, model_hash
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "cache.sqlite"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_results_persist_across_runs(self) -> None:
+        calls = []
+
+        def predictor(sentence: str) -> tuple:
+            calls.append(sentence)
+            return ("Gare A", "Gare C") if "gare" in sentence.lower() else (None, None)
+
+        cache = ResultCache(self.path, batch_size=2)
+        predict = cache.cached_predictor(predictor, "rule-based", "g1")
+        self.assertEqual(("Gare A", "Gare C"), predict("de Gare A a Gare C"))
+        self.assertEqual(("Gare A", "Gare C"), predict("DE GARE A À GARE C"))
+        self.assertEqual((None, None), predict("bonjour"))
+        cache.close()
+        self.assertEqual(2, len(calls))
+
+        cache = ResultCache(self.path)
+        predict = cache.cached_predictor(predictor, "rule-based", "g1")
+        self.assertEqual(("Gare A", "Gare C"), predict("de gare a a gare c"))
+        self.assertEqual((None, None), predict("bonjour"))
+        self.assertEqual(2, len(calls))
+        other = cache.cached_predictor(predictor, "rule-based", "g2")
+        other("bonjour")
+        self.assertEqual(3, len(calls))
+        cache.close()
+
+    def test_model_predictions_are_cached_by_model_files(self) -> None:
+        models = {}
+        versions = (("v1", b"weights-1"), ("v2", b"weights-2"), ("v1_copy", b"weights-1"))
+        for name, weights in versions:
+            model_dir = Path(self.tmp.name) / name
+            model_dir.mkdir()
+            (model_dir / "config.json").write_text('{"labels": 3}', encoding="utf-8")
+            (model_dir / "model.safetensors").write_bytes(weights)
+            models[name] = model_hash([model_dir, model_dir])
+        self.assertEqual(models["v1"], models["v1_copy"])
+
+        calls = []
+
+        def predictor(sentence: str) -> tuple:
+            calls.append(sentence)
+            return ("Gare A", "Gare C")
+
+        cache = ResultCache(self.path)
+        for name in ("v1", "v1_copy", "v2"):
+            predict = cache.cached_predictor(
+                predictor, "camembert-ft", models[name], sentence_key=str.strip
+            )
+            predict("de Gare A a Gare C")
+        cache.close()
+        self.assertEqual(2, len(calls))
+
+    def test_routes_are_cached_by_graph_hash(self) -> None:
+        fixtures = ROOT / "tests" / "fixtures"
+        graph_hash = combined_hash([fixtures / "graph.json", fixtures / "stops_index.json"])
+        find = pathfind.lazy_route_finder(fixtures / "graph.json", fixtures / "stops_index.json")
+        expected = find("Gare A", "Gare C")
+
+        cache = ResultCache(self.path)
+        cached = cache.cached_route_finder(find, graph_hash)
+        self.assertEqual(expected, cached("Gare A", "Gare C"))
+        cache.close()
+
+        cache = ResultCache(self.path)
+        cached = cache.cached_route_finder(lambda origin, destination: None, graph_hash)
+        self.assertEqual(expected, cached("Gare A", "Gare C"))
+        self.assertEqual(1, cache.stats["route_hits"])
+        cache.close()
+
+    def test_eviction_keeps_recent_entries(self) -> None:
+        cache = ResultCache(self.path, max_entries=3, batch_size=1)
+        for number in range(3):
+            cache.put_nlp(f"phrase {number}", "rule-based", "g1", (None, None))
+        self.assertIsNotNone(cache.get_nlp("phrase 0", "rule-based", "g1"))
+        cache.put_nlp("phrase 3", "rule-based", "g1", (None, None))
+        cache.close()
+
+        cache = ResultCache(self.path, max_entries=3)
+        count = cache.connection.execute("SELECT COUNT(*) FROM nlp_results").fetchone()[0]
+        self.assertEqual(3, count)
+        self.assertIsNone(cache.get_nlp("phrase 1", "rule-based", "g1"))
+        self.assertIsNotNone(cache.get_nlp("phrase 0", "rule-based", "g1"))
+        self.assertIsNotNone(cache.get_nlp("phrase 3", "rule-based", "g1"))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,7 @@ sys.path.append(str(SCRIPTS))
 
 import pathfind
 import run_pipeline
+from src.travel_order_resolver import ResolverEngine, build_place_index, build_place_pattern
 
 
 class RunPipelineTest(unittest.TestCase):
@@ -21,17 +22,19 @@ class RunPipelineTest(unittest.TestCase):
             "gare b": "Gare B",
             "gare c": "Gare C",
         }
-        self.place_pattern = run_pipeline.build_place_pattern(list(self.mapping.keys()))
-        self.place_index, self.max_place_tokens = run_pipeline.build_place_index(self.mapping)
+        place_index, max_place_tokens = build_place_index(self.mapping)
+        self.engine = ResolverEngine(
+            self.mapping,
+            build_place_pattern(list(self.mapping.keys())),
+            place_index,
+            max_place_tokens,
+        )
 
     def test_process_order_valid(self) -> None:
         nlp_row, path_row, status = run_pipeline.process_order(
             sentence_id="1",
             sentence="aller de gare a vers gare c",
-            mapping=self.mapping,
-            place_pattern=self.place_pattern,
-            place_index=self.place_index,
-            max_place_tokens=self.max_place_tokens,
+            nlp_predictor=self.engine.resolve,
             graph=self.graph,
             stops_index=self.stops_index,
             stop_names=self.stop_names,
@@ -41,14 +44,40 @@ class RunPipelineTest(unittest.TestCase):
         self.assertEqual(["1", "Gare A", "Gare C"], nlp_row)
         self.assertEqual(["1", "Gare A", "Gare B", "Gare C"], path_row)
 
+    def test_process_order_tries_next_best_pair(self) -> None:
+        # Gare Z is not in the graph: the next destination candidate is routed.
+        engine = ResolverEngine({**self.mapping, "gare z": "Gare Z"}, cache_size=4)
+        kwargs = dict(
+            sentence_id="5",
+            sentence="aller de gare a vers gare z ou gare c",
+            graph=self.graph,
+            stops_index=self.stops_index,
+            stop_names=self.stop_names,
+        )
+        nlp_predictor, candidate_finder = run_pipeline.rule_based_predictors(engine)
+        for _ in range(2):
+            # The second pass is answered by the engine cache and only ranks
+            # the candidates again once the route fails.
+            nlp_row, path_row, status = run_pipeline.process_order(
+                **kwargs, nlp_predictor=nlp_predictor, candidate_finder=candidate_finder
+            )
+            self.assertEqual("ok_alternative", status)
+            self.assertEqual(["5", "Gare A", "Gare C"], nlp_row)
+            self.assertEqual(["5", "Gare A", "Gare B", "Gare C"], path_row)
+        self.assertEqual(1, engine.cache.stats()["hits"])
+
+        nlp_predictor, candidate_finder = run_pipeline.rule_based_predictors(engine, top_k=1)
+        nlp_row, path_row, status = run_pipeline.process_order(
+            **kwargs, nlp_predictor=nlp_predictor, candidate_finder=candidate_finder
+        )
+        self.assertEqual("path_invalid", status)
+        self.assertEqual(["5", "Gare A", "Gare Z"], nlp_row)
+
     def test_process_order_invalid(self) -> None:
         nlp_row, path_row, status = run_pipeline.process_order(
             sentence_id="2",
             sentence="une phrase sans trajet",
-            mapping=self.mapping,
-            place_pattern=self.place_pattern,
-            place_index=self.place_index,
-            max_place_tokens=self.max_place_tokens,
+            nlp_predictor=self.engine.resolve,
             graph=self.graph,
             stops_index=self.stops_index,
             stop_names=self.stop_names,
@@ -62,10 +91,6 @@ class RunPipelineTest(unittest.TestCase):
         nlp_row, path_row, status = run_pipeline.process_order(
             sentence_id="3",
             sentence="texte quelconque",
-            mapping=self.mapping,
-            place_pattern=self.place_pattern,
-            place_index=self.place_index,
-            max_place_tokens=self.max_place_tokens,
             graph=self.graph,
             stops_index=self.stops_index,
             stop_names=self.stop_names,
@@ -80,10 +105,6 @@ class RunPipelineTest(unittest.TestCase):
         nlp_row, path_row, status = run_pipeline.process_order(
             sentence_id="4",
             sentence="texte quelconque",
-            mapping=self.mapping,
-            place_pattern=self.place_pattern,
-            place_index=self.place_index,
-            max_place_tokens=self.max_place_tokens,
             graph=self.graph,
             stops_index=self.stops_index,
             stop_names=self.stop_names,
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS = ROOT / "scripts"
+sys.path.append(str(SCRIPTS))
+
+import serve
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+async def http_request(port: int, method: str, path: str, payload=None) -> tuple[int, dict]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    request = f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    writer.write(request.encode("ascii") + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+class ServeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.places = Path(cls.tmp.name) / "places.txt"
+        cls.places.write_text("Gare A\nGare B\nGare C\nParis\nLyon\n", encoding="utf-8")
+        cls.service_args = (
+            cls.places,
+            "symspell",
+            None,
+            0,
+            FIXTURES / "graph.json",
+            FIXTURES / "stops_index.json",
+            FIXTURES / "stops_areas.csv",
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def run_server(
+        self, scenario, max_pending: int = 2, max_waiting: int = 8, service_args: tuple = ()
+    ) -> None:
+        service_args = service_args or self.service_args
+
+        async def main() -> None:
+            executor = await serve.start_workers(0, service_args)
+            pool = serve.JobPool(executor, max_pending, max_waiting)
+            server = serve.ResolverServer(pool, routing=True, chunk_size=2)
+            servers, addresses = await serve.start_servers(server, "127.0.0.1", 0, 0, None)
+            try:
+                await scenario(server, addresses["http"][1], addresses["line"][1])
+            finally:
+                for listener in servers:
+                    listener.close()
+                    await listener.wait_closed()
+                server.pool.executor.shutdown()
+
+        asyncio.run(main())
+
+    def test_http_endpoints(self) -> None:
+        async def scenario(server, http_port: int, line_port: int) -> None:
+            status, result = await http_request(
+                http_port, "POST", "/resolve", {"id": 7, "sentence": "de Paris à Lyon"}
+            )
+            self.assertEqual(200, status)
+            self.assertEqual(
+                {"id": 7, "origin": "Paris", "destination": "Lyon", "valid": True}, result
+            )
+
+            sentences = ["de Paris à Lyon", "rien", "aller de Lyon vers Paris", "de Pariss à Lyon"]
+            status, result = await http_request(
+                http_port,
+                "POST",
+                "/resolve/batch",
+                {"requests": [{"sentence": sentence} for sentence in sentences]},
+            )
+            self.assertEqual(200, status)
+            self.assertEqual(
+                [("Paris", "Lyon"), (None, None), ("Lyon", "Paris"), ("Paris", "Lyon")],
+                [(row["origin"], row["destination"]) for row in result["results"]],
+            )
+
+            status, result = await http_request(
+                http_port, "POST", "/route", {"origin": "gare a", "destination": "gare c"}
+            )
+            self.assertEqual(["Gare A", "Gare B", "Gare C"], result["route"])
+            status, result = await http_request(
+                http_port,
+                "POST",
+                "/route/batch",
+                {"requests": [{"sentence": "de Gare C à Gare A", "ids": True}]},
+            )
+            self.assertEqual(
+                ["StopArea:C", "StopArea:B", "StopArea:A"], result["results"][0]["route"]
+            )
+
+            self.assertEqual(400, (await http_request(http_port, "POST", "/resolve", {}))[0])
+            self.assertEqual(404, (await http_request(http_port, "POST", "/nowhere", {}))[0])
+            self.assertEqual(405, (await http_request(http_port, "GET", "/resolve"))[0])
+            status, health = await http_request(http_port, "GET", "/health")
+            self.assertEqual({"resolve": 5, "route": 2}, health["requests"])
+
+        self.run_server(scenario)
+
+    def test_line_protocol_keeps_request_order(self) -> None:
+        async def scenario(server, http_port: int, line_port: int) -> None:
+            reader, writer = await asyncio.open_connection("127.0.0.1", line_port)
+            writer.write(
+                "1,de Paris à Lyon\n"
+                "2,rien\n"
+                '{"op": "route", "id": "r", "origin": "gare b", "destination": "gare a"}\n'
+                '{"op": "unknown"}\n'
+                "3,aller de Lyon vers Paris\n".encode("utf-8")
+            )
+            writer.write_eof()
+            replies = (await reader.read()).decode("utf-8").splitlines()
+            writer.close()
+            self.assertEqual(["1,Paris,Lyon", "2,INVALID,", "3,Lyon,Paris"], replies[:2] + replies[4:])
+            self.assertEqual(["Gare B", "Gare A"], json.loads(replies[2])["route"])
+            self.assertIn("error", json.loads(replies[3]))
+
+        self.run_server(scenario)
+
+    def test_http_requests_are_rejected_when_workers_are_saturated(self) -> None:
+        async def scenario(server, http_port: int, line_port: int) -> None:
+            release = threading.Event()
+            blocked = asyncio.create_task(server.pool.run(release.wait, 5))
+            while server.pool.pending == 0:
+                await asyncio.sleep(0.01)
+            status, result = await http_request(http_port, "POST", "/resolve", {"sentence": "x"})
+            self.assertEqual(503, status)
+            self.assertEqual(1, server.rejected)
+            release.set()
+            await blocked
+            status, _ = await http_request(http_port, "POST", "/resolve", {"sentence": "x"})
+            self.assertEqual(200, status)
+
+        self.run_server(scenario, max_pending=1, max_waiting=0)
+
+    def test_changed_gazetteer_is_swapped_in_after_running_jobs(self) -> None:
+        places = Path(self.tmp.name) / "reloaded_places.txt"
+        places.write_text("Paris\nLyon\n", encoding="utf-8")
+        service_args = (places,) + self.service_args[1:]
+
+        async def scenario(server, http_port: int, line_port: int) -> None:
+            server.reloader = serve.GazetteerReloader(
+                server, serve.SourceWatcher([places]), 0, service_args, 0.01
+            )
+            reloading = asyncio.create_task(server.reloader.run())
+            # A job handed to the old worker before the swap keeps its gazetteer.
+            release = threading.Event()
+
+            def resolve_after_release() -> list[dict]:
+                release.wait(5)
+                return serve.run_requests(
+                    "resolve", [{"id": None, "sentence": "de Paris à Nice", "details": False}]
+                )
+
+            blocked = asyncio.create_task(server.pool.run(resolve_after_release))
+            places.write_text("Paris\nLyon\nNice\n", encoding="utf-8")
+            while server.reloader.reloads == 0:
+                await asyncio.sleep(0.01)
+            release.set()
+            self.assertFalse((await blocked)[0]["valid"])
+
+            status, result = await http_request(
+                http_port, "POST", "/resolve", {"sentence": "de Paris à Nice"}
+            )
+            self.assertEqual("Nice", result["destination"])
+            status, health = await http_request(http_port, "GET", "/health")
+            self.assertEqual(1, health["reload"]["reloads"])
+            self.assertEqual([str(places)], health["reload"]["last_changed"])
+
+            # A failed rebuild leaves the current gazetteer in place.
+            reloading.cancel()
+            places.unlink()
+            self.assertFalse(await server.reloader.reload([places]))
+            self.assertEqual(1, server.reloader.failures)
+            status, result = await http_request(
+                http_port, "POST", "/resolve", {"sentence": "de Paris à Nice"}
+            )
+            self.assertEqual("Nice", result["destination"])
+
+        self.run_server(scenario, service_args=service_args)
+
+    def test_reload_does_not_split_a_waiting_batch(self) -> None:
+        places = Path(self.tmp.name) / "batch_places.txt"
+        places.write_text("Paris\nLyon\n", encoding="utf-8")
+        service_args = (places,) + self.service_args[1:]
+
+        async def scenario(server, http_port: int, line_port: int) -> None:
+            server.reloader = serve.GazetteerReloader(
+                server, serve.SourceWatcher([places]), 0, service_args, 60
+            )
+            release = threading.Event()
+            blocked = asyncio.create_task(server.pool.run(release.wait, 5))
+            while server.pool.pending == 0:
+                await asyncio.sleep(0.01)
+            # Three chunks of two requests, all waiting for the only slot.
+            requests = [{"id": None, "sentence": "de Paris à Nice", "details": False}] * 6
+            batch = asyncio.create_task(server.submit("resolve", requests))
+            while server.pool.waiting < 3:
+                await asyncio.sleep(0.01)
+
+            places.write_text("Paris\nLyon\nNice\n", encoding="utf-8")
+            reloading = asyncio.create_task(server.reloader.reload([places]))
+            while server.reloader.reloads == 0:
+                await asyncio.sleep(0.01)
+            release.set()
+            await blocked
+            self.assertEqual([False] * 6, [result["valid"] for result in await batch])
+            self.assertTrue(await reloading)
+
+            status, result = await http_request(
+                http_port, "POST", "/resolve", {"sentence": "de Paris à Nice"}
+            )
+            self.assertEqual("Nice", result["destination"])
+
+        self.run_server(scenario, max_pending=1, service_args=service_args)
+
+
+if __name__ == "__main__":
+    unittest.main()